@@ -1,12 +1,25 @@
+import hashlib
 import os
 import re
 import shutil
+from contextlib import ExitStack
+from tempfile import TemporaryDirectory
 
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
+from src.anexo_a.parser_telas import (
+    LAYOUT_F4_CONSULTA_BENS,
+    LAYOUT_L7RR,
+    iterar_blocos,
+    ler_linhas_texto,
+)
+from src.utils.excel_snapshot import ler_excel_com_snapshot
 from src.utils.normalize_text import DocumentFormatter
 
 load_dotenv()
@@ -27,6 +40,23 @@ TIPOS_COLUNAS = {
 
 DATA_COLUMNS = ["data do contrato", "Liquidação"]
 
+TAMANHO_LOTE_MERGE = 50_000
+# arquivos (hash, posição) em que a deduplicação do merge em streaming se divide
+PARTICOES_DEDUP_MERGE = 64
+
+# colunas do merge bens x detalhes, na ordem que pd.merge produz
+SCHEMA_MERGE_TELA_PRETA = pa.schema(
+    [
+        ("contrato", pa.string()),
+        ("dt_liquidacao", pa.string()),
+        ("valor_bem", pa.float64()),
+        ("cliente", pa.string()),
+        ("dt_contrato_inicial", pa.string()),
+        ("qtd_cpa", pa.string()),
+        ("cpf", pa.string()),
+    ]
+)
+
 STATUS_COLS = [
     "Contrato",
     "Cliente - Status",
@@ -61,93 +91,36 @@ class DOCBaseReprocessor:
 
 
     def _Tela_Contrato_L7RR(self, bloco: str):
-        # EMP/CONTRATO: 1/0006306
-        m = re.search(r"EMP/CONTRATO:\s*(?P<emp_contrato>\d+/\d+)", bloco)
-        emp_contrato = m.group("emp_contrato") if m else None
-
-        # CLIENTE: ... CPF : ...
-        m = re.search(r"CLIENTE:\s*(?P<cliente>.+?)\s+CPF\s*:\s*(?P<cpf>[0-9\.\-]+)", bloco)
-        cliente = m.group("cliente").strip() if m else None
-        cpf = m.group("cpf").strip() if m else None
-
-        # DT.CONTRAT.INICIAL: 27/07/05
-        m = re.search(r"DT\.CONTRAT\.INICIAL:\s*(\d{2}/\d{2}/\d{2})", bloco)
-        dt_contrato_inicial = m.group(1) if m else None
-
-        # QTD CPA:  60
-        m = re.search(r"QTD\s+CPA:\s*(\d+)", bloco)
-        qtd_cpa = m.group(1) if m else None
-
-        return [emp_contrato, cliente, dt_contrato_inicial, qtd_cpa, cpf]
+        campos = LAYOUT_L7RR.extrair_campos(bloco)
+        return [
+            campos["contrato"],
+            campos["cliente"],
+            campos["dt_contrato_inicial"],
+            campos["qtd_cpa"],
+            campos["cpf"],
+        ]
 
 
     def extracao_detalhes_contrato(self, texto: str) -> pd.DataFrame:
-        blocos = self._split_por_contrato(texto)
-        rows = []
-
-        for blk in blocos:
-            # só tenta parsear blocos que realmente pareçam ser essa tela
-            if "EMP/CONTRATO:" not in blk.upper():
-                continue
-
-            emp_contrato, cliente, dt_contrato_inicial, qtd_cpa, cpf = self._Tela_Contrato_L7RR(
-                blk
-            )
-            rows.append(
-                {
-                    "contrato": emp_contrato,
-                    "cliente": cliente,
-                    "dt_contrato_inicial": dt_contrato_inicial,
-                    "qtd_cpa": qtd_cpa,
-                    "cpf": cpf,
-                }
-            )
-
-        return pd.DataFrame(rows)
+        return pd.DataFrame(
+            LAYOUT_L7RR.extrair_colunas(texto),
+            columns=["contrato", "cliente", "dt_contrato_inicial", "qtd_cpa", "cpf"],
+        )
 
 
     def _f4_Tela_Consulta_de_bens(self, bloco: str):
-        m = re.search(r"DT\.LIQUIDACAO:\s*(\d{2}/\d{2}/\d{2})", bloco)
-        dt_liquidacao = m.group(1) if m else None
-
-        m = re.search(r"CONTRATO:\s*(\d+)", bloco)
-        n_contrato = m.group(1) if m else None
-
-        valores = re.findall(r"VL\.UNITARIO:\s*([\d\.]+,\d{2})", bloco)
-        valor_bem = (
-            sum(float(v.replace(".", "").replace(",", ".")) for v in valores)
-            if valores
-            else 0.0
-        )
-
-        return [n_contrato, dt_liquidacao, round(valor_bem, 2)]
+        campos = LAYOUT_F4_CONSULTA_BENS.extrair_campos(bloco)
+        return [campos["contrato"], campos["dt_liquidacao"], campos["valor_bem"]]
 
 
     def extracao_consulta_bens(self, texto: str) -> pd.DataFrame:
-        blocos = self._split_por_contrato(texto)
-        rows = []
-
-        for blk in blocos:
-            if "CONSULTA BEM" not in blk.upper() and "CONTRATO:" not in blk.upper():
-                continue
-
-            n_contrato, dt_liquidacao, valor_bem = self._f4_Tela_Consulta_de_bens(blk)
-            if n_contrato:  # evita lixo
-                rows.append(
-                    {
-                        "contrato": n_contrato,
-                        "dt_liquidacao": dt_liquidacao,
-                        "valor_bem": valor_bem,
-                    }
-                )
-
-        return pd.DataFrame(rows)
+        return pd.DataFrame(LAYOUT_F4_CONSULTA_BENS.extrair_colunas(texto))
 
 
     def process_doc_base(self, path_base: str, sheet_name: str = "Base_2014"):
         file_name = rf"{OUTPUT_DIR}\DOC_BASE_Reprocessado.xlsx"
 
-        df_base_completa = pd.read_excel(path_base)
+        df_base_completa = ler_excel_com_snapshot(path_base)
         df_base_completa = df_base_completa[
             [
                 "nº do contrato",
@@ -183,12 +156,207 @@ class DOCBaseReprocessor:
         return df_merged
 
 
+    @staticmethod
+    def _converter_unicos(serie: pd.Series, conversor, vazio) -> pd.Series:
+        # converte cada valor distinto uma vez só e espalha o resultado pelas linhas
+        unicos = pd.unique(serie.dropna())
+        convertidos = {}
+        for valor in unicos:
+            try:
+                convertidos[valor] = conversor(valor)
+            except Exception:
+                convertidos[valor] = vazio
+        return serie.map(convertidos)
+
+    @staticmethod
+    def _status(conferido) -> np.ndarray:
+        return np.where(conferido, "Conferido", "Divergente").astype(object)
+
+    @classmethod
+    def compara_str_colunas(cls, a: pd.Series, b: pd.Series) -> np.ndarray:
+        na_a, na_b = a.isna().to_numpy(), b.isna().to_numpy()
+        iguais = (
+            a.astype(str).str.strip().str.upper().to_numpy()
+            == b.astype(str).str.strip().str.upper().to_numpy()
+        )
+        return cls._status((na_a & na_b) | (~na_a & ~na_b & iguais))
+
+    @classmethod
+    def compara_num_colunas(cls, a: pd.Series, b: pd.Series, tol: float = 0.01) -> np.ndarray:
+        na_a, na_b = a.isna().to_numpy(), b.isna().to_numpy()
+        # float() por valor distinto, como no compara_num linha a linha: o que não
+        # converte vira NaN e a comparação dá Divergente
+        fa = cls._converter_unicos(a, float, np.nan).to_numpy(dtype=float, na_value=np.nan)
+        fb = cls._converter_unicos(b, float, np.nan).to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            proximos = np.abs(fa - fb) < tol
+        return cls._status((na_a & na_b) | (~na_a & ~na_b & proximos))
+
+    @classmethod
+    def compara_data_colunas(cls, a: pd.Series, b: pd.Series) -> np.ndarray:
+        na_a, na_b = a.isna().to_numpy(), b.isna().to_numpy()
+
+        def para_data(valor):
+            return pd.to_datetime(valor, dayfirst=True, errors="coerce")
+
+        da = pd.to_datetime(cls._converter_unicos(a, para_data, pd.NaT))
+        db = pd.to_datetime(cls._converter_unicos(b, para_data, pd.NaT))
+        iguais = (da == db).to_numpy()
+        return cls._status((na_a & na_b) | (~na_a & ~na_b & iguais))
+
+    def montar_status(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Preenche as colunas de STATUS_COLS a partir do merge extraído x base, coluna
+        a coluna (sem apply por linha). Datas e números são convertidos uma vez por
+        valor distinto.
+        """
+        digitos_base = df["cpf_base"].astype(str).str.replace(r"\D", "", regex=True)
+        digitos_extraido = df["cpf_extraido"].astype(str).str.replace(r"\D", "", regex=True)
+
+        cliente = self.compara_str_colunas(df["cliente_base"], df["cliente_extraido"])
+        cpf = self.compara_str_colunas(digitos_base, digitos_extraido)
+
+        # um documento conferido confirma o cliente e vice-versa
+        cpf = np.where(cliente == "Conferido", "Conferido", cpf).astype(object)
+        cliente = np.where(cpf == "Conferido", "Conferido", cliente).astype(object)
+
+        df["Contrato"] = df["contrato"]
+        df["Cliente - Status"] = cliente
+        df["CNPJ/CPF - Status"] = cpf
+        df["Valor - Status"] = self.compara_num_colunas(
+            df["valor_bem_extraido"], df["valor_bem_base"]
+        )
+        df["Data do Contrato - Status"] = self.compara_data_colunas(
+            df["data_contrato"], df["dt_contrato_inicial"]
+        )
+        df["Data de Liquidação - Status"] = self.compara_data_colunas(
+            df["dt_liquidacao_extraido"], df["dt_liquidacao_base"]
+        )
+        df["Quantidade de Parcelas - Status"] = self.compara_num_colunas(
+            df["qtd_cpa"], df["parcelas_contratadas"]
+        )
+        return df
+
+    def merge_tela_preta_streaming(
+        self,
+        path_bens: str,
+        path_contratos: str,
+        path_parquet: str,
+        tamanho_lote: int = TAMANHO_LOTE_MERGE,
+        deduplicar: bool = True,
+    ) -> int:
+        """
+        Mesmo resultado de merge_tela_preta, gravado em Parquet sem montar os dois
+        DataFrames: os detalhes de contrato (lado menor) viram um índice
+        contrato -> linhas e a tela de bens passa por ele em lotes de
+        `tamanho_lote` blocos, um row group por lote.
+
+        Com deduplicar=True o merge é gravado inteiro num temporário e cada linha
+        deixa (hash de 16 bytes, posição) numa de PARTICOES_DEDUP_MERGE partições
+        em disco; cada partição é ordenada sozinha para achar as repetições, e uma
+        segunda passada regrava o Parquet sem elas (mantém a primeira, como o
+        drop_duplicates). A memória fica limitada a uma partição por vez mais as
+        posições descartadas.
+
+        Retorna a quantidade de linhas gravadas.
+        """
+        colunas_detalhe = ["cliente", "dt_contrato_inicial", "qtd_cpa", "cpf"]
+        vazio = (None,) * len(colunas_detalhe)
+
+        detalhes: dict[str, list[tuple]] = {}
+        blocos_contratos = iterar_blocos(ler_linhas_texto(path_contratos))
+        for lote in LAYOUT_L7RR.iterar_lotes(blocos_contratos, tamanho_lote):
+            for contrato, *valores in zip(lote["contrato"], *(lote[c] for c in colunas_detalhe)):
+                if contrato is None:
+                    continue
+                detalhes.setdefault(contrato.split("/")[-1], []).append(tuple(valores))
+
+        destino = Path(path_parquet)
+        with TemporaryDirectory(dir=destino.parent) as tmp_dir:
+            tmp = Path(tmp_dir)
+            bruto = tmp / "merge.parquet"
+            with ExitStack() as stack:
+                particoes = [
+                    stack.enter_context(open(tmp / f"{i:03d}.bin", "wb"))
+                    for i in range(PARTICOES_DEDUP_MERGE if deduplicar else 0)
+                ]
+                writer = stack.enter_context(pq.ParquetWriter(bruto, SCHEMA_MERGE_TELA_PRETA))
+                total = 0
+                blocos_bens = iterar_blocos(ler_linhas_texto(path_bens))
+                for lote in LAYOUT_F4_CONSULTA_BENS.iterar_lotes(blocos_bens, tamanho_lote):
+                    saida: dict[str, list] = {c: [] for c in SCHEMA_MERGE_TELA_PRETA.names}
+                    for contrato, dt_liquidacao, valor_bem in zip(
+                        lote["contrato"], lote["dt_liquidacao"], lote["valor_bem"]
+                    ):
+                        for valores in detalhes.get(contrato, [vazio]):
+                            linha = (contrato, dt_liquidacao, valor_bem, *valores)
+                            if deduplicar:
+                                chave = hashlib.blake2b(
+                                    repr(linha).encode("utf-8"), digest_size=16
+                                ).digest()
+                                particoes[chave[0] % PARTICOES_DEDUP_MERGE].write(
+                                    chave + total.to_bytes(8, "little")
+                                )
+                            for coluna, v in zip(SCHEMA_MERGE_TELA_PRETA.names, linha):
+                                saida[coluna].append(v)
+                            total += 1
+
+                    if saida["contrato"]:
+                        writer.write_table(
+                            pa.Table.from_pydict(saida, schema=SCHEMA_MERGE_TELA_PRETA)
+                        )
+
+            repetidas = (
+                self._posicoes_repetidas(sorted(tmp.glob("*.bin")))
+                if deduplicar
+                else np.empty(0, dtype=np.int64)
+            )
+            if not len(repetidas):
+                os.replace(bruto, destino)
+                return total
+
+            inicio = 0
+            with pq.ParquetWriter(destino, SCHEMA_MERGE_TELA_PRETA) as writer:
+                arquivo = pq.ParquetFile(bruto)
+                for i in range(arquivo.num_row_groups):
+                    tabela = arquivo.read_row_group(i)
+                    fim = inicio + tabela.num_rows
+                    de, ate = np.searchsorted(repetidas, [inicio, fim])
+                    manter = np.ones(tabela.num_rows, dtype=bool)
+                    manter[repetidas[de:ate] - inicio] = False
+                    inicio = fim
+                    if manter.any():
+                        writer.write_table(tabela.filter(pa.array(manter)))
+
+        return total - len(repetidas)
+
+    @staticmethod
+    def _posicoes_repetidas(particoes: list[Path]) -> np.ndarray:
+        """
+        Posições (ordenadas) das linhas cujo hash já apareceu antes, partição a
+        partição: linhas iguais têm o mesmo hash e caem sempre na mesma partição.
+        """
+        registro = np.dtype([("a", "<u8"), ("b", "<u8"), ("posicao", "<i8")])
+        repetidas = []
+        for particao in particoes:
+            r = np.fromfile(particao, dtype=registro)
+            if len(r) < 2:
+                continue
+            r = r[np.lexsort((r["posicao"], r["b"], r["a"]))]
+            igual_anterior = (r["a"][1:] == r["a"][:-1]) & (r["b"][1:] == r["b"][:-1])
+            repetidas.append(r["posicao"][1:][igual_anterior])
+        if not repetidas:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(repetidas))
+
     def export_status_file(
         self, path_base: str, file_name: str, path_bens: str, path_contratos: str
     ):
         df_merged = self.merge_tela_preta(path_bens, path_contratos)
 
-        df_base = pd.read_excel(path_base, dtype=TIPOS_COLUNAS, parse_dates=DATA_COLUMNS)
+        df_base = ler_excel_com_snapshot(
+            path_base, dtype=TIPOS_COLUNAS, parse_dates=DATA_COLUMNS
+        )
         rename_df_base = {
             "nº do contrato": "contrato_base",
             "Razão Social_Nome Completo do Arrendatário": "cliente",
@@ -205,19 +373,19 @@ class DOCBaseReprocessor:
             .fillna(0)
             .astype(int)
         )
-        df_base["cpf"] = df_base["cpf"].apply(DocumentFormatter.format_documents)
-        df_base["cliente"] = df_base["cliente"].apply(DocumentFormatter.to_pascal_case)
+        df_base["cpf"] = DocumentFormatter.format_documents_series(df_base["cpf"])
+        df_base["cliente"] = DocumentFormatter.to_pascal_case_series(df_base["cliente"])
         df_base.groupby("contrato").count().reset_index().sort_values(
             "cpf", ascending=False
         )
         df_base = DocumentFormatter.format_date_columns(df_base, DATA_COLUMNS)
         df_base["contrato"] = df_base["contrato"].astype(str)
 
-        df_merged["data_contrato"] = df_merged["data_contrato"].apply(
-            DocumentFormatter.correct_year
+        df_merged["data_contrato"] = DocumentFormatter.correct_year_series(
+            df_merged["data_contrato"]
         )
-        df_merged["dt_liquidacao"] = df_merged["dt_liquidacao"].apply(
-            DocumentFormatter.correct_year
+        df_merged["dt_liquidacao"] = DocumentFormatter.correct_year_series(
+            df_merged["dt_liquidacao"]
         )
 
         df_merged_comparativo = pd.merge(
@@ -229,88 +397,7 @@ class DOCBaseReprocessor:
             suffixes=("_extraido", "_base"),
         )
 
-        def compara_str(a, b):
-            if pd.isnull(a) and pd.isnull(b):
-                return "Conferido"
-            if pd.isnull(a) or pd.isnull(b):
-                return "Divergente"
-            return (
-                "Conferido"
-                if str(a).strip().upper() == str(b).strip().upper()
-                else "Divergente"
-            )
-
-        def compara_num(a, b, tol=0.01):
-            try:
-                if pd.isnull(a) and pd.isnull(b):
-                    return "Conferido"
-                if pd.isnull(a) or pd.isnull(b):
-                    return "Divergente"
-                return "Conferido" if abs(float(a) - float(b)) < tol else "Divergente"
-            except Exception:
-                return "Divergente"
-
-        def compara_data(a, b):
-            if pd.isnull(a) and pd.isnull(b):
-                return "Conferido"
-            if pd.isnull(a) or pd.isnull(b):
-                return "Divergente"
-            # Normaliza para dd/mm/aaaa
-            try:
-                a_fmt = pd.to_datetime(a, dayfirst=True, errors="coerce")
-                b_fmt = pd.to_datetime(b, dayfirst=True, errors="coerce")
-                if pd.isnull(a_fmt) or pd.isnull(b_fmt):
-                    return "Divergente"
-                return "Conferido" if a_fmt == b_fmt else "Divergente"
-            except Exception:
-                return "Divergente"
-
-        df_merged_comparativo["Contrato"] = df_merged_comparativo.apply(
-            lambda x: compara_str(x["contrato"], x["contrato_base"]), axis=1
-        )
-        df_merged_comparativo["Cliente - Status"] = df_merged_comparativo.apply(
-            lambda x: compara_str(x["cliente_base"], x["cliente_extraido"]), axis=1
-        )
-        df_merged_comparativo["CNPJ/CPF - Status"] = df_merged_comparativo.apply(
-            lambda x: compara_str(
-                "".join(filter(str.isdigit, str(x["cpf_base"]))),
-                "".join(filter(str.isdigit, str(x["cpf_extraido"]))),
-            ),
-            axis=1,
-        )
-        df_merged_comparativo["Valor - Status"] = df_merged_comparativo.apply(
-            lambda x: compara_num(x["valor_bem_extraido"], x["valor_bem_base"]), axis=1
-        )
-        df_merged_comparativo["Data do Contrato - Status"] = df_merged_comparativo.apply(
-            lambda x: compara_data(x["data_contrato"], x["dt_contrato_inicial"]), axis=1
-        )
-        df_merged_comparativo["Data de Liquidação - Status"] = df_merged_comparativo.apply(
-            lambda x: compara_data(x["dt_liquidacao_extraido"], x["dt_liquidacao_base"]),
-            axis=1,
-        )
-        df_merged_comparativo["Quantidade de Parcelas - Status"] = (
-            df_merged_comparativo.apply(
-                lambda x: compara_num(x["qtd_cpa"], x["parcelas_contratadas"]), axis=1
-            )
-        )
-        df_merged_comparativo["CNPJ/CPF - Status"] = df_merged_comparativo.apply(
-            lambda x: (
-                "Conferido"
-                if x["Cliente - Status"] == "Conferido"
-                else x["CNPJ/CPF - Status"]
-            ),
-            axis=1,
-        )
-        df_merged_comparativo["Cliente - Status"] = df_merged_comparativo.apply(
-            lambda x: (
-                "Conferido"
-                if x["CNPJ/CPF - Status"] == "Conferido"
-                else x["Cliente - Status"]
-            ),
-            axis=1,
-        )
-
-        df_merged_comparativo["Contrato"] = df_merged_comparativo["contrato"]
+        df_merged_comparativo = self.montar_status(df_merged_comparativo)
 
         df_merged_comparativo[STATUS_COLS].to_excel(
             rf"{OUTPUT_DIR}/{file_name}.xlsx", index=False
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from collections.abc import Iterable
+from pathlib import Path
+
+ARQUIVO_INDICE_PDFS = ".indice_pdfs.json"
+
+
+class IndicePDFs:
+    """
+    Índice persistente nome de PDF -> contrato de uma árvore de PDFs.
+
+    Guarda, por pasta (caminho relativo à raiz), o mtime_ns da pasta, as
+    subpastas e o contrato extraído de cada .pdf. Na atualização, uma pasta cujo
+    mtime não mudou reaproveita o registro sem ser listada; só pastas onde
+    arquivos entraram, saíram ou foram renomeados são relidas com os.scandir.
+
+    O arquivo do índice fica por padrão ao lado da raiz (<raiz>.indice_pdfs.json),
+    fora da árvore: gravado dentro dela, cada salvar() mudaria o mtime da pasta
+    e a próxima atualização sempre a releria.
+    """
+
+    VERSAO = 1
+
+    def __init__(
+        self,
+        raiz: str | Path,
+        padrao_contrato: re.Pattern,
+        caminho: str | Path | None = None,
+    ) -> None:
+        self.raiz = Path(raiz)
+        self.padrao_contrato = padrao_contrato
+        if caminho is None:
+            raiz_absoluta = self.raiz.resolve()
+            caminho = raiz_absoluta.parent / f"{raiz_absoluta.name}{ARQUIVO_INDICE_PDFS}"
+        self.caminho = Path(caminho)
+        self.pastas: dict[str, dict] = {}
+        self.pastas_relidas = 0
+
+        if self.caminho.exists():
+            try:
+                dados = json.loads(self.caminho.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                dados = {}
+            # trocar a regex de contrato invalida tudo o que foi extraído com a antiga
+            if (
+                dados.get("versao") == self.VERSAO
+                and dados.get("padrao") == self.padrao_contrato.pattern
+            ):
+                self.pastas = dados.get("pastas", {})
+
+    def _contrato(self, nome_pdf: str) -> str | None:
+        m = self.padrao_contrato.search(nome_pdf[: -len(".pdf")])
+        return m.group(1) if m else None
+
+    def _reler_pasta(self, pasta: Path, mtime_ns: int) -> dict:
+        subpastas: list[str] = []
+        arquivos: dict[str, str | None] = {}
+        with os.scandir(pasta) as it:
+            for entrada in it:
+                if entrada.is_dir(follow_symlinks=False):
+                    subpastas.append(entrada.name)
+                elif entrada.name.endswith(".pdf"):
+                    arquivos[entrada.name] = self._contrato(entrada.name)
+        self.pastas_relidas += 1
+        return {"mtime_ns": mtime_ns, "subpastas": sorted(subpastas), "arquivos": arquivos}
+
+    def atualizar(self, recursivo: bool = True, ignorar: Iterable[Path] = ()) -> None:
+        """Revisita a árvore pelo mtime das pastas; pastas em `ignorar` ficam de fora."""
+        ignorar = {Path(p) for p in ignorar}
+        vistas: set[str] = set()
+        pendentes = [self.raiz]
+
+        while pendentes:
+            pasta = pendentes.pop()
+            if pasta in ignorar:
+                continue
+
+            rel = pasta.relative_to(self.raiz).as_posix()
+            mtime_ns = pasta.stat().st_mtime_ns
+            registro = self.pastas.get(rel)
+            if registro is None or registro["mtime_ns"] != mtime_ns:
+                registro = self.pastas[rel] = self._reler_pasta(pasta, mtime_ns)
+            vistas.add(rel)
+
+            if recursivo:
+                pendentes.extend(pasta / nome for nome in registro["subpastas"])
+
+        if recursivo:
+            for rel in set(self.pastas) - vistas:
+                del self.pastas[rel]
+
+    def entradas(self, recursivo: bool = True) -> list[tuple[Path, str | None]]:
+        """(caminho, contrato) de cada PDF indexado, na ordem de sorted(glob)."""
+        entradas = []
+        for rel, registro in self.pastas.items():
+            if not recursivo and rel != ".":
+                continue
+            pasta = self.raiz / rel
+            entradas.extend((pasta / nome, c) for nome, c in registro["arquivos"].items())
+        entradas.sort(key=lambda e: e[0])
+        return entradas
+
+    def salvar(self) -> None:
+        tmp = self.caminho.with_name(self.caminho.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "versao": self.VERSAO,
+                    "padrao": self.padrao_contrato.pattern,
+                    "pastas": self.pastas,
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.caminho)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+TAMANHO_LEITURA_HASH = 1024 * 1024
+
+
+def hash_arquivo(caminho: str | Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as f:
+        while True:
+            bloco = f.read(TAMANHO_LEITURA_HASH)
+            if not bloco:
+                break
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def assinatura_arquivo(caminho: str | Path, com_hash: bool = True) -> dict:
+    st = os.stat(caminho)
+    assinatura = {"tamanho": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if com_hash:
+        assinatura["hash"] = hash_arquivo(caminho)
+    return assinatura
+
+
+class ManifestoIncremental:
+    """
+    Manifesto JSON de uma etapa do pipeline: para cada entrada guarda tamanho,
+    mtime_ns, hash e as saídas derivadas, permitindo pular o que não mudou.
+    """
+
+    VERSAO = 1
+
+    def __init__(self, caminho: str | Path) -> None:
+        self.caminho = Path(caminho)
+        self.secoes: dict[str, dict[str, dict]] = {}
+
+        if self.caminho.exists():
+            try:
+                dados = json.loads(self.caminho.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                dados = {}
+            if dados.get("versao") == self.VERSAO:
+                self.secoes = dados.get("secoes", {})
+
+    def secao(self, nome: str) -> dict[str, dict]:
+        return self.secoes.setdefault(nome, {})
+
+    def inalterado(self, secao: str, chave: str, caminho: str | Path) -> bool:
+        """
+        Compara tamanho/mtime com o registro. O hash só é recalculado quando o
+        tamanho bate mas o mtime mudou (arquivo "tocado" sem mudar conteúdo).
+        """
+        registro = self.secao(secao).get(chave)
+        if registro is None:
+            return False
+
+        try:
+            atual = assinatura_arquivo(caminho, com_hash=False)
+        except FileNotFoundError:
+            return False
+
+        if atual["tamanho"] != registro.get("tamanho"):
+            return False
+        if atual["mtime_ns"] == registro.get("mtime_ns"):
+            return True
+
+        if "hash" in registro and hash_arquivo(caminho) == registro["hash"]:
+            registro["mtime_ns"] = atual["mtime_ns"]
+            return True
+        return False
+
+    def registrar(
+        self,
+        secao: str,
+        chave: str,
+        assinatura: dict,
+        saidas: list[str] | None = None,
+    ) -> None:
+        registro = dict(assinatura)
+        if saidas is not None:
+            registro["saidas"] = sorted(set(saidas))
+        self.secao(secao)[chave] = registro
+
+    def salvar(self) -> None:
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.caminho.with_name(self.caminho.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {"versao": self.VERSAO, "secoes": self.secoes},
+                ensure_ascii=False,
+                indent=1,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.caminho)
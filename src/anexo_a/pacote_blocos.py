@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+ARQUIVO_DADOS = "blocos.dat"
+ARQUIVO_INDICE = "blocos.idx"
+# linha "nome<TAB>MARCA_REMOVIDO" no índice: o bloco deixa de fazer parte do pacote
+MARCA_REMOVIDO = "<removido>"
+
+
+@dataclass(frozen=True)
+class EntradaPacote:
+    nome: str
+    contrato: str
+    hash: str
+    offset: int
+    tamanho: int
+
+    @property
+    def nome_txt(self) -> str:
+        return f"{self.nome}.txt"
+
+
+class PacoteBlocos:
+    """
+    Armazena os blocos de uma pasta de tipo num único arquivo de dados (append-only)
+    mais um índice TSV: nome, contrato, hash, offset e tamanho de cada bloco.
+
+    O índice só recebe a linha depois que os bytes do bloco foram gravados; uma
+    linha truncada ou apontando além do fim dos dados (queda no meio da escrita) é
+    ignorada na leitura. Remover um bloco grava uma lápide no índice (os bytes
+    continuam nos dados); um bloco adicionado depois com o mesmo nome volta a valer.
+    """
+
+    def __init__(self, pasta: str | Path) -> None:
+        self.pasta = Path(pasta)
+        self.caminho_dados = self.pasta / ARQUIVO_DADOS
+        self.caminho_indice = self.pasta / ARQUIVO_INDICE
+        self.entradas: dict[str, EntradaPacote] = {}
+        self._dados = None
+        self._indice = None
+        self._carregar_indice()
+
+    @staticmethod
+    def existe(pasta: str | Path) -> bool:
+        return (Path(pasta) / ARQUIVO_INDICE).exists()
+
+    def _carregar_indice(self) -> None:
+        if not self.caminho_indice.exists():
+            return
+
+        tamanho_dados = (
+            self.caminho_dados.stat().st_size if self.caminho_dados.exists() else 0
+        )
+
+        with open(self.caminho_indice, "r", encoding="utf-8", newline="") as f:
+            for linha in f:
+                if not linha.endswith("\n"):
+                    break
+                partes = linha.rstrip("\n").split("\t")
+                if len(partes) == 2 and partes[1] == MARCA_REMOVIDO:
+                    self.entradas.pop(partes[0], None)
+                    continue
+                if len(partes) != 5:
+                    continue
+                nome, contrato, conteudo_hash, offset, tamanho = partes
+                entrada = EntradaPacote(
+                    nome, contrato, conteudo_hash, int(offset), int(tamanho)
+                )
+                if entrada.offset + entrada.tamanho > tamanho_dados:
+                    continue
+                self.entradas[nome] = entrada
+
+    def __enter__(self) -> PacoteBlocos:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.fechar()
+
+    def fechar(self) -> None:
+        for f in (self._dados, self._indice):
+            if f is not None:
+                f.close()
+        self._dados = None
+        self._indice = None
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def __contains__(self, nome: str) -> bool:
+        return nome in self.entradas
+
+    def _abrir_para_escrita(self) -> None:
+        if self._dados is None:
+            self.pasta.mkdir(parents=True, exist_ok=True)
+            self._dados = open(self.caminho_dados, "ab")
+            self._indice = open(self.caminho_indice, "a", encoding="utf-8", newline="")
+
+    def adicionar(
+        self, nome: str, contrato: str, conteudo_hash: str, conteudo: str
+    ) -> EntradaPacote:
+        self._abrir_para_escrita()
+
+        dados = conteudo.encode("utf-8")
+        self._dados.seek(0, os.SEEK_END)
+        offset = self._dados.tell()
+        self._dados.write(dados)
+        self._dados.flush()
+
+        entrada = EntradaPacote(nome, contrato, conteudo_hash, offset, len(dados))
+        self._indice.write(
+            f"{nome}\t{contrato}\t{conteudo_hash}\t{offset}\t{len(dados)}\n"
+        )
+        self._indice.flush()
+
+        self.entradas[nome] = entrada
+        return entrada
+
+    def remover(self, nome: str) -> None:
+        if nome not in self.entradas:
+            raise KeyError(nome)
+        self._abrir_para_escrita()
+        self._indice.write(f"{nome}\t{MARCA_REMOVIDO}\n")
+        self._indice.flush()
+        del self.entradas[nome]
+
+    def ler(self, entrada: EntradaPacote | str) -> str:
+        if isinstance(entrada, str):
+            entrada = self.entradas[entrada]
+        if self._dados is not None:
+            self._dados.flush()
+        with open(self.caminho_dados, "rb") as f:
+            f.seek(entrada.offset)
+            return f.read(entrada.tamanho).decode("utf-8")
+
+    def iterar(self) -> Iterator[tuple[EntradaPacote, str]]:
+        if self._dados is not None:
+            self._dados.flush()
+        with open(self.caminho_dados, "rb") as f:
+            for entrada in sorted(self.entradas.values(), key=lambda e: e.offset):
+                f.seek(entrada.offset)
+                yield entrada, f.read(entrada.tamanho).decode("utf-8")
+
+    def materializar(self, nome: str, destino: str | Path) -> Path:
+        destino = Path(destino)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(self.ler(nome), encoding="utf-8")
+        return destino
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import codecs
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# início de bloco: linha "@EMP/CONTRATO" sozinha (mesma regra do re.split antigo)
+PADRAO_INICIO_BLOCO = re.compile(r"^@\d+/\d+\s*$", re.MULTILINE)
+
+# leitura em binário para decidir o encoding sem carregar o arquivo
+TAMANHO_BLOCO_LEITURA = 1 << 20
+
+
+@dataclass(frozen=True)
+class CampoTela:
+    """
+    Um padrão da tela e as colunas que ele preenche (um grupo por coluna, na ordem).
+
+    agregacao="primeiro" fica com a primeira ocorrência do bloco (como re.search);
+    agregacao="soma" soma todas as ocorrências já convertidas. `vazio` é o valor
+    quando não há ocorrência e `finalizar` ajusta o valor final do bloco.
+    """
+
+    colunas: tuple[str, ...]
+    padrao: str
+    agregacao: str = "primeiro"
+    conversor: Callable | None = None
+    vazio: object = None
+    finalizar: Callable | None = None
+
+
+@dataclass
+class LayoutTela:
+    """
+    Layout de uma tela: filtros (algum precisa aparecer no bloco, sem diferenciar
+    maiúsculas) e campos. Os padrões dos campos são combinados numa única regex
+    alternada, então não devem se sobrepor no texto.
+    """
+
+    nome: str
+    filtros: tuple[str, ...]
+    campos: tuple[CampoTela, ...]
+    obrigatorio: str | None = None
+    _regex: re.Pattern = field(init=False, repr=False)
+    _regex_filtro: re.Pattern = field(init=False, repr=False)
+    _grupos: dict[int, CampoTela] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        alternativas = []
+        self._grupos = {}
+        grupo = 1
+        for campo in self.campos:
+            internos = re.compile(campo.padrao).groups
+            if internos != len(campo.colunas):
+                raise ValueError(
+                    f"Campo {campo.colunas} da tela {self.nome}: o padrão tem {internos} "
+                    f"grupos para {len(campo.colunas)} colunas."
+                )
+            alternativas.append(f"({campo.padrao})")
+            self._grupos[grupo] = campo
+            grupo += 1 + internos
+
+        self._regex = re.compile("|".join(alternativas))
+        self._regex_filtro = re.compile(
+            "|".join(re.escape(f) for f in self.filtros), re.IGNORECASE
+        )
+
+    @property
+    def colunas(self) -> list[str]:
+        return [c for campo in self.campos for c in campo.colunas]
+
+    def passa_filtro(self, texto: str, inicio: int = 0, fim: int | None = None) -> bool:
+        fim = len(texto) if fim is None else fim
+        return self._regex_filtro.search(texto, inicio, fim) is not None
+
+    def extrair_campos(self, texto: str, inicio: int = 0, fim: int | None = None) -> dict:
+        """Campos de um bloco (texto[inicio:fim]) numa única passada da regex combinada."""
+        fim = len(texto) if fim is None else fim
+        valores: dict[str, object] = {}
+        somas: dict[CampoTela, list] = {}
+        for m in self._regex.finditer(texto, inicio, fim):
+            # o grupo externo de cada alternativa é o último a fechar
+            grupo = m.lastindex
+            campo = self._grupos[grupo]
+            if campo.agregacao == "soma":
+                somas.setdefault(campo, []).append(
+                    campo.conversor(m.group(grupo + 1)) if campo.conversor else m.group(grupo + 1)
+                )
+                continue
+            if campo.colunas[0] in valores:
+                continue
+            for i, coluna in enumerate(campo.colunas, start=1):
+                v = m.group(grupo + i)
+                valores[coluna] = campo.conversor(v) if campo.conversor and v is not None else v
+
+        linha = {}
+        for campo in self.campos:
+            for coluna in campo.colunas:
+                if campo.agregacao == "soma":
+                    v = sum(somas[campo]) if campo in somas else campo.vazio
+                else:
+                    v = valores.get(coluna, campo.vazio)
+                if campo.finalizar is not None:
+                    v = campo.finalizar(v)
+                linha[coluna] = v
+        return linha
+
+    def extrair_bloco(self, texto: str, inicio: int = 0, fim: int | None = None) -> dict | None:
+        """Linha do bloco, ou None se ele não passa no filtro ou falta o campo obrigatório."""
+        if not self.passa_filtro(texto, inicio, fim):
+            return None
+        linha = self.extrair_campos(texto, inicio, fim)
+        if self.obrigatorio is not None and not linha[self.obrigatorio]:
+            return None
+        return linha
+
+    def extrair_colunas(self, texto: str) -> dict[str, list]:
+        """
+        Varre o dump inteiro: blocos delimitados pelas linhas @EMP/CONTRATO, uma
+        passada da regex combinada por bloco, resultado em listas por coluna.
+        """
+        texto = texto.replace("\r\n", "\n").replace("\r", "\n")
+        colunas: dict[str, list] = {c: [] for c in self.colunas}
+
+        inicios = [m.start() for m in PADRAO_INICIO_BLOCO.finditer(texto)]
+        limites = zip([0] + inicios, inicios + [len(texto)])
+        for inicio, fim in limites:
+            if inicio == fim:
+                continue
+            linha = self.extrair_bloco(texto, inicio, fim)
+            if linha is None:
+                continue
+            for coluna, v in linha.items():
+                colunas[coluna].append(v)
+
+        return colunas
+
+    def iterar_lotes(self, blocos: Iterable[str], tamanho_lote: int) -> Iterator[dict[str, list]]:
+        """Mesmo resultado de extrair_colunas, em lotes de até `tamanho_lote` linhas."""
+        colunas: dict[str, list] = {c: [] for c in self.colunas}
+        n = 0
+        for bloco in blocos:
+            linha = self.extrair_bloco(bloco)
+            if linha is None:
+                continue
+            for coluna, v in linha.items():
+                colunas[coluna].append(v)
+            n += 1
+            if n == tamanho_lote:
+                yield colunas
+                colunas = {c: [] for c in self.colunas}
+                n = 0
+        if n:
+            yield colunas
+
+
+def encoding_do_arquivo(caminho: str | Path) -> str:
+    """
+    "utf-8" se o arquivo inteiro for UTF-8 válido, senão "latin1" (a mesma decisão
+    de ler tudo em UTF-8 e cair para latin1 no erro), sem carregar o arquivo.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(caminho, "rb") as f:
+        try:
+            while bloco := f.read(TAMANHO_BLOCO_LEITURA):
+                decoder.decode(bloco)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return "latin1"
+    return "utf-8"
+
+
+def ler_linhas_texto(caminho: str | Path) -> Iterator[str]:
+    """
+    Linhas do arquivo (CRLF/CR normalizados), lidas em binário e decodificadas
+    uma vez no encoding do arquivo inteiro (ver encoding_do_arquivo).
+    """
+    encoding = encoding_do_arquivo(caminho)
+    with open(caminho, "rb") as f:
+        for bruta in f:
+            linha = bruta.decode(encoding)
+
+            if "\r" in linha:
+                linha = linha.replace("\r\n", "\n").replace("\r", "\n")
+                partes = linha.split("\n")
+                for parte in partes[:-1]:
+                    yield parte + "\n"
+                if partes[-1]:
+                    yield partes[-1]
+            else:
+                yield linha
+
+
+def iterar_blocos(linhas: Iterable[str]) -> Iterator[str]:
+    """Agrupa linhas em blocos: cada linha @EMP/CONTRATO abre um bloco novo."""
+    atual: list[str] = []
+    for linha in linhas:
+        if PADRAO_INICIO_BLOCO.match(linha) and atual:
+            yield "".join(atual)
+            atual = []
+        atual.append(linha)
+    if atual:
+        yield "".join(atual)
+
+
+def _valor_brl(v: str) -> float:
+    return float(v.replace(".", "").replace(",", "."))
+
+
+LAYOUTS: dict[str, LayoutTela] = {}
+
+
+def registrar_layout(layout: LayoutTela) -> LayoutTela:
+    LAYOUTS[layout.nome] = layout
+    return layout
+
+
+LAYOUT_L7RR = registrar_layout(
+    LayoutTela(
+        nome="L7RR",
+        filtros=("EMP/CONTRATO:",),
+        campos=(
+            CampoTela(("contrato",), r"EMP/CONTRATO:\s*(\d+/\d+)"),
+            CampoTela(
+                ("cliente", "cpf"),
+                r"CLIENTE:\s*(.+?)\s+CPF\s*:\s*([0-9\.\-]+)",
+                conversor=str.strip,
+            ),
+            CampoTela(("dt_contrato_inicial",), r"DT\.CONTRAT\.INICIAL:\s*(\d{2}/\d{2}/\d{2})"),
+            CampoTela(("qtd_cpa",), r"QTD\s+CPA:\s*(\d+)"),
+        ),
+    )
+)
+
+LAYOUT_F4_CONSULTA_BENS = registrar_layout(
+    LayoutTela(
+        nome="F4_CONSULTA_BENS",
+        filtros=("CONSULTA BEM", "CONTRATO:"),
+        campos=(
+            CampoTela(("contrato",), r"CONTRATO:\s*(\d+)"),
+            CampoTela(("dt_liquidacao",), r"DT\.LIQUIDACAO:\s*(\d{2}/\d{2}/\d{2})"),
+            CampoTela(
+                ("valor_bem",),
+                r"VL\.UNITARIO:\s*([\d\.]+,\d{2})",
+                agregacao="soma",
+                conversor=_valor_brl,
+                vazio=0.0,
+                finalizar=lambda v: round(v, 2),
+            ),
+        ),
+        obrigatorio="contrato",
+    )
+)
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+import csv
+import hashlib
+import io
+import math
+import os
 import re
 import shutil
-from dataclasses import dataclass
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
 import chardet
+import numpy as np
 import pandas as pd
+import pikepdf
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font
 from openpyxl.utils import get_column_letter
 from reportlab.lib.pagesizes import A4, landscape
@@ -15,10 +30,35 @@ from reportlab.lib.units import cm
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
-try:
-    from pypdf import PdfMerger
-except ImportError:
-    from PyPDF2 import PdfMerger
+from src.anexo_a.indice_pdfs import IndicePDFs
+from src.anexo_a.manifesto import ManifestoIncremental, assinatura_arquivo
+from src.anexo_a.pacote_blocos import ARQUIVO_INDICE, PacoteBlocos
+
+ARQUIVO_MANIFESTO = "manifesto_anexo_a.json"
+TAMANHO_LOTE_PDF = 64
+MAX_DOCUMENTOS_ABERTOS_MERGE = 64
+
+NIVEIS_ENCODING = ("utf8", "prefixo", "pasta", "chardet")
+TAMANHO_PREFIXO_ENCODING = 64 * 1024
+CONFIANCA_MINIMA_ENCODING = 0.8
+
+# veredito de encoding por pasta, por processo (cada worker mantém o seu)
+_ENCODING_POR_PASTA: dict[Path, str] = {}
+
+
+@lru_cache(maxsize=None)
+def largura_caractere_monoespacada(fonte_nome: str) -> float | None:
+    """
+    Largura de um caractere no tamanho 1 quando a fonte é monoespaçada (Courier);
+    None caso contrário. O cache vale por processo.
+    """
+    larguras = {stringWidth(c, fonte_nome, 1) for c in "iMW .#@0"}
+    return larguras.pop() if len(larguras) == 1 else None
+
+
+# só o ASCII imprimível tem a largura fixa da fonte; controles (tab, form feed,
+# ESC...) saem com outra largura no stringWidth
+RE_ASCII_IMPRIMIVEL = re.compile(r"[ -~]*")
 
 
 @dataclass
@@ -27,6 +67,7 @@ class ProcessamentoTXTResultado:
     contratos_novos: int
     ignorados_iguais: int
     duplicados_diferentes: int
+    arquivos_txt_inalterados: int = 0
 
     @property
     def contratos_gravados(self) -> int:
@@ -45,11 +86,79 @@ class ValidacaoTipoResultado:
     invalidos: int
 
 
+@dataclass
+class IndiceBlocosPasta:
+    """Índice em memória (hash de conteúdo) dos blocos já gravados numa pasta de tipo."""
+
+    RE_NOME = re.compile(r"^(?P<base>.+?)(?:_DUP(?P<dup>\d+))?$")
+
+    pasta: Path
+    hashes: dict[str, set[str]] = field(default_factory=dict)
+    variantes: dict[str, set[int]] = field(default_factory=dict)
+
+    @staticmethod
+    def hash_conteudo(conteudo: str) -> str:
+        return hashlib.blake2b(conteudo.encode("utf-8"), digest_size=16).hexdigest()
+
+    @classmethod
+    def carregar(
+        cls, pasta: Path, pacote: PacoteBlocos | None = None
+    ) -> IndiceBlocosPasta:
+        indice = cls(pasta=pasta)
+        if pacote is not None:
+            for entrada in pacote.entradas.values():
+                m = cls.RE_NOME.match(entrada.nome)
+                indice.registrar(
+                    m.group("base"),
+                    int(m.group("dup")) if m.group("dup") else 0,
+                    entrada.hash,
+                )
+
+        if not pasta.exists():
+            return indice
+
+        with os.scandir(pasta) as it:
+            for entry in it:
+                if not entry.name.endswith(".txt") or not entry.is_file():
+                    continue
+                m = cls.RE_NOME.match(entry.name[:-4])
+                conteudo = Path(entry.path).read_text(encoding="utf-8", errors="replace")
+                indice.registrar(
+                    m.group("base"),
+                    int(m.group("dup")) if m.group("dup") else 0,
+                    cls.hash_conteudo(conteudo),
+                )
+        return indice
+
+    def registrar(self, nome_base: str, variante: int, conteudo_hash: str) -> None:
+        self.hashes.setdefault(nome_base, set()).add(conteudo_hash)
+        self.variantes.setdefault(nome_base, set()).add(variante)
+
+    def reservar_nome(self, nome_base: str, conteudo_hash: str) -> str | None:
+        """
+        Decide o nome (sem extensão) para gravar um bloco e já o registra no índice.
+        Retorna None quando o mesmo conteúdo já existe para o contrato.
+        """
+        if conteudo_hash in self.hashes.get(nome_base, ()):
+            return None
+
+        usadas = self.variantes.get(nome_base, set())
+        variante = 0
+        if variante in usadas:
+            variante = 1
+            while variante in usadas:
+                variante += 1
+
+        self.registrar(nome_base, variante, conteudo_hash)
+        return nome_base if variante == 0 else f"{nome_base}_DUP{variante}"
+
+
 class TelasPretasProcessor:
     PADRAO_BLOCO = re.compile(
         r"^@(\d+/\d+)[\s\S]*?^#\1\s*$",
         re.MULTILINE,
     )
+    RE_INICIO_BLOCO = re.compile(r"@(\d+/\d+)")
 
     RE_CONTRATO_7 = re.compile(r"(?<!\d)(\d{7})(?!\d)")
     RE_CONTRATO_GERAL = re.compile(r"(?<!\d)(\d{4,15})(?!\d)")
@@ -59,10 +168,12 @@ class TelasPretasProcessor:
         pasta_entrada: str | Path,
         pasta_output: str | Path,
         usar_prefixo_da_subpasta: bool = False,
+        usar_pacote_blocos: bool = False,
     ) -> None:
         self.pasta_entrada = Path(pasta_entrada)
         self.pasta_output = Path(pasta_output)
         self.usar_prefixo_da_subpasta = usar_prefixo_da_subpasta
+        self.usar_pacote_blocos = usar_pacote_blocos
         self.pasta_output.mkdir(parents=True, exist_ok=True)
 
     # =========================================================
@@ -145,10 +256,51 @@ class TelasPretasProcessor:
 
     @staticmethod
     def detectar_encoding(caminho: str | Path) -> str:
+        return TelasPretasProcessor.detectar_encoding_com_nivel(caminho)[0]
+
+    @staticmethod
+    def detectar_encoding_com_nivel(
+        caminho: str | Path, raw: bytes | None = None
+    ) -> tuple[str, str]:
+        """
+        Detecta o encoding em níveis, do mais barato ao mais caro, e devolve
+        (encoding, nível que resolveu):
+        - utf8: o arquivo decodifica como UTF-8 estrito;
+        - prefixo: chardet sobre os primeiros TAMANHO_PREFIXO_ENCODING bytes, com
+          confiança mínima;
+        - pasta: veredito já obtido para outro arquivo da mesma pasta;
+        - chardet: chardet sobre o arquivo inteiro.
+        """
         caminho = Path(caminho)
-        raw = caminho.read_bytes()
+        if raw is None:
+            raw = caminho.read_bytes()
+
+        try:
+            raw.decode("utf-8")
+            return "utf-8", "utf8"
+        except UnicodeDecodeError:
+            pass
+
+        pasta = caminho.parent
+
+        deteccao = chardet.detect(raw[:TAMANHO_PREFIXO_ENCODING])
+        enc = deteccao.get("encoding")
+        # utf-8/ascii no prefixo não vale: o arquivo inteiro já falhou como UTF-8
+        if (
+            enc
+            and enc.lower() not in ("utf-8", "ascii")
+            and (deteccao.get("confidence") or 0) >= CONFIANCA_MINIMA_ENCODING
+        ):
+            _ENCODING_POR_PASTA[pasta] = enc
+            return enc, "prefixo"
+
+        enc = _ENCODING_POR_PASTA.get(pasta)
+        if enc:
+            return enc, "pasta"
+
         enc = chardet.detect(raw).get("encoding") or "utf-8"
-        return enc
+        _ENCODING_POR_PASTA[pasta] = enc
+        return enc, "chardet"
 
     @staticmethod
     def escolher_fonte_para_caber(
@@ -160,10 +312,14 @@ class TelasPretasProcessor:
     ) -> int:
         maior_linha = ""
         maior_largura = 0.0
+        largura_char = largura_caractere_monoespacada(fonte_nome)
 
         for ln in linhas:
             s = ln.rstrip("\n").rstrip("\r")
-            w = stringWidth(s, fonte_nome, fonte_max)
+            if largura_char is not None and RE_ASCII_IMPRIMIVEL.fullmatch(s):
+                w = len(s) * largura_char * fonte_max
+            else:
+                w = stringWidth(s, fonte_nome, fonte_max)
             if w > maior_largura:
                 maior_largura = w
                 maior_linha = s
@@ -174,6 +330,12 @@ class TelasPretasProcessor:
         tamanho = int((largura_util / maior_largura) * fonte_max)
         tamanho = max(fonte_min, min(fonte_max, tamanho))
 
+        if largura_char is not None and RE_ASCII_IMPRIMIVEL.fullmatch(maior_linha):
+            largura_maior_linha = len(maior_linha) * largura_char
+            while tamanho > fonte_min and largura_maior_linha * tamanho > largura_util:
+                tamanho -= 1
+            return tamanho
+
         while tamanho > fonte_min and stringWidth(maior_linha, fonte_nome, tamanho) > largura_util:
             tamanho -= 1
 
@@ -209,9 +371,11 @@ class TelasPretasProcessor:
         return {c for c in contratos if c != ""}
 
     @staticmethod
-    def _criar_logger(log_path: Path):
+    def _criar_logger(log_path: Path | None):
         def log(msg: str) -> None:
             print(msg)
+            if log_path is None:
+                return
             with open(log_path, "a", encoding="utf-8") as lf:
                 lf.write(msg + "\n")
         return log
@@ -229,69 +393,247 @@ class TelasPretasProcessor:
         pasta_tipo.mkdir(parents=True, exist_ok=True)
         return pasta_tipo
 
+    def _chave_entrada(self, arquivo_entrada: Path) -> str:
+        return arquivo_entrada.relative_to(self.pasta_entrada).as_posix()
+
+    @staticmethod
+    def _assinatura_validacao(
+        txt_contratos_esperados: Path, pastas: Iterable[str | Path], opcoes: dict
+    ) -> dict:
+        # o mtime de cada pasta visitada muda quando arquivos/subpastas entram ou
+        # saem; o índice do pacote cresce a cada bloco novo (ou remoção)
+        assinatura_pastas = {}
+        for pasta in pastas:
+            pasta = Path(pasta)
+            idx = pasta / ARQUIVO_INDICE
+            assinatura_pastas[str(pasta.resolve())] = [
+                pasta.stat().st_mtime_ns,
+                idx.stat().st_size if idx.exists() else 0,
+            ]
+        return {
+            "esperados": assinatura_arquivo(txt_contratos_esperados),
+            "pastas": assinatura_pastas,
+            "opcoes": opcoes,
+        }
+
+    def _validacao_inalterada(
+        self, registro: dict | None, txt_contratos_esperados: Path, opcoes: dict
+    ) -> bool:
+        """
+        Confere, sem varrer os gerados, se entradas, pastas e opções de saída são as
+        do registro e se todas as saídas registradas ainda existem.
+        """
+        if not registro or "assinatura" not in registro:
+            return False
+        try:
+            atual = self._assinatura_validacao(
+                txt_contratos_esperados, registro["assinatura"]["pastas"], opcoes
+            )
+        except OSError:
+            return False
+        return atual == registro["assinatura"] and all(
+            Path(s).exists() for s in registro.get("saidas", [])
+        )
+
+    @staticmethod
+    def listar_txts_da_pasta(pasta: Path) -> list[str]:
+        """Nomes .txt da pasta: arquivos soltos mais os blocos do pacote, se houver."""
+        nomes = [p.name for p in pasta.glob("*.txt")]
+        if PacoteBlocos.existe(pasta):
+            nomes.extend(e.nome_txt for e in PacoteBlocos(pasta).entradas.values())
+        return nomes
+
     # =========================================================
     # ETAPA 1 - PROCESSAR TODOS OS TXTs DA ÁRVORE
     # =========================================================
-    def processar_txts_da_arvore(self) -> ProcessamentoTXTResultado:
-        total_arquivos_txt = 0
-        total_contratos_novos = 0
-        total_ignorados_iguais = 0
-        total_duplicados_diferentes = 0
-
-        for arquivo_entrada in self.pasta_entrada.rglob("*.txt"):
-            texto = arquivo_entrada.read_text(encoding="utf-8", errors="replace")
-            pasta_tipo = self._obter_pasta_tipo(arquivo_entrada)
+    @classmethod
+    def separar_blocos(cls, linhas: Iterable[str]) -> Iterator[tuple[str, str]]:
+        """
+        Separa blocos @EMP/CONTRATO ... #EMP/CONTRATO linha a linha, sem carregar o
+        arquivo inteiro. Como no PADRAO_BLOCO, um bloco sem fechamento é
+        descartado: aqui isso acontece quando começa o bloco seguinte, então só
+        um bloco fica em memória (o regex ainda procuraria o fechamento até o
+        fim do arquivo, englobando os blocos do meio).
+        """
+        chave: str | None = None
+        fim = ""
+        buffer: list[str] = []
+
+        for linha in linhas:
+            m = cls.RE_INICIO_BLOCO.match(linha)
+            if m:
+                chave = m.group(1)
+                fim = f"#{chave}"
+                buffer = [linha]
+                continue
+            if chave is None:
+                continue
 
-            contador_no_txt = 0
+            buffer.append(linha)
+            if linha.rstrip() == fim:
+                yield chave, "".join(buffer).strip() + "\n"
+                chave = None
+                buffer = []
 
-            for bloco in self.PADRAO_BLOCO.finditer(texto):
-                contrato = bloco.group(1)
-                conteudo = bloco.group(0).strip() + "\n"
+    def iterar_blocos(self, arquivo_entrada: str | Path) -> Iterator[tuple[str, str]]:
+        with open(arquivo_entrada, "r", encoding="utf-8", errors="replace") as f:
+            yield from self.separar_blocos(f)
 
-                nome_base = contrato.replace("/", "_")
-                caminho_principal = pasta_tipo / f"{nome_base}.txt"
+    def _processar_txt(
+        self,
+        arquivo_entrada: Path,
+        pasta_tipo: Path,
+        indice: IndiceBlocosPasta,
+        pacote: PacoteBlocos | None = None,
+    ) -> tuple[int, int, int, list[str]]:
+        novos = 0
+        ignorados_iguais = 0
+        duplicados_diferentes = 0
+        gravados: list[str] = []
+
+        for contrato, conteudo in self.iterar_blocos(arquivo_entrada):
+            nome_base = contrato.replace("/", "_")
+            conteudo_hash = indice.hash_conteudo(conteudo)
+            nome = indice.reservar_nome(nome_base, conteudo_hash)
+
+            if nome is None:
+                ignorados_iguais += 1
+                continue
 
-                if not caminho_principal.exists():
-                    caminho_principal.write_text(conteudo, encoding="utf-8")
-                    total_contratos_novos += 1
-                    contador_no_txt += 1
-                    continue
+            if pacote is not None:
+                pacote.adicionar(nome, contrato, conteudo_hash, conteudo)
+            else:
+                (pasta_tipo / f"{nome}.txt").write_text(conteudo, encoding="utf-8")
+            gravados.append(f"{pasta_tipo.name}/{nome}.txt")
+            if nome == nome_base:
+                novos += 1
+            else:
+                duplicados_diferentes += 1
 
-                conteudo_existente = caminho_principal.read_text(
-                    encoding="utf-8",
-                    errors="replace",
+        print(
+            f"{arquivo_entrada.name} -> {pasta_tipo.name}: "
+            f"{novos + duplicados_diferentes} novos/duplicados "
+            f"(ignorados: dedup por igualdade)"
+        )
+        return novos, ignorados_iguais, duplicados_diferentes, gravados
+
+    def _processar_grupo_tipo(
+        self, pasta_tipo: Path, arquivos: list[Path], assinar: bool = False
+    ) -> tuple[int, int, int, int, list[tuple[Path, dict, list[str]]]]:
+        pacote = PacoteBlocos(pasta_tipo) if self.usar_pacote_blocos else None
+        indice = IndiceBlocosPasta.carregar(pasta_tipo, pacote)
+        novos = iguais = duplicados = 0
+        registros: list[tuple[Path, dict, list[str]]] = []
+
+        try:
+            for arquivo_entrada in arquivos:
+                n, i, d, gravados = self._processar_txt(
+                    arquivo_entrada, pasta_tipo, indice, pacote
                 )
+                novos += n
+                iguais += i
+                duplicados += d
+                if assinar:
+                    registros.append(
+                        (arquivo_entrada, assinatura_arquivo(arquivo_entrada), gravados)
+                    )
+        finally:
+            if pacote is not None:
+                pacote.fechar()
+
+        return len(arquivos), novos, iguais, duplicados, registros
+
+    def _parametros_worker(self) -> dict:
+        return {
+            "pasta_entrada": self.pasta_entrada,
+            "pasta_output": self.pasta_output,
+            "usar_prefixo_da_subpasta": self.usar_prefixo_da_subpasta,
+            "usar_pacote_blocos": self.usar_pacote_blocos,
+        }
+
+    def processar_txts_da_arvore(
+        self, workers: int = 1, incremental: bool = False
+    ) -> ProcessamentoTXTResultado:
+        """
+        Com workers > 1, os TXTs são agrupados pela pasta de tipo de destino e cada
+        grupo roda inteiro num processo: dois workers nunca disputam o mesmo
+        nome_base/_DUPn.
+
+        Com incremental=True, dumps já registrados no manifesto e sem alteração
+        (tamanho, mtime e hash) são pulados.
+        """
+        total_arquivos_txt = 0
+        total_contratos_novos = 0
+        total_ignorados_iguais = 0
+        total_duplicados_diferentes = 0
+        total_inalterados = 0
 
-                if conteudo_existente == conteudo:
-                    total_ignorados_iguais += 1
-                    continue
-
-                i = 1
-                while True:
-                    caminho_dup = pasta_tipo / f"{nome_base}_DUP{i}.txt"
-                    if not caminho_dup.exists():
-                        caminho_dup.write_text(conteudo, encoding="utf-8")
-                        total_duplicados_diferentes += 1
-                        contador_no_txt += 1
-                        break
-                    i += 1
+        manifesto = (
+            ManifestoIncremental(self.pasta_output / ARQUIVO_MANIFESTO)
+            if incremental
+            else None
+        )
 
-            print(
-                f"{arquivo_entrada.name} -> {pasta_tipo.name}: "
-                f"{contador_no_txt} novos/duplicados "
-                f"(ignorados: dedup por igualdade)"
+        grupos: dict[Path, list[Path]] = {}
+        for arquivo_entrada in self.pasta_entrada.rglob("*.txt"):
+            if manifesto is not None and manifesto.inalterado(
+                "entradas", self._chave_entrada(arquivo_entrada), arquivo_entrada
+            ):
+                total_inalterados += 1
+                continue
+            grupos.setdefault(self._obter_pasta_tipo(arquivo_entrada), []).append(
+                arquivo_entrada
             )
-            total_arquivos_txt += 1
+
+        if workers > 1 and len(grupos) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                futures = [
+                    ex.submit(
+                        _processar_grupo_tipo_worker,
+                        self._parametros_worker(),
+                        pasta_tipo,
+                        arquivos,
+                        incremental,
+                    )
+                    for pasta_tipo, arquivos in grupos.items()
+                ]
+                parciais = [fut.result() for fut in as_completed(futures)]
+        else:
+            parciais = [
+                self._processar_grupo_tipo(pasta_tipo, arquivos, incremental)
+                for pasta_tipo, arquivos in grupos.items()
+            ]
+
+        for arquivos, novos, iguais, duplicados, registros in parciais:
+            total_arquivos_txt += arquivos
+            total_contratos_novos += novos
+            total_ignorados_iguais += iguais
+            total_duplicados_diferentes += duplicados
+
+            if manifesto is not None:
+                for arquivo_entrada, assinatura, gravados in registros:
+                    manifesto.registrar(
+                        "entradas",
+                        self._chave_entrada(arquivo_entrada),
+                        assinatura,
+                        gravados,
+                    )
+
+        if manifesto is not None:
+            manifesto.salvar()
 
         resultado = ProcessamentoTXTResultado(
             arquivos_txt_processados=total_arquivos_txt,
             contratos_novos=total_contratos_novos,
             ignorados_iguais=total_ignorados_iguais,
             duplicados_diferentes=total_duplicados_diferentes,
+            arquivos_txt_inalterados=total_inalterados,
         )
 
         print("-" * 70)
         print(f"Arquivos TXT processados       : {resultado.arquivos_txt_processados}")
+        if manifesto is not None:
+            print(f"Arquivos TXT inalterados       : {resultado.arquivos_txt_inalterados}")
         print(f"Contratos gravados (novos+dup) : {resultado.contratos_gravados}")
         print(f"Novos                          : {resultado.contratos_novos}")
         print(f"Ignorados (iguais)             : {resultado.ignorados_iguais}")
@@ -313,13 +655,8 @@ class TelasPretasProcessor:
                 f"Arquivo de entrada não encontrado: {arquivo_entrada.resolve()}"
             )
 
-        texto = arquivo_entrada.read_text(encoding="utf-8", errors="replace")
-
         total = 0
-        for bloco in self.PADRAO_BLOCO.finditer(texto):
-            chave = bloco.group(1)
-            conteudo = bloco.group(0).strip() + "\n"
-
+        for chave, conteudo in self.iterar_blocos(arquivo_entrada):
             nome_arquivo = chave.replace("/", "_") + ".txt"
             (pasta_saida / nome_arquivo).write_text(conteudo, encoding="utf-8")
             total += 1
@@ -341,7 +678,20 @@ class TelasPretasProcessor:
         raiz_gerados: str | Path,
         pasta_saida_validacao: str | Path,
         nome_excel: str = "validacao_por_tipo.xlsx",
+        incremental: bool = False,
+        modo_streaming: bool = False,
+        saida_colunar: str | None = None,
+        vetorizado: bool = True,
     ) -> list[ValidacaoTipoResultado]:
+        """
+        modo_streaming=True grava o Excel com openpyxl write_only (memória constante,
+        larguras calculadas a partir dos próprios valores). saida_colunar ("csv" ou
+        "parquet") grava também faltantes/extras em formato longo.
+
+        vetorizado=True calcula faltantes/extras de todos os tipos de uma vez com
+        arrays ordenados (ver _validar_tipos_vetorizado); números de contrato que não
+        cabem em int64 caem no cálculo por conjuntos, pasta a pasta.
+        """
         txt_contratos_esperados = Path(txt_contratos_esperados)
         raiz_gerados = Path(raiz_gerados)
         pasta_saida_validacao = Path(pasta_saida_validacao)
@@ -353,17 +703,105 @@ class TelasPretasProcessor:
         pasta_txt_faltantes.mkdir(parents=True, exist_ok=True)
         txt_faltantes_geral = pasta_txt_faltantes / "faltantes_geral.txt"
 
+        manifesto = None
+        opcoes = {
+            "modo_streaming": modo_streaming,
+            "saida_colunar": saida_colunar.lower() if saida_colunar is not None else None,
+        }
+        if incremental:
+            manifesto = ManifestoIncremental(
+                pasta_saida_validacao / "manifesto_validacao.json"
+            )
+            registro = manifesto.secao("validacao").get(nome_excel)
+            if self._validacao_inalterada(registro, txt_contratos_esperados, opcoes):
+                print(f"Sem alterações desde a última validação: {arquivo_excel.resolve()}")
+                return [self._resultado_de_json(r) for r in registro["resultados"]]
+
+        contratos_esperados = self._ler_contratos_esperados(txt_contratos_esperados)
+        pastas_visitadas: list[Path] = []
+        nomes_por_pasta = self._varrer_gerados(raiz_gerados, pastas_visitadas)
+        if manifesto is not None:
+            # antes de gravar qualquer saída, para não registrar um estado posterior
+            assinatura = self._assinatura_validacao(
+                txt_contratos_esperados, sorted(pastas_visitadas), opcoes
+            )
+
+        resultados = None
+        if vetorizado:
+            resultados = self._validar_tipos_vetorizado(contratos_esperados, nomes_por_pasta)
+        if resultados is None:
+            resultados = self._validar_tipos_por_conjuntos(contratos_esperados, nomes_por_pasta)
+        resultado_por_tipo, faltantes_geral = resultados
+
+        saidas = [arquivo_excel, txt_faltantes_geral]
+        for r in resultado_por_tipo:
+            txt_tipo = pasta_txt_faltantes / f"faltantes_{r.tipo}.txt"
+            self.salvar_txt_lista(txt_tipo, r.faltantes)
+            saidas.append(txt_tipo)
+
+        self.salvar_txt_lista(txt_faltantes_geral, faltantes_geral)
+
+        if modo_streaming:
+            self._escrever_excel_validacao_streaming(resultado_por_tipo, arquivo_excel)
+        else:
+            self._escrever_excel_validacao(resultado_por_tipo, arquivo_excel)
+
+        arquivo_colunar = None
+        if saida_colunar is not None:
+            arquivo_colunar = self._escrever_faltantes_extras_colunar(
+                resultado_por_tipo, pasta_saida_validacao, saida_colunar
+            )
+            saidas.append(arquivo_colunar)
+
+        if manifesto is not None:
+            manifesto.secao("validacao")[nome_excel] = {
+                "assinatura": assinatura,
+                "saidas": [str(s.resolve()) for s in saidas],
+                "resultados": [self._resultado_para_json(r) for r in resultado_por_tipo],
+            }
+            manifesto.salvar()
+
+        print(f"Excel gerado em: {arquivo_excel.resolve()}")
+        print(f"TXTs de faltantes por tipo em: {pasta_txt_faltantes.resolve()}")
+        print(f"TXT de faltantes geral em: {txt_faltantes_geral.resolve()}")
+        if arquivo_colunar is not None:
+            print(f"Faltantes/extras ({saida_colunar}) em: {arquivo_colunar.resolve()}")
+
+        return resultado_por_tipo
+
+    @staticmethod
+    def _resultado_para_json(r: ValidacaoTipoResultado) -> dict:
+        return {
+            "tipo": r.tipo,
+            "pasta": str(r.pasta),
+            "esperado": r.esperado,
+            "encontrado": r.encontrado,
+            "faltantes": r.faltantes,
+            "extras": r.extras,
+            "extras_detalhado": r.extras_detalhado,
+            "invalidos": r.invalidos,
+        }
+
+    @staticmethod
+    def _resultado_de_json(d: dict) -> ValidacaoTipoResultado:
+        return ValidacaoTipoResultado(
+            tipo=d["tipo"],
+            pasta=Path(d["pasta"]),
+            esperado=d["esperado"],
+            encontrado=d["encontrado"],
+            faltantes=d["faltantes"],
+            extras=d["extras"],
+            extras_detalhado=[(n, nome) for n, nome in d["extras_detalhado"]],
+            invalidos=d["invalidos"],
+        )
+
+    def _ler_contratos_esperados(self, txt_contratos_esperados: Path) -> set[int]:
         if not txt_contratos_esperados.exists():
             raise FileNotFoundError(
                 f"Arquivo de contratos esperados não encontrado: "
                 f"{txt_contratos_esperados.resolve()}"
             )
 
-        if not raiz_gerados.exists():
-            raise FileNotFoundError(
-                f"Pasta raiz dos gerados não encontrada: {raiz_gerados.resolve()}"
-            )
-
         contratos_esperados: set[int] = set()
         for linha in txt_contratos_esperados.read_text(
             encoding="utf-8",
@@ -379,27 +817,153 @@ class TelasPretasProcessor:
             raise ValueError(
                 "Nenhum contrato válido foi lido do arquivo de contratos esperados."
             )
+        return contratos_esperados
 
-        pastas_tipo = sorted({p.parent for p in raiz_gerados.rglob("*.txt")})
-        if not pastas_tipo:
+    @staticmethod
+    def _varrer_gerados(
+        raiz_gerados: Path, pastas_visitadas: list[Path] | None = None
+    ) -> dict[Path, list[str]]:
+        """
+        Uma única varredura (os.scandir) da árvore de gerados: pasta de tipo -> nomes
+        .txt, incluindo os blocos do pacote quando a pasta tiver um. Se
+        pastas_visitadas for dada, recebe todas as pastas percorridas.
+        """
+        if not raiz_gerados.exists():
+            raise FileNotFoundError(
+                f"Pasta raiz dos gerados não encontrada: {raiz_gerados.resolve()}"
+            )
+
+        nomes_por_pasta: dict[Path, list[str]] = {}
+        pendentes = [raiz_gerados]
+        while pendentes:
+            pasta = pendentes.pop()
+            if pastas_visitadas is not None:
+                pastas_visitadas.append(pasta)
+            nomes: list[str] = []
+            tem_pacote = False
+            with os.scandir(pasta) as it:
+                for entrada in it:
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendentes.append(Path(entrada.path))
+                    elif entrada.name.endswith(".txt"):
+                        nomes.append(entrada.name)
+                    elif entrada.name == ARQUIVO_INDICE:
+                        tem_pacote = True
+
+            if tem_pacote:
+                nomes.extend(e.nome_txt for e in PacoteBlocos(pasta).entradas.values())
+            if nomes or tem_pacote:
+                nomes_por_pasta[pasta] = nomes
+
+        if not nomes_por_pasta:
             raise ValueError(
                 f"Nenhum .txt encontrado dentro de: {raiz_gerados.resolve()}"
             )
+        return nomes_por_pasta
+
+    def _triplas_gerados(
+        self, nomes_por_pasta: dict[Path, list[str]]
+    ) -> tuple[list[Path], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Achata a varredura em arrays paralelos (tipo, contrato, arquivo) ordenados
+        por tipo, contrato e nome, mais os inválidos por tipo. Levanta OverflowError
+        se algum contrato não couber em int64.
+        """
+        pastas = sorted(nomes_por_pasta)
+        tipos: list[int] = []
+        contratos: list[int] = []
+        nomes: list[str] = []
+        invalidos = np.zeros(len(pastas), dtype=np.int64)
+
+        for i, pasta in enumerate(pastas):
+            for nome_txt in nomes_por_pasta[pasta]:
+                n = self.extrair_numero_contrato_do_arquivo(nome_txt[:-4])
+                if n is None:
+                    invalidos[i] += 1
+                    continue
+                tipos.append(i)
+                contratos.append(n)
+                nomes.append(nome_txt)
+
+        arr_tipos = np.array(tipos, dtype=np.int64)
+        arr_contratos = np.array(contratos, dtype=np.int64)
+        arr_nomes = np.array(nomes, dtype=str)
+
+        ordem = np.lexsort((arr_nomes, arr_contratos, arr_tipos))
+        return pastas, arr_tipos[ordem], arr_contratos[ordem], arr_nomes[ordem], invalidos
+
+    @staticmethod
+    def _cobertura(
+        esperados: np.ndarray, n_tipos: int, tipos: np.ndarray, contratos: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Matriz booleana tipo x esperado e a máscara de quais triplas são esperadas."""
+        pos = np.searchsorted(esperados, contratos)
+        eh_esperado = esperados[np.minimum(pos, len(esperados) - 1)] == contratos
+
+        cobertura = np.zeros((n_tipos, len(esperados)), dtype=bool)
+        cobertura[tipos[eh_esperado], pos[eh_esperado]] = True
+        return cobertura, eh_esperado
+
+    def _validar_tipos_vetorizado(
+        self, contratos_esperados: set[int], nomes_por_pasta: dict[Path, list[str]]
+    ) -> tuple[list[ValidacaoTipoResultado], list[int]] | None:
+        try:
+            esperados = np.array(sorted(contratos_esperados), dtype=np.int64)
+            pastas, tipos, contratos, nomes, invalidos = self._triplas_gerados(nomes_por_pasta)
+        except OverflowError:
+            return None
+
+        cobertura, eh_esperado = self._cobertura(esperados, len(pastas), tipos, contratos)
+
+        # as triplas já vêm ordenadas: um par (tipo, contrato) novo marca um contrato
+        # encontrado distinto
+        novo_par = np.ones(len(tipos), dtype=bool)
+        novo_par[1:] = (tipos[1:] != tipos[:-1]) | (contratos[1:] != contratos[:-1])
+        encontrados = np.bincount(tipos[novo_par], minlength=len(pastas))
+
+        extra = ~eh_esperado
+        tipos_extra, contratos_extra, nomes_extra = tipos[extra], contratos[extra], nomes[extra]
+        inicio_extra = np.searchsorted(tipos_extra, np.arange(len(pastas) + 1))
+
+        resultado_por_tipo: list[ValidacaoTipoResultado] = []
+        for i, pasta in enumerate(pastas):
+            ini, fim = inicio_extra[i], inicio_extra[i + 1]
+            contratos_tipo = contratos_extra[ini:fim]
+            resultado_por_tipo.append(
+                ValidacaoTipoResultado(
+                    tipo=pasta.name,
+                    pasta=pasta,
+                    esperado=len(esperados),
+                    encontrado=int(encontrados[i]),
+                    faltantes=esperados[~cobertura[i]].tolist(),
+                    extras=np.unique(contratos_tipo).tolist(),
+                    extras_detalhado=list(
+                        zip(contratos_tipo.tolist(), nomes_extra[ini:fim].tolist())
+                    ),
+                    invalidos=int(invalidos[i]),
+                )
+            )
 
+        faltantes_geral = esperados[~cobertura.all(axis=0)].tolist()
+        return resultado_por_tipo, faltantes_geral
+
+    def _validar_tipos_por_conjuntos(
+        self, contratos_esperados: set[int], nomes_por_pasta: dict[Path, list[str]]
+    ) -> tuple[list[ValidacaoTipoResultado], list[int]]:
         resultado_por_tipo: list[ValidacaoTipoResultado] = []
         faltantes_geral_set: set[int] = set()
 
-        for pasta in pastas_tipo:
+        for pasta in sorted(nomes_por_pasta):
             tipo = pasta.name
             encontrados_map: dict[int, list[str]] = {}
             invalidos = 0
 
-            for arq in pasta.glob("*.txt"):
-                n = self.extrair_numero_contrato_do_arquivo(arq.stem)
+            for nome_txt in nomes_por_pasta[pasta]:
+                n = self.extrair_numero_contrato_do_arquivo(nome_txt[:-4])
                 if n is None:
                     invalidos += 1
                     continue
-                encontrados_map.setdefault(n, []).append(arq.name)
+                encontrados_map.setdefault(n, []).append(nome_txt)
 
             encontrados_set = set(encontrados_map.keys())
             faltantes = sorted(contratos_esperados - encontrados_set)
@@ -425,14 +989,31 @@ class TelasPretasProcessor:
                 )
             )
 
-        for r in resultado_por_tipo:
-            self.salvar_txt_lista(
-                pasta_txt_faltantes / f"faltantes_{r.tipo}.txt",
-                r.faltantes,
-            )
-
-        self.salvar_txt_lista(txt_faltantes_geral, sorted(faltantes_geral_set))
+        return resultado_por_tipo, sorted(faltantes_geral_set)
+
+    def matriz_cobertura_por_tipo(
+        self, txt_contratos_esperados: str | Path, raiz_gerados: str | Path
+    ) -> pd.DataFrame:
+        """
+        Contratos esperados (linhas) x tipos (colunas): True quando a pasta do tipo
+        tem ao menos um arquivo do contrato. Serve de base para heatmaps de cobertura.
+        """
+        contratos_esperados = self._ler_contratos_esperados(Path(txt_contratos_esperados))
+        nomes_por_pasta = self._varrer_gerados(Path(raiz_gerados))
+
+        esperados = np.array(sorted(contratos_esperados), dtype=np.int64)
+        pastas, tipos, contratos, _, _ = self._triplas_gerados(nomes_por_pasta)
+        cobertura, _ = self._cobertura(esperados, len(pastas), tipos, contratos)
+
+        return pd.DataFrame(
+            cobertura.T,
+            index=pd.Index(esperados, name="contrato"),
+            columns=[p.name for p in pastas],
+        )
 
+    def _escrever_excel_validacao(
+        self, resultado_por_tipo: list[ValidacaoTipoResultado], arquivo_excel: Path
+    ) -> None:
         wb = Workbook()
 
         ws_resumo = wb.active
@@ -460,17 +1041,7 @@ class TelasPretasProcessor:
         ws_resumo.freeze_panes = "A2"
         self.ajustar_larguras(ws_resumo)
 
-        nomes_usados = set()
-        for r in resultado_por_tipo:
-            base = self.sanitizar_nome_aba(r.tipo)
-            nome_aba = base
-            i = 2
-            while nome_aba in nomes_usados:
-                sufixo = f"_{i}"
-                nome_aba = (base[: 31 - len(sufixo)] + sufixo)[:31]
-                i += 1
-            nomes_usados.add(nome_aba)
-
+        for r, nome_aba in zip(resultado_por_tipo, self._nomes_abas_validacao(resultado_por_tipo)):
             ws = wb.create_sheet(title=nome_aba)
 
             ws.append(["Tipo", r.tipo])
@@ -528,11 +1099,162 @@ class TelasPretasProcessor:
 
         wb.save(arquivo_excel)
 
-        print(f"Excel gerado em: {arquivo_excel.resolve()}")
-        print(f"TXTs de faltantes por tipo em: {pasta_txt_faltantes.resolve()}")
-        print(f"TXT de faltantes geral em: {txt_faltantes_geral.resolve()}")
+    @staticmethod
+    def _nomes_abas_validacao(resultado_por_tipo: list[ValidacaoTipoResultado]) -> list[str]:
+        nomes_usados: set[str] = set()
+        nomes: list[str] = []
+        for r in resultado_por_tipo:
+            base = TelasPretasProcessor.sanitizar_nome_aba(r.tipo)
+            nome_aba = base
+            i = 2
+            while nome_aba in nomes_usados:
+                sufixo = f"_{i}"
+                nome_aba = (base[: 31 - len(sufixo)] + sufixo)[:31]
+                i += 1
+            nomes_usados.add(nome_aba)
+            nomes.append(nome_aba)
+        return nomes
 
-        return resultado_por_tipo
+    @staticmethod
+    def _linhas_resumo_validacao(
+        resultado_por_tipo: list[ValidacaoTipoResultado],
+    ) -> Iterator[tuple[list, int]]:
+        yield ["Tipo", "Esperado", "Encontrado", "Faltantes", "Extras", "Inválidos", "Pasta"], 7
+        for r in resultado_por_tipo:
+            yield [
+                r.tipo,
+                r.esperado,
+                r.encontrado,
+                len(r.faltantes),
+                len(r.extras),
+                r.invalidos,
+                str(r.pasta.resolve()),
+            ], 0
+
+    @staticmethod
+    def _linhas_aba_validacao(r: ValidacaoTipoResultado) -> Iterator[tuple[list, int]]:
+        """
+        Mesmo layout da aba de _escrever_excel_validacao, como (valores, quantidade
+        de colunas iniciais em negrito).
+        """
+        yield ["Tipo", r.tipo], 1
+        yield ["Pasta", str(r.pasta.resolve())], 1
+        yield ["Total esperado", r.esperado], 1
+        yield ["Total encontrado", r.encontrado], 1
+        yield ["Qtd faltantes", len(r.faltantes)], 1
+        yield ["Qtd extras", len(r.extras)], 1
+        yield ["Arquivos inválidos (nome não parseável)", r.invalidos], 1
+        yield [], 0
+        yield ["FALTANTES (contratos esperados que NÃO foram encontrados nesta pasta)"], 1
+        yield ["Contrato (numérico)"], 1
+        if r.faltantes:
+            for n in r.faltantes:
+                yield [n], 0
+        else:
+            yield ["(nenhum)"], 0
+        yield [], 0
+        yield ["EXTRAS (arquivos encontrados que NÃO pertencem ao lote esperado)"], 1
+        yield ["Contrato extra (numérico)", "Arquivo (.txt)"], 2
+        if r.extras_detalhado:
+            for n, fname in r.extras_detalhado:
+                yield [n, fname], 0
+        else:
+            yield ["(nenhum)"], 0
+
+    @staticmethod
+    def _escrever_aba_streaming(ws, linhas, freeze_panes: str, centralizar_negrito: bool) -> None:
+        # write_only exige as larguras antes da primeira linha: uma passada só mede,
+        # a segunda grava (as linhas saem dos resultados já em memória)
+        larguras: dict[int, int] = {}
+        for valores, _ in linhas():
+            for col, val in enumerate(valores, start=1):
+                if val is not None:
+                    larguras[col] = max(larguras.get(col, 0), len(str(val)))
+        for col in range(1, max(larguras, default=0) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = min(larguras.get(col, 0) + 2, 80)
+
+        ws.freeze_panes = freeze_panes
+
+        fonte_negrito = Font(bold=True)
+        centralizado = Alignment(horizontal="center")
+        for valores, qtd_negrito in linhas():
+            if not qtd_negrito:
+                ws.append(valores)
+                continue
+
+            celulas = []
+            for col, val in enumerate(valores, start=1):
+                cell = WriteOnlyCell(ws, value=val)
+                if col <= qtd_negrito:
+                    cell.font = fonte_negrito
+                    if centralizar_negrito:
+                        cell.alignment = centralizado
+                celulas.append(cell)
+            ws.append(celulas)
+
+    def _escrever_excel_validacao_streaming(
+        self, resultado_por_tipo: list[ValidacaoTipoResultado], arquivo_excel: Path
+    ) -> None:
+        wb = Workbook(write_only=True)
+
+        ws_resumo = wb.create_sheet(title="Resumo")
+        self._escrever_aba_streaming(
+            ws_resumo,
+            lambda: self._linhas_resumo_validacao(resultado_por_tipo),
+            "A2",
+            centralizar_negrito=True,
+        )
+
+        for r, nome_aba in zip(resultado_por_tipo, self._nomes_abas_validacao(resultado_por_tipo)):
+            ws = wb.create_sheet(title=nome_aba)
+            self._escrever_aba_streaming(
+                ws, lambda r=r: self._linhas_aba_validacao(r), "A11", centralizar_negrito=False
+            )
+
+        wb.save(arquivo_excel)
+
+    @staticmethod
+    def _escrever_faltantes_extras_colunar(
+        resultado_por_tipo: list[ValidacaoTipoResultado],
+        pasta_saida_validacao: Path,
+        formato: str,
+    ) -> Path:
+        """Saída longa (tipo, situacao, contrato, arquivo) para ferramentas downstream."""
+        formato = formato.lower()
+        if formato not in ("csv", "parquet"):
+            raise ValueError(f"Formato colunar não suportado: {formato}. Use 'csv' ou 'parquet'.")
+
+        destino = pasta_saida_validacao / f"faltantes_extras.{formato}"
+
+        def linhas():
+            for r in resultado_por_tipo:
+                for n in r.faltantes:
+                    yield r.tipo, "faltante", n, None
+                for n, fname in r.extras_detalhado:
+                    yield r.tipo, "extra", n, fname
+
+        if formato == "csv":
+            with open(destino, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["tipo", "situacao", "contrato", "arquivo"])
+                writer.writerows(linhas())
+        else:
+            tipos, situacoes, contratos, arquivos = [], [], [], []
+            for tipo, situacao, contrato, arquivo in linhas():
+                tipos.append(tipo)
+                situacoes.append(situacao)
+                contratos.append(contrato)
+                arquivos.append(arquivo)
+            pd.DataFrame(
+                {
+                    "tipo": pd.Series(tipos, dtype="string"),
+                    "situacao": pd.Series(situacoes, dtype="string"),
+                    "contrato": pd.Series(contratos, dtype="int64"),
+                    "arquivo": pd.Series(arquivos, dtype="string"),
+                }
+            ).to_parquet(destino, index=False)
+
+        return destino
 
     # =========================================================
     # ETAPA 4 - MOVER/COPIAR EXTRAS COM BASE NO EXCEL
@@ -588,6 +1310,7 @@ class TelasPretasProcessor:
             destino_tipo.mkdir(parents=True, exist_ok=True)
 
             movidos_nesta_aba = 0
+            pacote = PacoteBlocos(pasta_origem) if PacoteBlocos.existe(pasta_origem) else None
 
             while row <= ws.max_row:
                 arquivo_txt = ws.cell(row=row, column=2).value
@@ -613,11 +1336,21 @@ class TelasPretasProcessor:
                         shutil.copy2(str(origem), str(destino))
                     total_movidos += 1
                     movidos_nesta_aba += 1
+                elif pacote is not None and origem.stem in pacote:
+                    # o pacote é append-only: o bloco é extraído e, ao mover,
+                    # sai do índice por uma lápide
+                    pacote.materializar(origem.stem, destino)
+                    if mover:
+                        pacote.remover(origem.stem)
+                    total_movidos += 1
+                    movidos_nesta_aba += 1
                 else:
                     total_nao_encontrados += 1
 
                 row += 1
 
+            if pacote is not None:
+                pacote.fechar()
             print(f"Aba {nome_aba} (Tipo={tipo}): movidos {movidos_nesta_aba}")
             total_abas_processadas += 1
 
@@ -635,16 +1368,25 @@ class TelasPretasProcessor:
         self,
         txt_path: str | Path,
         pdf_path: str | Path,
-    ) -> None:
+    ) -> str:
         txt_path = Path(txt_path)
-        pdf_path = Path(pdf_path)
-
-        pdf_path.parent.mkdir(parents=True, exist_ok=True)
 
-        encoding = self.detectar_encoding(txt_path)
-        with open(txt_path, "r", encoding=encoding, errors="replace") as f:
+        raw = txt_path.read_bytes()
+        encoding, nivel = self.detectar_encoding_com_nivel(txt_path, raw)
+        with io.TextIOWrapper(io.BytesIO(raw), encoding=encoding, errors="replace") as f:
             linhas = f.readlines()
 
+        self.linhas_para_pdf_sem_quebrar(linhas, pdf_path)
+        return nivel
+
+    def linhas_para_pdf_sem_quebrar(
+        self,
+        linhas: list[str],
+        pdf_path: str | Path,
+    ) -> None:
+        pdf_path = Path(pdf_path)
+        pdf_path.parent.mkdir(parents=True, exist_ok=True)
+
         pagesize = landscape(A4)
         largura, altura = pagesize
 
@@ -696,7 +1438,17 @@ class TelasPretasProcessor:
         pasta_txt: str | Path,
         pasta_pdf: str | Path,
         recursivo: bool = True,
+        incremental: bool = False,
+        workers: int = 1,
     ) -> None:
+        """
+        Com incremental=True, pula PDFs que já existem e são mais novos que o TXT de
+        origem. Blocos de pacote são imutáveis: basta o PDF existir.
+
+        Com workers > 1, a renderização roda num pool de processos; os pendentes são
+        repartidos entre os workers em lotes de no máximo TAMANHO_LOTE_PDF arquivos.
+        O log mantém a ordem e o formato do modo serial.
+        """
         pasta_txt = Path(pasta_txt).expanduser().resolve()
         pasta_pdf = Path(pasta_pdf).expanduser().resolve()
         pasta_pdf.mkdir(parents=True, exist_ok=True)
@@ -715,40 +1467,128 @@ class TelasPretasProcessor:
 
         arquivos = [p for p in arquivos if pasta_pdf not in p.parents]
 
+        # blocos guardados em pacote entram como (pasta do pacote, nome do bloco)
+        padrao_pacote = f"**/{ARQUIVO_INDICE}" if recursivo else ARQUIVO_INDICE
+        pacotes = [
+            PacoteBlocos(p.parent)
+            for p in sorted(pasta_txt.glob(padrao_pacote))
+            if pasta_pdf not in p.parents
+        ]
+
+        trabalhos: list[tuple[Path, PacoteBlocos | None]] = [(p, None) for p in arquivos]
+        for pacote in pacotes:
+            trabalhos.extend(
+                (pacote.pasta / e.nome_txt, pacote)
+                for e in sorted(pacote.entradas.values(), key=lambda e: e.nome)
+            )
+
         log(f"[INFO] Pasta entrada: {pasta_txt}")
         log(f"[INFO] Pasta saída  : {pasta_pdf}")
-        log(f"[INFO] TXT encontrados: {len(arquivos)} (recursivo={recursivo})")
+        log(f"[INFO] TXT encontrados: {len(trabalhos)} (recursivo={recursivo})")
+        if pacotes:
+            log(f"[INFO] Pacotes de blocos: {len(pacotes)}")
 
-        if not arquivos:
+        if not trabalhos:
             log("[AVISO] Nenhum .txt encontrado. Verifique se existem .txt nessa pasta/subpastas.")
             return
 
-        for p in arquivos[:5]:
+        for p, _ in trabalhos[:5]:
             log(f"[AMOSTRA] {p}")
 
         ok = 0
         falhas = 0
+        inalterados = 0
+        niveis_encoding: Counter[str | None] = Counter()
+
+        pendentes: list[tuple[Path, PacoteBlocos | None, Path]] = []
+        for txt, pacote in trabalhos:
+            pdf_dest = (pasta_pdf / txt.relative_to(pasta_txt)).with_suffix(".pdf")
+            if incremental and self._pdf_atualizado(txt, pacote, pdf_dest):
+                inalterados += 1
+                continue
+            pendentes.append((txt, pacote, pdf_dest))
 
-        for txt in arquivos:
-            try:
-                rel = txt.relative_to(pasta_txt)
-                pdf_dest = (pasta_pdf / rel).with_suffix(".pdf")
-
-                self.txt_para_pdf_sem_quebrar(txt, pdf_dest)
-
-                if not pdf_dest.exists() or pdf_dest.stat().st_size == 0:
-                    raise RuntimeError("PDF não foi criado (arquivo ausente ou tamanho 0).")
+        if workers > 1 and len(pendentes) > 1:
+            tamanho_lote = min(TAMANHO_LOTE_PDF, math.ceil(len(pendentes) / workers))
+            lotes = [
+                [
+                    (txt, pacote.pasta if pacote is not None else None, pdf_dest)
+                    for txt, pacote, pdf_dest in pendentes[i : i + tamanho_lote]
+                ]
+                for i in range(0, len(pendentes), tamanho_lote)
+            ]
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                resultados = (
+                    r
+                    for lote in ex.map(
+                        _converter_lote_pdf_worker, repeat(self._parametros_worker()), lotes
+                    )
+                    for r in lote
+                )
+                for txt, pdf_dest, erro, nivel in resultados:
+                    niveis_encoding[nivel] += 1
+                    if self._registrar_conversao(log, txt, pdf_dest, erro):
+                        ok += 1
+                    else:
+                        falhas += 1
+        else:
+            for txt, pacote, pdf_dest in pendentes:
+                erro, nivel = self._converter_trabalho(txt, pacote, pdf_dest)
+                niveis_encoding[nivel] += 1
+                if self._registrar_conversao(log, txt, pdf_dest, erro):
+                    ok += 1
+                else:
+                    falhas += 1
 
-                ok += 1
-                log(f"[OK] {txt.name} -> {pdf_dest}")
-            except Exception as e:
-                falhas += 1
-                log(f"[ERRO] Falha em: {txt}")
-                log(f"       Motivo: {type(e).__name__}: {e}")
+        if any(niveis_encoding[n] for n in NIVEIS_ENCODING):
+            log(
+                "[INFO] Encoding por nível: "
+                + " | ".join(f"{n}={niveis_encoding[n]}" for n in NIVEIS_ENCODING)
+            )
 
+        if incremental:
+            log(f"[INFO] PDFs já atualizados (pulados): {inalterados}")
         log(f"[RESULTADO] PDFs gerados: {ok} | Falhas: {falhas}")
         log(f"[INFO] Log salvo em: {log_path}")
 
+    def _converter_trabalho(
+        self, txt: Path, pacote: PacoteBlocos | None, pdf_dest: Path
+    ) -> tuple[str | None, str | None]:
+        nivel = None
+        try:
+            if pacote is not None:
+                linhas = io.StringIO(pacote.ler(txt.stem)).readlines()
+                self.linhas_para_pdf_sem_quebrar(linhas, pdf_dest)
+            else:
+                nivel = self.txt_para_pdf_sem_quebrar(txt, pdf_dest)
+
+            if not pdf_dest.exists() or pdf_dest.stat().st_size == 0:
+                raise RuntimeError("PDF não foi criado (arquivo ausente ou tamanho 0).")
+        except Exception as e:
+            return f"{type(e).__name__}: {e}", nivel
+        return None, nivel
+
+    @staticmethod
+    def _registrar_conversao(log, txt: Path, pdf_dest: Path, erro: str | None) -> bool:
+        if erro is None:
+            log(f"[OK] {txt.name} -> {pdf_dest}")
+            return True
+        log(f"[ERRO] Falha em: {txt}")
+        log(f"       Motivo: {erro}")
+        return False
+
+    @staticmethod
+    def _pdf_atualizado(txt: Path, pacote: PacoteBlocos | None, pdf_dest: Path) -> bool:
+        try:
+            st_pdf = pdf_dest.stat()
+        except FileNotFoundError:
+            return False
+        if st_pdf.st_size == 0:
+            return False
+        if pacote is not None:
+            return True
+        return st_pdf.st_mtime_ns >= txt.stat().st_mtime_ns
+
     # =========================================================
     # ETAPA 6 - MERGE GLOBAL POR CONTRATO
     # =========================================================
@@ -757,7 +1597,27 @@ class TelasPretasProcessor:
         pasta_base: str | Path,
         recursivo: bool = True,
         nome_pasta_saida: str = "merged",
+        incremental: bool = False,
+        workers: int = 1,
+        max_documentos_abertos: int = MAX_DOCUMENTOS_ABERTOS_MERGE,
     ) -> None:
+        """
+        Com incremental=True, só refaz contratos cujos PDFs membros (caminho,
+        tamanho, mtime) mudaram desde o último merge registrado no manifesto.
+
+        O merge copia a árvore de páginas com pikepdf, sem re-serializar cada PDF.
+        Com workers > 1 os contratos são distribuídos num pool de processos; o log
+        continua na ordem dos contratos. max_documentos_abertos limita os PDFs
+        abertos ao mesmo tempo somando todos os workers: contratos com mais
+        membros são mesclados em parciais temporários. Se o limite não comportar
+        3 documentos por worker, o número de workers é reduzido (com aviso no log).
+        """
+        if max_documentos_abertos < 3:
+            raise ValueError(
+                "max_documentos_abertos deve ser ao menos 3 "
+                f"(recebido {max_documentos_abertos})."
+            )
+
         pasta_base = Path(pasta_base).expanduser().resolve()
         if not pasta_base.exists():
             raise FileNotFoundError(f"Pasta base não existe: {pasta_base}")
@@ -771,6 +1631,13 @@ class TelasPretasProcessor:
 
         log = self._criar_logger(log_path)
 
+        if workers > max_documentos_abertos // 3:
+            log(
+                f"[AVISO] {workers} workers com max_documentos_abertos={max_documentos_abertos}: "
+                f"usando {max_documentos_abertos // 3} workers (mínimo de 3 documentos por worker)."
+            )
+            workers = max_documentos_abertos // 3
+
         padrao = "**/*.pdf" if recursivo else "*.pdf"
         pdfs = sorted(pasta_base.glob(padrao))
         pdfs = [p for p in pdfs if pasta_merged not in p.parents]
@@ -803,33 +1670,128 @@ class TelasPretasProcessor:
 
         ok = 0
         falhas = 0
+        inalterados = 0
 
+        manifesto = (
+            ManifestoIncremental(pasta_merged / "manifesto_merge.json")
+            if incremental
+            else None
+        )
+
+        tarefas: list[tuple[str, list[Path], Path]] = []
+        membros_por_contrato: dict[str, list[list]] = {}
         for contrato, arquivos in sorted(grupos.items(), key=lambda x: x[0]):
             try:
                 arquivos = sorted(arquivos, key=lambda p: str(p).lower())
                 out_pdf = pasta_merged / f"{contrato}.pdf"
 
-                merger = PdfMerger()
-                for a in arquivos:
-                    merger.append(str(a))
-
-                with open(out_pdf, "wb") as f_out:
-                    merger.write(f_out)
-                merger.close()
-
-                if not out_pdf.exists() or out_pdf.stat().st_size == 0:
-                    raise RuntimeError("PDF final não foi criado (ausente ou tamanho 0).")
-
-                ok += 1
-                log(f"[OK] Contrato {contrato}: {len(arquivos)} PDFs -> {out_pdf.name}")
+                if manifesto is not None:
+                    membros = self._assinatura_membros(pasta_base, arquivos)
+                    registro = manifesto.secao("contratos").get(contrato)
+                    if (
+                        registro is not None
+                        and registro.get("membros") == membros
+                        and out_pdf.exists()
+                        and out_pdf.stat().st_size > 0
+                    ):
+                        inalterados += 1
+                        continue
+                    membros_por_contrato[contrato] = membros
             except Exception as e:
                 falhas += 1
                 log(f"[ERRO] Contrato {contrato}: {type(e).__name__}: {e}")
+                continue
+
+            tarefas.append((contrato, arquivos, out_pdf))
+
+        max_por_worker = max_documentos_abertos // max(1, workers)
+        if workers > 1 and len(tarefas) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                erros = ex.map(
+                    _mesclar_contrato_worker,
+                    tarefas,
+                    repeat(max_por_worker),
+                    chunksize=max(1, min(64, len(tarefas) // (workers * 4))),
+                )
+                # ex.map devolve na ordem de submissão: o log sai igual ao serial
+                for (contrato, arquivos, out_pdf), erro in zip(tarefas, erros):
+                    if self._registrar_merge(
+                        log, manifesto, membros_por_contrato, contrato, arquivos, out_pdf, erro
+                    ):
+                        ok += 1
+                    else:
+                        falhas += 1
+        else:
+            for tarefa in tarefas:
+                erro = _mesclar_contrato_worker(tarefa, max_por_worker)
+                contrato, arquivos, out_pdf = tarefa
+                if self._registrar_merge(
+                    log, manifesto, membros_por_contrato, contrato, arquivos, out_pdf, erro
+                ):
+                    ok += 1
+                else:
+                    falhas += 1
 
+        if manifesto is not None:
+            manifesto.salvar()
+            log(f"[INFO] Contratos sem alteração (pulados): {inalterados}")
         log(f"[RESULTADO] Merges gerados: {ok} | Falhas: {falhas}")
         log(f"[INFO] Log salvo em: {log_path}")
         print("\n[FINALIZADO] Merge global concluído.")
 
+    @staticmethod
+    def _registrar_merge(
+        log,
+        manifesto: ManifestoIncremental | None,
+        membros_por_contrato: dict[str, list[list]],
+        contrato: str,
+        arquivos: list[Path],
+        out_pdf: Path,
+        erro: str | None,
+    ) -> bool:
+        if erro is not None:
+            log(f"[ERRO] Contrato {contrato}: {erro}")
+            return False
+
+        if manifesto is not None:
+            manifesto.secao("contratos")[contrato] = {"membros": membros_por_contrato[contrato]}
+        log(f"[OK] Contrato {contrato}: {len(arquivos)} PDFs -> {out_pdf.name}")
+        return True
+
+    @classmethod
+    def mesclar_pdfs(cls, arquivos: list[Path], destino: Path, max_documentos_abertos: int) -> None:
+        """
+        Concatena as páginas de `arquivos` em `destino` com pikepdf. Os PDFs de
+        origem precisam ficar abertos até o save (o destino conta como um
+        documento aberto); acima do limite, mescla em parciais temporários na
+        pasta do destino e depois mescla os parciais.
+        """
+        if len(arquivos) <= max_documentos_abertos - 1:
+            with ExitStack() as pilha:
+                pdf_final = pilha.enter_context(pikepdf.Pdf.new())
+                for a in arquivos:
+                    origem = pilha.enter_context(pikepdf.open(a))
+                    pdf_final.pages.extend(origem.pages)
+                pdf_final.save(destino)
+            return
+
+        tamanho = max_documentos_abertos - 1
+        with TemporaryDirectory(dir=destino.parent, prefix=f".{destino.stem}_") as tmp:
+            parciais = []
+            for i in range(0, len(arquivos), tamanho):
+                parcial = Path(tmp) / f"parcial_{i // tamanho:05d}.pdf"
+                cls.mesclar_pdfs(arquivos[i : i + tamanho], parcial, max_documentos_abertos)
+                parciais.append(parcial)
+            cls.mesclar_pdfs(parciais, destino, max_documentos_abertos)
+
+    @staticmethod
+    def _assinatura_membros(pasta_base: Path, arquivos: list[Path]) -> list[list]:
+        membros = []
+        for a in arquivos:
+            st = a.stat()
+            membros.append([a.relative_to(pasta_base).as_posix(), st.st_size, st.st_mtime_ns])
+        return membros
+
     # =========================================================
     # ETAPA 7 - FILTRAR PDFs POR CSV
     # =========================================================
@@ -841,7 +1803,21 @@ class TelasPretasProcessor:
         coluna_csv: str = "Contrato",
         recursivo: bool = True,
         copiar_ao_inves_de_mover: bool = False,
-    ) -> None:
+        incremental: bool = False,
+        usar_indice: bool = False,
+        simular: bool = False,
+    ) -> list[tuple[Path, Path]]:
+        """
+        Com incremental=True (útil no modo cópia), PDFs que já têm cópia idêntica
+        (mesmo nome, tamanho e mtime) na pasta de saída não são copiados de novo.
+
+        usar_indice=True lê os contratos do índice persistente da pasta de PDFs
+        (IndicePDFs), relendo só as pastas cujo mtime mudou, em vez de varrer a
+        árvore e aplicar a regex em todo nome. simular=True só informa no console
+        o que seria movido/copiado: nada é gravado, nem o log nem o índice.
+
+        Retorna os pares (origem, destino) movidos/copiados (ou planejados).
+        """
         pasta_pdfs = Path(pasta_pdfs).expanduser().resolve()
         csv_path = Path(csv_path).expanduser().resolve()
 
@@ -853,17 +1829,37 @@ class TelasPretasProcessor:
         contratos_alvo = self.carregar_contratos_csv(csv_path, coluna=coluna_csv)
 
         pasta_saida = pasta_pdfs / nome_pasta_saida
-        pasta_saida.mkdir(parents=True, exist_ok=True)
+        log_path = None
+        if not simular:
+            pasta_saida.mkdir(parents=True, exist_ok=True)
 
-        log_path = pasta_saida / "log_filtragem.txt"
-        if log_path.exists():
-            log_path.unlink()
+            log_path = pasta_saida / "log_filtragem.txt"
+            if log_path.exists():
+                log_path.unlink()
 
         log = self._criar_logger(log_path)
 
-        padrao = "**/*.pdf" if recursivo else "*.pdf"
-        pdfs = sorted(pasta_pdfs.glob(padrao))
-        pdfs = [p for p in pdfs if pasta_saida not in p.parents]
+        if usar_indice:
+            indice = IndicePDFs(pasta_pdfs, self.RE_CONTRATO_GERAL)
+            indice.atualizar(recursivo=recursivo, ignorar=[pasta_saida])
+            if not simular:
+                indice.salvar()
+            pdfs_contratos = indice.entradas(recursivo=recursivo)
+        else:
+            padrao = "**/*.pdf" if recursivo else "*.pdf"
+            pdfs = sorted(pasta_pdfs.glob(padrao))
+            pdfs_contratos = [
+                (p, self.extrair_contrato_do_nome(p))
+                for p in pdfs
+                if pasta_saida not in p.parents
+            ]
+        pdfs = [p for p, _ in pdfs_contratos]
+
+        # nomes já ocupados na saída, listados uma vez; os __dupN saem daqui
+        ocupados = (
+            {e.name for e in os.scandir(pasta_saida)} if pasta_saida.exists() else set()
+        )
+        planejados: list[tuple[Path, Path]] = []
 
         log(f"[INFO] Pasta PDFs: {pasta_pdfs}")
         log(f"[INFO] CSV       : {csv_path}")
@@ -874,11 +1870,11 @@ class TelasPretasProcessor:
         movidos = 0
         ignorados_sem_contrato = 0
         ignorados_nao_alvo = 0
+        ja_copiados = 0
         falhas = 0
 
-        for pdf in pdfs:
+        for pdf, contrato in pdfs_contratos:
             try:
-                contrato = self.extrair_contrato_do_nome(pdf)
                 if not contrato:
                     ignorados_sem_contrato += 1
                     log(f"[SEM CONTRATO] {pdf.name}")
@@ -890,22 +1886,31 @@ class TelasPretasProcessor:
 
                 destino = pasta_saida / pdf.name
 
-                if destino.exists():
+                if incremental and self._copia_identica(pdf, destino):
+                    ja_copiados += 1
+                    continue
+
+                if destino.name in ocupados:
                     i = 1
                     while True:
                         destino_alt = pasta_saida / f"{pdf.stem}__dup{i}{pdf.suffix}"
-                        if not destino_alt.exists():
+                        if destino_alt.name not in ocupados:
                             destino = destino_alt
                             break
                         i += 1
+                ocupados.add(destino.name)
 
-                if copiar_ao_inves_de_mover:
+                if simular:
+                    acao = "COPIAR" if copiar_ao_inves_de_mover else "MOVER"
+                    log(f"[SIMULAÇÃO] {acao} {pdf.name} -> {destino.name} (contrato={contrato})")
+                elif copiar_ao_inves_de_mover:
                     shutil.copy2(pdf, destino)
                     log(f"[COPIADO] {pdf.name} -> {destino.name} (contrato={contrato})")
                 else:
                     shutil.move(str(pdf), str(destino))
                     log(f"[MOVIDO]  {pdf.name} -> {destino.name} (contrato={contrato})")
 
+                planejados.append((pdf, destino))
                 movidos += 1
 
             except Exception as e:
@@ -916,8 +1921,25 @@ class TelasPretasProcessor:
         log(f"  Movidos/Copiados: {movidos}")
         log(f"  Ignorados (sem contrato no nome): {ignorados_sem_contrato}")
         log(f"  Ignorados (contrato não está no CSV): {ignorados_nao_alvo}")
+        if incremental:
+            log(f"  Ignorados (cópia idêntica já existe): {ja_copiados}")
         log(f"  Falhas: {falhas}")
-        log(f"[INFO] Log salvo em: {log_path}")
+        if log_path is not None:
+            log(f"[INFO] Log salvo em: {log_path}")
+
+        return planejados
+
+    @staticmethod
+    def _copia_identica(origem: Path, destino: Path) -> bool:
+        try:
+            st_dest = destino.stat()
+        except FileNotFoundError:
+            return False
+        st_orig = origem.stat()
+        return (
+            st_dest.st_size == st_orig.st_size
+            and st_dest.st_mtime_ns == st_orig.st_mtime_ns
+        )
 
     # =========================================================
     # ETAPA 8 - RENOMEAR ARQUIVOS COM PREFIXO
@@ -963,4 +1985,52 @@ class TelasPretasProcessor:
         print(f"Prefixo               : {prefixo}")
         print(f"Renomeados            : {total_renomeados}")
         print(f"Ignorados (já estavam): {total_ignorados}")
-        print("-" * 70)
\ No newline at end of file
+        print("-" * 70)
+
+
+def _processar_grupo_tipo_worker(
+    parametros: dict, pasta_tipo: Path, arquivos: list[Path], assinar: bool
+) -> tuple[int, int, int, int, list[tuple[Path, dict, list[str]]]]:
+    processor = TelasPretasProcessor(**parametros)
+    return processor._processar_grupo_tipo(pasta_tipo, arquivos, assinar)
+
+
+def _mesclar_contrato_worker(
+    tarefa: tuple[str, list[Path], Path], max_documentos_abertos: int
+) -> str | None:
+    _, arquivos, out_pdf = tarefa
+    try:
+        TelasPretasProcessor.mesclar_pdfs(arquivos, out_pdf, max_documentos_abertos)
+        if not out_pdf.exists() or out_pdf.stat().st_size == 0:
+            raise RuntimeError("PDF final não foi criado (ausente ou tamanho 0).")
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+# pacotes já carregados por este processo do pool, entre um lote e outro; o
+# mtime/tamanho do índice na chave evita servir um pacote desatualizado
+_PACOTES_DO_PROCESSO: dict[Path, tuple[tuple[int, int], PacoteBlocos]] = {}
+
+
+def _pacote_do_processo(pasta: Path) -> PacoteBlocos:
+    st = (pasta / ARQUIVO_INDICE).stat()
+    assinatura = (st.st_mtime_ns, st.st_size)
+    em_cache = _PACOTES_DO_PROCESSO.get(pasta)
+    if em_cache is None or em_cache[0] != assinatura:
+        em_cache = _PACOTES_DO_PROCESSO[pasta] = (assinatura, PacoteBlocos(pasta))
+    return em_cache[1]
+
+
+def _converter_lote_pdf_worker(
+    parametros: dict, lote: list[tuple[Path, Path | None, Path]]
+) -> list[tuple[Path, Path, str | None, str | None]]:
+    processor = TelasPretasProcessor(**parametros)
+    resultados = []
+
+    for txt, pasta_pacote, pdf_dest in lote:
+        pacote = _pacote_do_processo(pasta_pacote) if pasta_pacote is not None else None
+        erro, nivel = processor._converter_trabalho(txt, pacote, pdf_dest)
+        resultados.append((txt, pdf_dest, erro, nivel))
+
+    return resultados
@@ -1,5 +1,90 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from urllib.parse import quote, unquote
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from tqdm import tqdm
+
+COLUMNS = [
+    "DATA GERACAO",
+    "CONTADOR DEBITO",
+    "NUM CONTRATO DEBITO",
+    "CONTA DEBITO",
+    "NOME CONTA DEBITO",
+    "VALOR DEBITO",
+    "CONTADOR CREDITO",
+    "NUM CONTRATO CREDITO",
+    "CONTA CREDITO",
+    "NOME CONTA CREDITO",
+    "VALOR CREDITO",
+    "COSIF DEBITO",
+    "NOME COSIF DEBITO",
+    "COSIF CREDITO",
+    "NOME COSIF CREDITO",
+]
+
+# tudo chega como texto: contas, contratos e COSIF têm zeros à esquerda e os
+# valores usam vírgula decimal; valores e data são convertidos depois, por chunk
+DTYPES_CSV = {col: str for col in COLUMNS}
+COLUNAS_VALOR = ["VALOR DEBITO", "VALOR CREDITO"]
+DATAS_SENTINELA = ["99999999", "00000000", ""]
+
+SCHEMA_PARQUET = pa.schema(
+    [
+        (
+            col,
+            pa.timestamp("ns") if col == "DATA GERACAO"
+            else pa.float64() if col in COLUNAS_VALOR
+            else pa.string(),
+        )
+        for col in COLUMNS
+    ]
+)
+
+TAMANHO_CHUNK_CSV = 200_000
+# lotes de contratos submetidos ao pool e ainda não concluídos, por worker
+LOTES_EM_VOO_POR_WORKER = 2
+# ParquetWriters (um por contrato) abertos ao mesmo tempo durante a conversão
+MAX_PARTICOES_ABERTAS = 256
+
+ABA_ANEXO_B = "Conta Gráfica"
+ENGINES_EXCEL = ("openpyxl", "xlsxwriter", "write_only")
+# mesmo formato de data/hora que o to_excel do pandas usa por padrão
+FORMATO_DATA_EXCEL = "yyyy-mm-dd hh:mm:ss"
+
+# hash das linhas de cada contrato exportado, gravado na pasta de saída
+ARQUIVO_FINGERPRINTS = ".fingerprints_anexo_b.json"
+VERSAO_FINGERPRINTS = 2
+
+
+@dataclass
+class ExportacaoAnexoBResultado:
+    gravados: int
+    inalterados: int
+    removidos: int
+
+
+def _converter_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    for col in COLUNAS_VALOR:
+        df[col] = df[col].astype(str).str.replace(",", ".", regex=False).astype(float)
+
+    col = df["DATA GERACAO"].astype(str).str.strip()
+    col = col.where(~col.isin(DATAS_SENTINELA))
+    df["DATA GERACAO"] = pd.to_datetime(col, format="%Y%m%d", errors="coerce")
+    return df
 
 
 def processar_anexo_b(
@@ -8,67 +93,419 @@ def processar_anexo_b(
     coluna_contrato: str = "NUM CONTRATO DEBITO",
     sep: str = ";",
     encoding: str = "utf-8",
-) -> pd.DataFrame:
-
-    COLUMNS = [
-        "DATA GERACAO",
-        "CONTADOR DEBITO",
-        "NUM CONTRATO DEBITO",
-        "CONTA DEBITO",
-        "NOME CONTA DEBITO",
-        "VALOR DEBITO",
-        "CONTADOR CREDITO",
-        "NUM CONTRATO CREDITO",
-        "CONTA CREDITO",
-        "NOME CONTA CREDITO",
-        "VALOR CREDITO",
-        "COSIF DEBITO",
-        "NOME COSIF DEBITO",
-        "COSIF CREDITO",
-        "NOME COSIF CREDITO",
-    ]
+    pasta_parquet: str | Path | None = None,
+    tamanho_chunk: int = TAMANHO_CHUNK_CSV,
+    workers: int = 1,
+    engine: str = "openpyxl",
+    incremental: bool = False,
+) -> ExportacaoAnexoBResultado:
+    """
+    Gera um Excel por contrato a partir do CSV do Anexo B.
 
+    Com `pasta_parquet`, o CSV é lido em chunks de `tamanho_chunk` linhas e
+    gravado como dataset Parquet particionado por contrato; a exportação lê
+    uma partição por vez, sem carregar o arquivo inteiro na memória.
+    `workers`, `engine` e `incremental` vão para a exportação (ver
+    exportar_contratos_para_excel).
+    """
     caminho_csv = Path(caminho_csv)
     pasta_saida = Path(pasta_saida)
     pasta_saida.mkdir(parents=True, exist_ok=True)
 
+    if pasta_parquet is not None:
+        total = csv_para_parquet_por_contrato(
+            caminho_csv, pasta_parquet, coluna_contrato, sep, encoding, tamanho_chunk
+        )
+        print(f"Total de linhas: {total:,}")
+        return exportar_contratos_de_parquet(
+            pasta_parquet, coluna_contrato, pasta_saida, workers, engine, incremental
+        )
+
     df = pd.read_csv(caminho_csv, sep=sep, encoding=encoding, dtype=str)
 
     df.rename(columns=dict(zip(df.columns, COLUMNS)), inplace=True)
 
-    df["VALOR DEBITO"] = (
-        df["VALOR DEBITO"].astype(str).str.replace(",", ".", regex=False).astype(float)
+    df = _converter_colunas(df)
+
+    return exportar_contratos_para_excel(
+        df, coluna_contrato, pasta_saida, workers, engine, incremental
     )
 
-    df["VALOR CREDITO"] = (
-        df["VALOR CREDITO"].astype(str).str.replace(",", ".", regex=False).astype(float)
+
+def csv_para_parquet_por_contrato(
+    caminho_csv: str | Path,
+    pasta_parquet: str | Path,
+    coluna_contrato: str = "NUM CONTRATO DEBITO",
+    sep: str = ";",
+    encoding: str = "utf-8",
+    tamanho_chunk: int = TAMANHO_CHUNK_CSV,
+) -> int:
+    """
+    Converte o CSV do Anexo B, em chunks, num dataset Parquet particionado por
+    contrato (<coluna>=<contrato>/parte-<n>.parquet). Linhas sem contrato ficam
+    de fora, como na exportação. O dataset é montado numa pasta temporária e
+    substitui o anterior no final. Devolve o total de linhas gravadas.
+
+    Cada contrato tem um ParquetWriter que recebe as linhas de todos os chunks,
+    em ordem. Com mais de MAX_PARTICOES_ABERTAS contratos, o writer mais antigo é
+    fechado e o contrato ganha outro arquivo se voltar a aparecer; essas
+    partições são compactadas num arquivo só ao final.
+    """
+    pasta_parquet = Path(pasta_parquet)
+    tmp = pasta_parquet.with_name(pasta_parquet.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    # como no write_to_dataset, a coluna do contrato fica só no nome da pasta
+    schema = SCHEMA_PARQUET.remove(SCHEMA_PARQUET.get_field_index(coluna_contrato))
+    writers: dict[str, pq.ParquetWriter] = {}
+    arquivos_por_contrato: dict[str, int] = {}
+
+    total = 0
+    # como no modo em memória, as colunas valem pela posição; usecols + index_col=False
+    # descartam a coluna vazia do ";" no fim da linha, sem deslocar as demais
+    leitor = pd.read_csv(
+        caminho_csv,
+        sep=sep,
+        encoding=encoding,
+        header=0,
+        names=COLUMNS,
+        usecols=range(len(COLUMNS)),
+        index_col=False,
+        dtype=DTYPES_CSV,
+        chunksize=tamanho_chunk,
     )
+    try:
+        for chunk in leitor:
+            chunk = _converter_colunas(chunk)
+            chunk = chunk[chunk[coluna_contrato].notna()].copy()
+            chunk[coluna_contrato] = chunk[coluna_contrato].str.strip()
+            if chunk.empty:
+                continue
+
+            for contrato, grupo in chunk.groupby(coluna_contrato, sort=False):
+                writer = writers.get(contrato)
+                if writer is None:
+                    if len(writers) >= MAX_PARTICOES_ABERTAS:
+                        writers.pop(next(iter(writers))).close()
+                    n = arquivos_por_contrato.get(contrato, 0)
+                    arquivos_por_contrato[contrato] = n + 1
+                    pasta = tmp / f"{coluna_contrato}={quote(contrato, safe='')}"
+                    pasta.mkdir(exist_ok=True)
+                    writer = pq.ParquetWriter(pasta / f"parte-{n:06d}.parquet", schema)
+                    writers[contrato] = writer
+                # schema fixo: uma coluna toda nula num chunk não vira tipo "null"
+                writer.write_table(
+                    pa.Table.from_pandas(
+                        grupo.drop(columns=coluna_contrato), schema=schema, preserve_index=False
+                    )
+                )
+            total += len(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for contrato, n in arquivos_por_contrato.items():
+        if n > 1:
+            _compactar_particao(tmp / f"{coluna_contrato}={quote(contrato, safe='')}", schema)
 
-    col = (
-        df["DATA GERACAO"]
-        .astype(str)
-        .str.strip()
-        .replace({"99999999": None, "00000000": None, "": None})
+    if pasta_parquet.exists():
+        shutil.rmtree(pasta_parquet)
+    os.replace(tmp, pasta_parquet)
+    return total
+
+
+def _compactar_particao(pasta: Path, schema: pa.Schema) -> None:
+    """Junta os arquivos da partição (na ordem do CSV) num único parte-000000.parquet."""
+    arquivos = sorted(pasta.glob("*.parquet"))
+    tabela = pa.concat_tables(pq.read_table(arq, schema=schema) for arq in arquivos)
+    destino = pasta / "compactado.tmp"
+    pq.write_table(tabela, destino)
+    for arq in arquivos:
+        arq.unlink()
+    os.replace(destino, pasta / "parte-000000.parquet")
+
+
+def _ler_particao(pasta: Path, contrato: str, coluna_contrato: str) -> pd.DataFrame:
+    # os arquivos são lidos na ordem do CSV
+    df = pd.concat(
+        [pd.read_parquet(arq) for arq in sorted(pasta.glob("*.parquet"))],
+        ignore_index=True,
     )
+    df.insert(COLUMNS.index(coluna_contrato), coluna_contrato, contrato)
+    return df
+
+
+def _particoes(pasta_parquet: str | Path, coluna_contrato: str) -> list[tuple[str, Path]]:
+    prefixo = f"{coluna_contrato}="
+    return sorted(
+        (unquote(p.name[len(prefixo):]), p)
+        for p in Path(pasta_parquet).iterdir()
+        if p.is_dir() and p.name.startswith(prefixo)
+    )
+
+
+def ler_contratos_parquet(pasta_parquet: str | Path, coluna_contrato: str = "NUM CONTRATO DEBITO"):
+    """(contrato, DataFrame) de cada partição, com a coluna do contrato de volta na posição original."""
+    for contrato, pasta in _particoes(pasta_parquet, coluna_contrato):
+        yield contrato, _ler_particao(pasta, contrato, coluna_contrato)
+
+
+def _linhas_excel(df: pd.DataFrame):
+    """Linhas do DataFrame com nulos como None e Timestamps como datetime."""
+    colunas_data = [
+        i for i, dtype in enumerate(df.dtypes) if pd.api.types.is_datetime64_any_dtype(dtype)
+    ]
+    for linha in df.itertuples(index=False, name=None):
+        linha = [None if pd.isna(v) else v for v in linha]
+        for i in colunas_data:
+            if linha[i] is not None:
+                linha[i] = linha[i].to_pydatetime()
+        yield linha
+
+
+def _salvar_xlsxwriter(df: pd.DataFrame, caminho: Path) -> None:
+    import xlsxwriter
+
+    # constant_memory grava linha a linha; por isso não passa pelo to_excel,
+    # que escreve coluna por coluna
+    wb = xlsxwriter.Workbook(str(caminho), {"constant_memory": True})
+    try:
+        ws = wb.add_worksheet(ABA_ANEXO_B)
+        cabecalho = wb.add_format({"bold": True, "border": 1, "align": "center"})
+        formato_data = wb.add_format({"num_format": FORMATO_DATA_EXCEL})
+        ws.write_row(0, 0, [str(c) for c in df.columns], cabecalho)
+        for r, linha in enumerate(_linhas_excel(df), start=1):
+            for c, v in enumerate(linha):
+                if v is None:
+                    continue
+                if isinstance(v, datetime):
+                    ws.write_datetime(r, c, v, formato_data)
+                else:
+                    ws.write(r, c, v)
+    finally:
+        wb.close()
+
+
+def _salvar_write_only(df: pd.DataFrame, caminho: Path) -> None:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(ABA_ANEXO_B)
+    fonte_cabecalho = Font(bold=True)
+    cabecalho = []
+    for nome in df.columns:
+        celula = WriteOnlyCell(ws, value=str(nome))
+        celula.font = fonte_cabecalho
+        cabecalho.append(celula)
+    ws.append(cabecalho)
+    for linha in _linhas_excel(df):
+        ws.append(linha)
+    wb.save(caminho)
 
-    df["DATA GERACAO"] = pd.to_datetime(col, format="%Y%m%d", errors="coerce")
 
-    exportar_contratos_para_excel(df, coluna_contrato, pasta_saida)
+def _salvar_contrato(df: pd.DataFrame, caminho: Path, engine: str) -> None:
+    if engine == "openpyxl":
+        df.to_excel(caminho, index=False, sheet_name=ABA_ANEXO_B)
+    elif engine == "xlsxwriter":
+        _salvar_xlsxwriter(df, caminho)
+    else:
+        _salvar_write_only(df, caminho)
+
+
+def _hash_contrato(df: pd.DataFrame, engine: str) -> str:
+    """
+    Hash das linhas do contrato, na ordem, junto com nomes e tipos das colunas e
+    as opções de gravação (engine, aba, formato de data): trocar qualquer uma
+    delas regrava o Excel.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{engine}|{ABA_ANEXO_B}|{FORMATO_DATA_EXCEL}\n".encode("utf-8"))
+    h.update("|".join(f"{c}:{t}" for c, t in df.dtypes.items()).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _exportar_se_mudou(
+    df: pd.DataFrame, caminho: Path, engine: str, hash_anterior: str | None
+) -> tuple[str, bool]:
+    hash_atual = _hash_contrato(df, engine)
+    if hash_atual == hash_anterior and caminho.exists():
+        return hash_atual, False
+    _salvar_contrato(df, caminho, engine)
+    return hash_atual, True
+
+
+def _exportar_grupo_worker(tarefa: tuple) -> tuple[str, bool]:
+    grupo, caminho, engine, hash_anterior = tarefa
+    return _exportar_se_mudou(grupo, caminho, engine, hash_anterior)
+
+
+def _exportar_particao_worker(tarefa: tuple) -> tuple[str, bool]:
+    pasta, contrato, coluna_contrato, caminho, engine, hash_anterior = tarefa
+    df = _ler_particao(pasta, contrato, coluna_contrato)
+    return _exportar_se_mudou(df, caminho, engine, hash_anterior)
+
+
+def _executar_lote(worker, tarefas: list) -> list:
+    """Tarefa do pool: um lote de contratos e um lote de resultados de volta."""
+    return [worker(tarefa) for tarefa in tarefas]
+
+
+def _executar_exportacao(worker, tarefas, total: int, workers: int) -> list:
+    """
+    Roda o worker em cada tarefa (num pool se workers > 1) com um contador único.
+    As tarefas são consumidas aos poucos: no pool, no máximo
+    workers * LOTES_EM_VOO_POR_WORKER lotes ficam submetidos ao mesmo tempo, e os
+    resultados voltam na ordem das tarefas.
+    """
+    tarefas = iter(tarefas)
+    resultados = []
+    with tqdm(total=total, desc="Exportando contratos", unit="contrato") as progresso:
+        if workers > 1 and total > 1:
+            tamanho_lote = max(1, min(64, total // (workers * 4)))
+            em_voo: deque = deque()
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                while lote := list(islice(tarefas, tamanho_lote)):
+                    em_voo.append(ex.submit(_executar_lote, worker, lote))
+                    while len(em_voo) >= workers * LOTES_EM_VOO_POR_WORKER:
+                        for r in em_voo.popleft().result():
+                            resultados.append(r)
+                            progresso.update()
+                while em_voo:
+                    for r in em_voo.popleft().result():
+                        resultados.append(r)
+                        progresso.update()
+        else:
+            for tarefa in tarefas:
+                resultados.append(worker(tarefa))
+                progresso.update()
+    return resultados
+
+
+def _ler_fingerprints(pasta_saida: Path) -> dict[str, str]:
+    caminho = pasta_saida / ARQUIVO_FINGERPRINTS
+    if not caminho.exists():
+        return {}
+    try:
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return dados.get("contratos", {}) if dados.get("versao") == VERSAO_FINGERPRINTS else {}
+
+
+def _salvar_fingerprints(pasta_saida: Path, contratos: dict[str, str]) -> None:
+    caminho = pasta_saida / ARQUIVO_FINGERPRINTS
+    tmp = caminho.with_name(caminho.name + ".tmp")
+    tmp.write_text(
+        json.dumps({"versao": VERSAO_FINGERPRINTS, "contratos": contratos}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    os.replace(tmp, caminho)
+
+
+def _exportar_contratos(
+    contratos: list[str],
+    tarefa_por_contrato,
+    worker,
+    pasta_saida: Path,
+    workers: int,
+    incremental: bool,
+) -> ExportacaoAnexoBResultado:
+    """
+    Parte comum dos dois exportadores: monta as tarefas com o hash anterior de
+    cada contrato (só no modo incremental), roda e atualiza o sidecar.
+    """
+    anteriores = _ler_fingerprints(pasta_saida) if incremental else {}
+    tarefas = (
+        tarefa_por_contrato(
+            contrato,
+            pasta_saida / f"B{contrato}.xlsx",
+            anteriores.get(contrato),
+        )
+        for contrato in contratos
+    )
+    resultados = _executar_exportacao(worker, tarefas, len(contratos), workers)
+
+    atuais = {c: h for c, (h, _) in zip(contratos, resultados)}
+    gravados = sum(gravou for _, gravou in resultados)
+
+    removidos = 0
+    if incremental:
+        # contratos que sumiram do Anexo B: o Excel da rodada anterior sai junto
+        for contrato in set(anteriores) - set(atuais):
+            (pasta_saida / f"B{contrato}.xlsx").unlink(missing_ok=True)
+            removidos += 1
+
+    # o sidecar descreve só o que esta rodada gravou ou conferiu
+    _salvar_fingerprints(pasta_saida, atuais)
+
+    resultado = ExportacaoAnexoBResultado(
+        gravados=gravados, inalterados=len(contratos) - gravados, removidos=removidos
+    )
+    print(
+        f"Gravados: {resultado.gravados:,} | Inalterados: {resultado.inalterados:,} "
+        f"| Removidos: {resultado.removidos:,}"
+    )
+    return resultado
+
+
+def _validar_engine(engine: str) -> None:
+    if engine not in ENGINES_EXCEL:
+        raise ValueError(f"engine deve ser um de {ENGINES_EXCEL} (recebido {engine!r}).")
+
+
+def exportar_contratos_de_parquet(
+    pasta_parquet: str | Path,
+    coluna_contrato: str,
+    pasta_saida: str | Path,
+    workers: int = 1,
+    engine: str = "openpyxl",
+    incremental: bool = False,
+) -> ExportacaoAnexoBResultado:
+    """
+    Mesmo resultado de exportar_contratos_para_excel, lendo uma partição do
+    dataset por vez; com workers > 1 cada processo lê as próprias partições.
+    """
+    _validar_engine(engine)
+    pasta_saida = Path(pasta_saida)
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+
+    particoes = dict(_particoes(pasta_parquet, coluna_contrato))
+    print(f"Total de contratos: {len(particoes):,}")
+    return _exportar_contratos(
+        list(particoes),
+        lambda contrato, caminho, hash_anterior: (
+            particoes[contrato], contrato, coluna_contrato, caminho, engine, hash_anterior
+        ),
+        _exportar_particao_worker,
+        pasta_saida,
+        workers,
+        incremental,
+    )
 
 
 def exportar_contratos_para_excel(
-    df: pd.DataFrame, coluna_contrato: str, pasta_saida: str | Path
-) -> None:
+    df: pd.DataFrame,
+    coluna_contrato: str,
+    pasta_saida: str | Path,
+    workers: int = 1,
+    engine: str = "openpyxl",
+    incremental: bool = False,
+) -> ExportacaoAnexoBResultado:
     """
-    Lê um CSV e gera um arquivo Excel por contrato.
+    Gera um arquivo Excel por contrato (B{contrato}.xlsx, aba "Conta Gráfica").
 
     Parâmetros:
-        caminho_csv: caminho do arquivo CSV de entrada
-        pasta_saida: pasta onde os arquivos Excel serão salvos
+        df: linhas do Anexo B já tratadas
         coluna_contrato: nome da coluna que identifica o contrato
-        sep: separador do CSV
-        encoding: encoding do CSV
+        pasta_saida: pasta onde os arquivos Excel serão salvos
+        workers: processos gravando em paralelo (1 = serial)
+        engine: "openpyxl" (to_excel do pandas), "xlsxwriter" (constant_memory)
+            ou "write_only" (openpyxl em modo write-only)
+        incremental: regrava só os contratos cujo hash das linhas mudou desde a
+            última exportação (sidecar .fingerprints_anexo_b.json na pasta de
+            saída) e apaga o Excel de contratos que saíram do arquivo
     """
+    _validar_engine(engine)
     pasta_saida = Path(pasta_saida)
     pasta_saida.mkdir(parents=True, exist_ok=True)
 
@@ -78,11 +515,18 @@ def exportar_contratos_para_excel(
     df[coluna_contrato] = df[coluna_contrato].astype(str).str.strip()
 
     print(f"Total de linhas: {len(df):,}")
-    print(f"Total de contratos: {df[coluna_contrato].nunique():,}")
-
-    for contrato, grupo in df.groupby(coluna_contrato, dropna=False):
-        nome_arquivo = f"B{contrato}.xlsx"
-        caminho_saida = pasta_saida / nome_arquivo
+    # só as posições de cada contrato; o DataFrame do grupo é montado quando a
+    # tarefa dele é consumida, em vez de todos os grupos de uma vez
+    posicoes = df.groupby(coluna_contrato).indices
+    print(f"Total de contratos: {len(posicoes):,}")
 
-        grupo.to_excel(caminho_saida, index=False, sheet_name="Conta Gráfica")
-        print(f"Salvo: {caminho_saida}")
+    return _exportar_contratos(
+        sorted(posicoes),
+        lambda contrato, caminho, hash_anterior: (
+            df.take(posicoes[contrato]), caminho, engine, hash_anterior
+        ),
+        _exportar_grupo_worker,
+        pasta_saida,
+        workers,
+        incremental,
+    )
@@ -1,10 +1,25 @@
 from __future__ import annotations
 
+import os
 import re
+import shutil
+import zipfile
 from pathlib import Path
+from xml.sax.saxutils import escape
 
 import pandas as pd
+from lxml import etree
 from openpyxl import load_workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from src.utils.xlsx_xml import (
+    NS_MAIN,
+    XmlFastPathUnsupported,
+    date_style_ids,
+    read_shared_strings,
+    rich_text,
+    xlsx_parts,
+)
 
 
 def normalize_conta(x) -> str:
@@ -60,6 +75,17 @@ def achar_coluna_por_nome(ws, nome_coluna: str) -> int:
     raise ValueError(f"Coluna '{nome_coluna}' não encontrada na linha 1 (cabeçalho).")
 
 
+def _novo_valor(v, mapa: dict[str, str]) -> str | None:
+    """Conta_Nome pelo de-para: valor novo, ou None se mantém."""
+    conta, _ = split_conta_nome(str(v))
+    conta_key = normalize_conta(conta)
+    nome_novo = mapa.get(conta_key)
+    if not nome_novo or str(nome_novo).strip() == "":
+        return None
+    novo_valor = f"{conta_key} - {str(nome_novo).strip()}"
+    return novo_valor if str(v).strip() != novo_valor else None
+
+
 def atualizar_um_arquivo(
     arquivo_excel: Path,
     mapa: dict[str, str],
@@ -89,21 +115,239 @@ def atualizar_um_arquivo(
             continue
 
         total += 1
-        conta, nome_antigo = split_conta_nome(str(v))
-        conta_key = normalize_conta(conta)
-
-        nome_novo = mapa.get(conta_key)
-        if not nome_novo or str(nome_novo).strip() == "":
-            continue  # não achou no de-para, mantém como está
-
-        novo_valor = f"{conta_key} - {str(nome_novo).strip()}"
-        if str(cell.value).strip() != novo_valor:
+        novo_valor = _novo_valor(v, mapa)
+        if novo_valor is not None:  # None: não achou no de-para ou já está certo
             cell.value = novo_valor
             alteradas += 1
 
     return total, alteradas, wb
 
 
+# =========================
+# FAST PATH: XML DO ZIP
+# =========================
+_RE_RAIZ = re.compile(rb"<(\w+:)?(worksheet|sst)\b")
+_RE_C_SEM_R = re.compile(rb"<c(?=[\s>/])(?![^>]*\br=)")
+_RE_CABECALHO = re.compile(rb'<c\b[^>]*?\br="([A-Z]+)1"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_RE_ATRIB_T = re.compile(rb'\s+t="([^"]*)"')
+_RE_ATRIB_S = re.compile(rb'\bs="(\d+)"')
+_RE_V = re.compile(rb"<v>(.*?)</v>", re.S)
+_RE_IS = re.compile(rb"<is>(.*?)</is>", re.S)
+_RE_UNIQUE_COUNT = re.compile(rb'(<sst\b[^>]*?\buniqueCount=")(\d+)(")')
+_RE_RAIZ_WORKBOOK = re.compile(rb"<(\w+:)?workbook\b")
+_RE_CALC_PR = re.compile(rb"<calcPr\b[^>]*?/?>")
+_RE_FULL_CALC = re.compile(rb'\s+fullCalcOnLoad="[^"]*"')
+# filhos de <workbook> que vêm depois do calcPr na ordem do schema
+_RE_DEPOIS_DO_CALC_PR = re.compile(
+    rb"<(?:oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing"
+    rb"|fileRecoveryPr|webPublishObjects|extLst)\b|</workbook>"
+)
+
+
+def _padrao_coluna(letra: str) -> re.Pattern:
+    # (atributos antes de r, linha, atributos depois de r, conteúdo ou None se <c .../>)
+    return re.compile(
+        rb'<c\b([^>]*?)\br="' + letra.encode() + rb'(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S
+    )
+
+
+def _xml_texto(valor: str) -> bytes:
+    return b'<t xml:space="preserve">' + escape(valor).encode("utf-8") + b"</t>"
+
+
+class _LeitorCelulas:
+    """Valor das células como o openpyxl (load_workbook) devolveria."""
+
+    def __init__(self, strings: list[str], estilos_data: set[int]):
+        self.strings = strings
+        self.estilos_data = estilos_data
+
+    def valor(self, atributos: bytes, conteudo: bytes | None):
+        if conteudo is None:
+            return None
+        if b"<f" in conteudo:
+            raise XmlFastPathUnsupported("célula com fórmula")
+        m = _RE_ATRIB_T.search(atributos)
+        tipo = m.group(1) if m else b"n"
+        if tipo == b"inlineStr":
+            m = _RE_IS.search(conteudo)
+            if m is None:
+                return None
+            return rich_text(etree.fromstring(f'<is xmlns="{NS_MAIN}">'.encode() + m.group(1) + b"</is>"))
+
+        m = _RE_V.search(conteudo)
+        if m is None:
+            return None
+        texto = m.group(1).decode()
+        if tipo == b"s":
+            return self.strings[int(texto)]
+        if tipo != b"n":
+            raise XmlFastPathUnsupported(f"célula do tipo {tipo.decode()}")
+        estilo = _RE_ATRIB_S.search(atributos)
+        if estilo is not None and int(estilo.group(1)) in self.estilos_data:
+            raise XmlFastPathUnsupported("célula com data")
+        return float(texto) if any(c in texto for c in ".eE") else int(texto)
+
+
+def _coluna_do_cabecalho(dados: bytes, leitor: _LeitorCelulas, nome_coluna: str) -> str:
+    for m in _RE_CABECALHO.finditer(dados):
+        v = leitor.valor(m.group(0)[: m.end(2) - m.start()], m.group(3))
+        if v is not None and str(v).strip() == nome_coluna:
+            return m.group(1).decode()
+    raise ValueError(f"Coluna '{nome_coluna}' não encontrada na linha 1 (cabeçalho).")
+
+
+def _recalcular_ao_abrir(workbook_xml: bytes) -> bytes:
+    """
+    Liga fullCalcOnLoad no calcPr: fórmulas que dependem de Conta_Nome ficaram
+    com o <v> antigo e o Excel recalcula ao abrir (o save do openpyxl também
+    descarta os valores em cache).
+    """
+    raiz = _RE_RAIZ_WORKBOOK.search(workbook_xml)
+    if raiz is None or raiz.group(1):
+        raise XmlFastPathUnsupported("workbook.xml fora do formato esperado")
+    m = _RE_CALC_PR.search(workbook_xml)
+    if m is not None:
+        tag = _RE_FULL_CALC.sub(b"", m.group(0))
+        fecho = 2 if tag.endswith(b"/>") else 1
+        tag = tag[:-fecho].rstrip() + b' fullCalcOnLoad="1"' + tag[-fecho:]
+        return workbook_xml[: m.start()] + tag + workbook_xml[m.end():]
+    m = _RE_DEPOIS_DO_CALC_PR.search(workbook_xml)
+    return workbook_xml[: m.start()] + b'<calcPr fullCalcOnLoad="1"/>' + workbook_xml[m.start():]
+
+
+def _nova_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    # sem os extras/offsets do arquivo de origem
+    nova = zipfile.ZipInfo(info.filename, info.date_time)
+    nova.compress_type = info.compress_type
+    nova.external_attr = info.external_attr
+    nova.create_system = info.create_system
+    nova.file_size = info.file_size
+    return nova
+
+
+def _gravar_pacote(zin: zipfile.ZipFile, partes: dict[str, bytes], caminho: Path) -> None:
+    """Copia o pacote em streaming, trocando o conteúdo das `partes` reescritas."""
+    with zipfile.ZipFile(caminho, "w") as zout:
+        for info in zin.infolist():
+            nova = _nova_info(info)
+            if info.filename in partes:
+                zout.writestr(nova, partes[info.filename])
+            else:
+                with zin.open(info) as origem, zout.open(nova, "w") as saida:
+                    shutil.copyfileobj(origem, saida, 1 << 20)
+
+
+def atualizar_um_arquivo_xml(
+    arquivo_excel: Path,
+    destino: Path,
+    mapa: dict[str, str],
+    sheet_dados: str = "Dados",
+    col_conta_nome: str = "Conta_Nome",
+) -> tuple[int, int]:
+    """
+    Mesma atualização de atualizar_um_arquivo, direto no XML do pacote: só as
+    células de Conta_Nome mudam no XML da sheet (valores novos vão para o fim
+    do sharedStrings) e o workbook.xml ganha fullCalcOnLoad; as outras partes
+    são copiadas em streaming, com o mesmo conteúdo. `destino` só é gravado se
+    houver alteração.
+    Retorna (linhas_lidas, linhas_alteradas).
+
+    Fórmulas, datas, valores novos com caracteres inválidos no XML e XML com
+    prefixo de namespace levantam XmlFastPathUnsupported: aí vale o caminho
+    pelo openpyxl.
+    """
+    with zipfile.ZipFile(arquivo_excel) as zin:
+        sheets, parte_shared = xlsx_parts(zin)
+        parte_sheet = dict(sheets).get(sheet_dados)
+        if parte_sheet is None:
+            raise ValueError(f"Sheet '{sheet_dados}' não existe em {arquivo_excel.name}")
+
+        dados = zin.read(parte_sheet)
+        raiz = _RE_RAIZ.search(dados)
+        if raiz is None or raiz.group(1) or _RE_C_SEM_R.search(dados):
+            raise XmlFastPathUnsupported("XML da sheet fora do formato esperado")
+
+        strings = read_shared_strings(zin, parte_shared)
+        leitor = _LeitorCelulas(strings, date_style_ids(zin)[0])
+        letra = _coluna_do_cabecalho(dados, leitor, col_conta_nome)
+
+        novas_strings: dict[str, int] = {}
+        # (atributos sem r, conteúdo) -> (conta?, início e fim da célula nova ou None);
+        # os valores de Conta_Nome se repetem muito, então cada um é lido uma vez só
+        decisoes: dict[tuple[bytes, bytes | None], tuple[bool, tuple[bytes, bytes] | None]] = {}
+        r_coluna = b'r="' + letra.encode()
+        total = 0
+        alteradas = 0
+
+        def decidir(antes: bytes, depois: bytes, conteudo: bytes | None):
+            v = leitor.valor(antes + depois, conteudo)
+            if v is None or str(v).strip() == "":
+                return False, None
+            novo_valor = _novo_valor(v, mapa)
+            if novo_valor is None:
+                return True, None
+            # caractere que o XML não aceita: o openpyxl recusa com IllegalCharacterError
+            if ILLEGAL_CHARACTERS_RE.search(novo_valor):
+                raise XmlFastPathUnsupported(f"caractere inválido em {novo_valor!r}")
+
+            # mesmos atributos (r, s de estilo...), só o tipo e o valor mudam
+            tipo = _RE_ATRIB_T.search(antes + depois)
+            inicio = b"<c" + _RE_ATRIB_T.sub(b"", antes) + r_coluna
+            fim = b'"' + _RE_ATRIB_T.sub(b"", depois)
+            if tipo is not None and tipo.group(1) == b"s":
+                indice = novas_strings.setdefault(novo_valor, len(strings) + len(novas_strings))
+                return True, (inicio, fim + b' t="s"><v>' + str(indice).encode() + b"</v></c>")
+            return True, (inicio, fim + b' t="inlineStr"><is>' + _xml_texto(novo_valor) + b"</is></c>")
+
+        def trocar(m: re.Match) -> bytes:
+            nonlocal total, alteradas
+            antes, linha, depois, conteudo = m.groups()
+            if int(linha) < 2:
+                return m.group(0)
+            chave = (antes + depois, conteudo)
+            decisao = decisoes.get(chave)
+            if decisao is None:
+                decisao = decisoes[chave] = decidir(antes, depois, conteudo)
+
+            contada, celula = decisao
+            total += contada
+            if celula is None:
+                return m.group(0)
+            alteradas += 1
+            return celula[0] + linha + celula[1]
+
+        dados = _padrao_coluna(letra).sub(trocar, dados)
+        if not alteradas:
+            return total, alteradas
+
+        partes = {parte_sheet: dados, "xl/workbook.xml": _recalcular_ao_abrir(zin.read("xl/workbook.xml"))}
+        if novas_strings:
+            sst = zin.read(parte_shared)
+            raiz = _RE_RAIZ.search(sst)
+            fim = sst.rfind(b"</sst>")
+            if raiz is None or raiz.group(1) or fim < 0:
+                raise XmlFastPathUnsupported("sharedStrings fora do formato esperado")
+            sst = sst[:fim] + b"".join(b"<si>" + _xml_texto(t) + b"</si>" for t in novas_strings) + sst[fim:]
+            partes[parte_shared] = _RE_UNIQUE_COUNT.sub(
+                lambda u: u.group(1) + str(int(u.group(2)) + len(novas_strings)).encode() + u.group(3),
+                sst,
+                count=1,
+            )
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_name(destino.name + ".tmp")
+        try:
+            _gravar_pacote(zin, partes, tmp)
+        except BaseException:
+            # falha no meio da gravação (disco cheio...) não deixa o .tmp na saída
+            tmp.unlink(missing_ok=True)
+            raise
+
+    os.replace(tmp, destino)
+    return total, alteradas
+
+
 def processar_pasta(
     pasta_entrada: str | Path,
     arquivo_de_para: str | Path,
@@ -111,6 +355,7 @@ def processar_pasta(
     sheet_dados: str = "Dados",
     col_conta_nome: str = "Conta_Nome",
     incluir_xlsm: bool = True,
+    fast_path_xml: bool = True,
 ) -> None:
     pasta_entrada = Path(pasta_entrada)
     pasta_saida = Path(pasta_saida)
@@ -130,15 +375,23 @@ def processar_pasta(
     print(f"Encontrados {len(arquivos)} arquivo(s) para processar.")
 
     for arq in arquivos:
+        destino = pasta_saida / arq.name
         try:
-            total, alteradas, wb = atualizar_um_arquivo(
-                arq, mapa, sheet_dados=sheet_dados, col_conta_nome=col_conta_nome
-            )
-            if alteradas > 0:
-                destino = pasta_saida / arq.name
-                wb.save(destino)
+            try:
+                if not fast_path_xml:
+                    raise XmlFastPathUnsupported("desativado")
+                total, alteradas = atualizar_um_arquivo_xml(
+                    arq, destino, mapa, sheet_dados=sheet_dados, col_conta_nome=col_conta_nome
+                )
+            except XmlFastPathUnsupported:
+                total, alteradas, wb = atualizar_um_arquivo(
+                    arq, mapa, sheet_dados=sheet_dados, col_conta_nome=col_conta_nome
+                )
+                if alteradas > 0:
+                    wb.save(destino)
                 wb.close()
 
+            if alteradas > 0:
                 print(f"- {arq.name}: linhas lidas={total}, alteradas={alteradas} -> {destino}")
             else:
                 print(f"- {arq.name}: linhas lidas={total}, alteradas={alteradas} -> sem alterações")
@@ -9,32 +9,96 @@ import re
 import time
 from datetime import timedelta
 import csv
+import hashlib
+import json
 import os
+import sqlite3
 import zipfile
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from functools import partial
 
+from lxml import etree
+from openpyxl.utils.datetime import from_excel, from_ISO8601
 from tqdm import tqdm
 
+from src.utils.xlsx_xml import (
+    TAG_C,
+    TAG_IS,
+    TAG_ROW,
+    TAG_V,
+    XmlFastPathUnsupported,
+    date_style_ids,
+    read_shared_strings,
+    rich_text,
+    workbook_epoch,
+    xlsx_parts,
+)
+
 
 # =========================
 # CONFIG
 # =========================
 DATA_DIR = Path(r"data/output")          # onde estão os .xlsx
 CHECKPOINT_PATH = Path("checkpoint.csv")
+CHECKPOINT_DB_PATH = Path("checkpoint.sqlite")
 RESULT_PATH = Path("resultado.csv")
 
 TARGET_TEXT = "Diferença na Base de Cálculo entre IR e CS"
 
+# Modo multi-alvo: vários rótulos numa passada só, uma linha por (arquivo, aba).
+# Vazio = modo de alvo único (TARGET_TEXT). Usa checkpoint/resultado próprios.
+TARGET_TEXTS: list[str] = []
+CHECKPOINT_MULTI_PATH = Path("checkpoint_multi.csv")
+CHECKPOINT_MULTI_DB_PATH = Path("checkpoint_multi.sqlite")
+RESULT_MULTI_PATH = Path("resultado_multi.csv")
+
 # Performance / segurança
 USE_PARALLEL = True                      # True = multiprocesso por arquivo
 MAX_WORKERS = max(1, (os.cpu_count() or 4) - 1)  # -1 pra sobrar ar
 CHECKPOINT_FLUSH_EVERY = 500             # grava a cada N resultados
+FILES_PER_TASK = 50                      # arquivos por tarefa do pool (1 lote de linhas volta por tarefa)
+TASKS_IN_FLIGHT_PER_WORKER = 2           # janela de tarefas submetidas e ainda não concluídas
 DO_FSYNC = False                         # True = mais seguro, mas pode ficar bem mais lento
+CHECKPOINT_BACKEND = "sqlite"            # "sqlite" (WAL, índice em arquivo) ou "csv" (checkpoint.csv antigo)
+USE_XML_FAST_PATH = True                 # True = lê o XML do zip direto; openpyxl só como fallback
+SCAN_RECURSIVE = False                   # True = inclui subpastas de DATA_DIR
+HASH_CONTENT = False                     # True = arquivo com tamanho/mtime novos mas mesmo conteúdo não é reprocessado
 
 
 CHECKPOINT_FIELDS = ["arquivo", "arquivo_completo", "aba", "valor_ultimo_na_linha", "status"]
 
 
+# identidade do arquivo gravada junto das linhas (só no checkpoint SQLite)
+IDENTITY_FIELDS = ["caminho", "tamanho", "mtime_ns", "hash"]
+
+
+def checkpoint_fields_multi(targets: list[str]) -> list[str]:
+    return ["arquivo", "arquivo_completo", "aba", *targets, "status"]
+
+
+def validate_targets(targets: list[str]) -> None:
+    """
+    Rótulos do multi-alvo viram colunas: não podem repetir depois de
+    normalizados nem usar o nome de uma coluna fixa (o SQLite ignora caixa).
+    """
+    reservados = {
+        f.lower() for f in checkpoint_fields_multi([]) + IDENTITY_FIELDS + ["id", "estado"]
+    }
+    colidem = [t for t in targets if t.lower() in reservados]
+    if colidem:
+        raise ValueError(f"Rótulos com nome de coluna reservada: {colidem}")
+
+    vistos: dict[str, str] = {}
+    for t in targets:
+        norm = normalize_text(t)
+        if norm in vistos:
+            raise ValueError(
+                f"Rótulos {vistos[norm]!r} e {t!r} são o mesmo depois de normalizados."
+            )
+        vistos[norm] = t
+
+
 # =========================
 # UTIL
 # =========================
@@ -101,15 +165,25 @@ def human_rate(done: int, seconds: float) -> str:
 # =========================
 # CHECKPOINT
 # =========================
-def ensure_checkpoint_header(checkpoint_path: Path):
+def ensure_checkpoint_header(checkpoint_path: Path, fields: list[str] = CHECKPOINT_FIELDS):
     if not checkpoint_path.exists():
         checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
         with checkpoint_path.open("w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=CHECKPOINT_FIELDS)
+            writer = csv.DictWriter(f, fieldnames=fields)
             writer.writeheader()
             f.flush()
             if DO_FSYNC:
                 os.fsync(f.fileno())
+        return
+
+    # checkpoint de outra configuração (outros alvos) não pode ser retomado
+    with checkpoint_path.open("r", newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    if header != fields:
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} tem as colunas {header}, esperado {fields}. "
+            "Use outro arquivo de checkpoint para esta configuração."
+        )
 
 
 def load_checkpoint_processed_set(checkpoint_path: Path) -> set[str]:
@@ -131,29 +205,578 @@ def load_checkpoint_processed_set(checkpoint_path: Path) -> set[str]:
     return processed
 
 
-def append_checkpoint_rows(checkpoint_path: Path, rows: list[dict]):
+def append_checkpoint_rows(
+    checkpoint_path: Path, rows: list[dict], fields: list[str] = CHECKPOINT_FIELDS
+):
     if not rows:
         return
 
     with checkpoint_path.open("a", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=CHECKPOINT_FIELDS)
+        writer = csv.DictWriter(f, fieldnames=fields)
         for r in rows:
-            writer.writerow({
-                "arquivo": r.get("arquivo"),
-                "arquivo_completo": r.get("arquivo_completo"),
-                "aba": r.get("aba"),
-                "valor_ultimo_na_linha": r.get("valor_ultimo_na_linha"),
-                "status": r.get("status"),
-            })
+            writer.writerow({field: r.get(field) for field in fields})
         f.flush()
         if DO_FSYNC:
             os.fsync(f.fileno())
 
 
+class CsvCheckpointStore:
+    """
+    Checkpoint em CSV (formato antigo): reler o arquivo inteiro a cada retomada.
+    Retoma só pelo nome do arquivo; alterados e removidos não são detectados.
+    """
+
+    def __init__(self, path: Path, fields: list[str]):
+        self.path = path
+        self.fields = fields
+        self.alterados = 0
+        self.removidos = 0
+        ensure_checkpoint_header(path, fields)
+
+    def processed_count(self) -> int:
+        return len(load_checkpoint_processed_set(self.path))
+
+    def pending(self, files: list[Path], root: Path, with_hash: bool = False) -> list[Path]:
+        processed = load_checkpoint_processed_set(self.path)
+        return [p for p in files if p.name not in processed]
+
+    def append(self, rows: list[dict]) -> None:
+        append_checkpoint_rows(self.path, rows, self.fields)
+
+    def export_result(self, result_path: Path, columns: list[str]) -> pd.DataFrame:
+        return build_result_from_checkpoint(self.path, result_path, columns)
+
+    def close(self) -> None:
+        pass
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def file_identity(path: Path, root: Path, with_hash: bool = False) -> dict:
+    st = path.stat()
+    return {
+        "caminho": path.relative_to(root).as_posix(),
+        "tamanho": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "hash": file_hash(path) if with_hash else None,
+    }
+
+
+def process_with_identity(worker, root: Path, with_hash: bool, xlsx_path: Path) -> list[dict]:
+    """Roda o worker e carimba as linhas com a identidade do arquivo lida antes dele."""
+    try:
+        identity = file_identity(xlsx_path, root, with_hash)
+    except OSError:
+        # apagado/travado depois do pending(): o worker grava o status de erro e,
+        # sem tamanho/mtime, o arquivo volta para a fila na próxima execução
+        identity = {
+            "caminho": xlsx_path.relative_to(root).as_posix(),
+            "tamanho": None,
+            "mtime_ns": None,
+            "hash": None,
+        }
+    rows = worker(xlsx_path)
+    for r in rows:
+        r.update(identity)
+    return rows
+
+
+def _sql_name(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _sql_value(v):
+    # o que o csv.DictWriter gravaria como texto (datas, bool...) vai como texto
+    if v is None or (isinstance(v, (str, int, float)) and not isinstance(v, bool)):
+        return v
+    return str(v)
+
+
+class SqliteCheckpointStore:
+    """
+    Checkpoint em SQLite (WAL) com índice em `caminho`: a retomada consulta o
+    índice, cada flush é uma transação e o resultado sai de uma query. O
+    checkpoint CSV antigo, se existir, é importado na criação do banco.
+
+    Cada linha guarda a identidade do arquivo (caminho relativo a DATA_DIR,
+    tamanho, mtime_ns e, opcionalmente, hash do conteúdo) e um `estado`:
+    "atual", "substituido" (o arquivo mudou e foi reprocessado) ou "removido"
+    (o arquivo sumiu da pasta). O resultado só traz as linhas atuais.
+    """
+
+    LOOKUP_BATCH = 500
+
+    def __init__(self, path: Path, fields: list[str], legacy_csv: Path | None = None):
+        reservados = set(fields) & {*IDENTITY_FIELDS, "id", "estado"}
+        if reservados:
+            raise ValueError(f"Colunas reservadas pelo checkpoint SQLite: {sorted(reservados)}")
+        self.path = path
+        self.fields = fields
+        self.alterados = 0
+        self.removidos = 0
+        novo = not path.exists()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={'FULL' if DO_FSYNC else 'NORMAL'}")
+
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            salvo = self.conn.execute("SELECT valor FROM meta WHERE chave = 'fields'").fetchone()
+        if salvo is not None and json.loads(salvo[0]) != fields:
+            self.conn.close()
+            raise ValueError(
+                f"Checkpoint {path} tem as colunas {json.loads(salvo[0])}, esperado {fields}. "
+                "Use outro arquivo de checkpoint para esta configuração."
+            )
+
+        with self.conn:
+            if salvo is None:
+                self.conn.execute(
+                    "INSERT INTO meta VALUES ('fields', ?)", (json.dumps(fields, ensure_ascii=False),)
+                )
+            colunas = ", ".join(_sql_name(f) for f in fields)
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS checkpoint (id INTEGER PRIMARY KEY, {colunas})"
+            )
+            # bancos anteriores à identidade por arquivo ganham as colunas; as linhas
+            # antigas ficam com caminho NULL até a próxima varredura (ver pending)
+            existentes = {r[1] for r in self.conn.execute("PRAGMA table_info(checkpoint)")}
+            for coluna, tipo in [
+                ("caminho", "TEXT"), ("tamanho", "INTEGER"), ("mtime_ns", "INTEGER"), ("hash", "TEXT"),
+                ("estado", "TEXT NOT NULL DEFAULT 'atual'"),
+            ]:
+                if coluna not in existentes:
+                    self.conn.execute(f"ALTER TABLE checkpoint ADD COLUMN {coluna} {tipo}")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_checkpoint_arquivo ON checkpoint (arquivo)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_checkpoint_caminho ON checkpoint (caminho, estado)"
+            )
+
+        if novo and legacy_csv is not None and legacy_csv.exists():
+            self._import_csv(legacy_csv)
+
+    def _import_csv(self, csv_path: Path) -> None:
+        with csv_path.open("r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != self.fields:
+                return
+            # o CSV guarda vazio para None
+            self.append([{k: (v if v != "" else None) for k, v in row.items()} for row in reader])
+
+    def _lookup(self, sql: str, chaves: list[str]):
+        for i in range(0, len(chaves), self.LOOKUP_BATCH):
+            lote = chaves[i : i + self.LOOKUP_BATCH]
+            yield from self.conn.execute(sql.format(marcas=", ".join("?" * len(lote))), lote)
+
+    def processed_count(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(DISTINCT COALESCE(caminho, arquivo)) FROM checkpoint WHERE estado = 'atual'"
+        ).fetchone()[0]
+
+    def pending(self, files: list[Path], root: Path, with_hash: bool = False) -> list[Path]:
+        """
+        Arquivos novos ou alterados desde o checkpoint, comparando (caminho,
+        tamanho, mtime_ns). Com `with_hash`, um arquivo alterado só pelo
+        tamanho/mtime mas com o mesmo conteúdo é mantido. Os que sumiram da
+        pasta passam a "removido"; os que voltaram iguais, a "atual".
+        """
+        atuais = {}
+        for p in files:
+            try:
+                st = p.stat()
+            except OSError:
+                # apagado/travado depois da listagem: fica fora e vira "removido"
+                continue
+            atuais[p.relative_to(root).as_posix()] = (p, st.st_size, st.st_mtime_ns)
+        caminhos = list(atuais)
+
+        salvos = {
+            r[0]: r[1:]
+            for r in self._lookup(
+                "SELECT caminho, tamanho, mtime_ns, hash, estado FROM checkpoint "
+                "WHERE estado != 'substituido' AND caminho IN ({marcas})",
+                caminhos,
+            )
+        }
+        # checkpoint antigo (só pelo nome, pasta sem subpastas): confia no que já
+        # foi processado e grava a identidade atual do arquivo
+        legados = {
+            r[0]
+            for r in self._lookup(
+                "SELECT DISTINCT arquivo FROM checkpoint WHERE caminho IS NULL AND arquivo IN ({marcas})",
+                [c for c in caminhos if c not in salvos and "/" not in c],
+            )
+        }
+
+        fila, adotar, manter = [], [], []
+        for caminho, (p, tamanho, mtime_ns) in atuais.items():
+            salvo = salvos.get(caminho)
+            if salvo is None:
+                if caminho in legados:
+                    adotar.append((caminho, tamanho, mtime_ns, caminho))
+                else:
+                    fila.append(p)
+                continue
+            tamanho_salvo, mtime_salvo, hash_salvo, estado = salvo
+            if (tamanho_salvo, mtime_salvo) == (tamanho, mtime_ns):
+                if estado != "atual":
+                    manter.append((tamanho, mtime_ns, caminho))
+            elif with_hash and hash_salvo is not None and file_hash(p) == hash_salvo:
+                manter.append((tamanho, mtime_ns, caminho))
+            else:
+                fila.append(p)
+
+        ja_atuais = {
+            r[0]
+            for r in self.conn.execute(
+                "SELECT DISTINCT caminho FROM checkpoint WHERE estado = 'atual' AND caminho IS NOT NULL"
+            )
+        }
+        sumiram = [(c,) for c in ja_atuais if c not in atuais]
+
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE checkpoint SET caminho = ?, tamanho = ?, mtime_ns = ? "
+                "WHERE caminho IS NULL AND arquivo = ?",
+                adotar,
+            )
+            self.conn.executemany(
+                "UPDATE checkpoint SET tamanho = ?, mtime_ns = ?, estado = 'atual' "
+                "WHERE caminho = ? AND estado != 'substituido'",
+                manter,
+            )
+            self.conn.executemany(
+                "UPDATE checkpoint SET estado = 'removido' WHERE caminho = ? AND estado = 'atual'",
+                sumiram,
+            )
+            # linhas antigas sem caminho que não foram adotadas: o arquivo não existe mais
+            legados_sumidos = self.conn.execute(
+                "SELECT COUNT(DISTINCT arquivo) FROM checkpoint WHERE caminho IS NULL AND estado = 'atual'"
+            ).fetchone()[0]
+            self.conn.execute(
+                "UPDATE checkpoint SET estado = 'removido' WHERE caminho IS NULL AND estado = 'atual'"
+            )
+
+        self.alterados = sum(1 for p in fila if p.relative_to(root).as_posix() in salvos)
+        self.removidos = len(sumiram) + legados_sumidos
+        return fila
+
+    def append(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        todas = [*IDENTITY_FIELDS, *self.fields]
+        colunas = ", ".join(_sql_name(f) for f in todas)
+        marcas = ", ".join("?" * len(todas))
+        # arquivo reprocessado: as linhas da versão anterior deixam de valer
+        refeitos = {r["caminho"] for r in rows if r.get("caminho") is not None}
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE checkpoint SET estado = 'substituido' WHERE caminho = ? AND estado != 'substituido'",
+                ((c,) for c in refeitos),
+            )
+            self.conn.executemany(
+                f"INSERT INTO checkpoint ({colunas}) VALUES ({marcas})",
+                ([_sql_value(r.get(f)) for f in todas] for r in rows),
+            )
+
+    def export_result(self, result_path: Path, columns: list[str]) -> pd.DataFrame:
+        colunas = ", ".join(_sql_name(f) for f in self.fields)
+        df_all = pd.read_sql_query(
+            f"SELECT {colunas} FROM checkpoint WHERE estado = 'atual' ORDER BY id", self.conn
+        )
+        df_all[columns].to_csv(result_path, index=False, encoding="utf-8-sig")
+        return df_all
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def open_checkpoint_store(csv_path: Path, db_path: Path, fields: list[str]):
+    if CHECKPOINT_BACKEND == "csv":
+        # o CSV retoma só pelo nome: homônimos em subpastas e conteúdo alterado
+        # passariam despercebidos
+        if SCAN_RECURSIVE or HASH_CONTENT:
+            raise ValueError(
+                "CHECKPOINT_BACKEND='csv' não suporta SCAN_RECURSIVE nem HASH_CONTENT; "
+                "use CHECKPOINT_BACKEND='sqlite'."
+            )
+        return CsvCheckpointStore(csv_path, fields)
+    if CHECKPOINT_BACKEND == "sqlite":
+        return SqliteCheckpointStore(db_path, fields, legacy_csv=csv_path)
+    raise ValueError(f"CHECKPOINT_BACKEND inválido: {CHECKPOINT_BACKEND!r} (use 'sqlite' ou 'csv').")
+
+
+# =========================
+# FAST PATH: XML DO ZIP
+# =========================
+class _XlsxXmlReader:
+    """Valores das células como o openpyxl (data_only) devolve, a partir do XML cru."""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive = archive
+        self.sheets, parte_shared = xlsx_parts(archive)
+        self.shared_strings = read_shared_strings(archive, parte_shared)
+        self.epoch = workbook_epoch(archive)
+        self._estilos: tuple[set[int], set[int]] | None = None
+
+    def _date_formats(self) -> tuple[set[int], set[int]]:
+        # styles.xml só é lido se alguma linha casar
+        if self._estilos is None:
+            self._estilos = date_style_ids(self.archive)
+        return self._estilos
+
+    def cell_value(self, c):
+        t = c.get("t", "n")
+        if t == "inlineStr":
+            inline = c.find(TAG_IS)
+            return rich_text(inline) if inline is not None else None
+        v = c.findtext(TAG_V) or None
+        if v is None:
+            return None
+        if t == "n":
+            valor = float(v) if ("." in v or "E" in v or "e" in v) else int(v)
+            estilo = int(c.get("s", 0))
+            datas, duracoes = self._date_formats()
+            if estilo in datas:
+                try:
+                    return from_excel(valor, self.epoch, timedelta=estilo in duracoes)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return valor
+        if t == "s":
+            return self.shared_strings[int(v)]
+        if t == "b":
+            return bool(int(v))
+        if t == "d":
+            return from_ISO8601(v)
+        return v  # "str" e "e"
+
+    def iter_rows(self, fonte):
+        """
+        Elementos <row> da worksheet lidos em streaming de `fonte` (a parte aberta
+        do zip), liberados da memória depois de cada uso.
+        """
+        for _, row in etree.iterparse(fonte, tag=TAG_ROW):
+            yield row
+            row.clear()
+            while row.getprevious() is not None:
+                del row.getparent()[0]
+
+
+_RE_INLINE = re.compile(rb"inlineStr|t=[\"']str[\"']")
+
+# a aba é lida do zip em blocos deste tamanho, cortados no último </row>
+TAMANHO_BLOCO_XML = 1 << 20
+
+
+def _indices_pattern(indices: list[str]) -> re.Pattern | None:
+    # qualquer elemento cujo texto é um dos índices (o <v> de uma célula t="s")
+    if not indices:
+        return None
+    return re.compile(rb">\s*(?:" + "|".join(indices).encode() + rb")\s*<")
+
+
+def _find_row_start(dados: bytes, fim: int) -> int:
+    ini = dados.rfind(b"<row", 0, fim)
+    while ini >= 0 and dados[ini + 4 : ini + 5] not in (b" ", b">", b"/", b"\t", b"\n", b"\r"):
+        ini = dados.rfind(b"<row", 0, ini)
+    return ini
+
+
+def _candidate_rows(fonte, padrao: re.Pattern):
+    """
+    Só as linhas da aba que casam com `padrao`, recortadas dos bytes e parseadas
+    com a tag raiz original (que declara os namespaces). A aba é lida de `fonte`
+    em blocos de TAMANHO_BLOCO_XML; cada bloco é cortado no último </row>, de
+    modo que toda linha fica inteira num trecho só. Devolve None se o XML não
+    permite o recorte (tags com prefixo ou raiz fora do primeiro bloco, por exemplo).
+    """
+    inicio = fonte.read(TAMANHO_BLOCO_XML)
+    ini_raiz = inicio.find(b"<worksheet")
+    if ini_raiz < 0:
+        return None
+    fim_raiz = inicio.find(b">", ini_raiz)
+    while fim_raiz < 0:
+        bloco = fonte.read(TAMANHO_BLOCO_XML)
+        if not bloco:
+            return None
+        inicio += bloco
+        fim_raiz = inicio.find(b">", ini_raiz)
+    raiz = inicio[ini_raiz : fim_raiz + 1]
+    if raiz.endswith(b"/>"):
+        return None
+
+    def linhas_do_trecho(dados: bytes):
+        fim_anterior = -1
+        for m in padrao.finditer(dados):
+            if m.start() < fim_anterior:
+                continue  # outra ocorrência na linha já devolvida
+            ini = _find_row_start(dados, m.start())
+            fim = dados.find(b"</row>", m.end())
+            if ini < 0 or fim < 0:
+                continue
+            fim_anterior = fim + len(b"</row>")
+            trecho = etree.fromstring(raiz + dados[ini:fim_anterior] + b"</worksheet>")
+            yield from trecho.iterchildren(TAG_ROW)
+
+    def linhas():
+        pendente = inicio[fim_raiz + 1 :]
+        while True:
+            bloco = fonte.read(TAMANHO_BLOCO_XML)
+            pendente += bloco
+            if bloco:
+                corte = pendente.rfind(b"</row>")
+                if corte < 0:
+                    continue
+                corte += len(b"</row>")
+            else:
+                corte = len(pendente)
+            yield from linhas_do_trecho(pendente[:corte])
+            pendente = pendente[corte:]
+            if not bloco:
+                return
+
+    return linhas()
+
+
+def _column_b_cell(row):
+    for c in row.iterchildren(TAG_C):
+        ref = c.get("r")
+        if ref is None:
+            raise XmlFastPathUnsupported("célula sem referência")
+        if ref[0] == "B" and ref[1].isdigit():
+            return c
+        if ref[0] > "B" or ref[1].isalpha():
+            return None
+    return None
+
+
+def iter_target_rows_xml(xlsx_path: Path, targets_norm: set[str]):
+    """
+    Varre o XLSX sem openpyxl e devolve (aba, alvo normalizado, último valor não
+    vazio da linha) para cada linha cuja coluna B, normalizada, está em
+    `targets_norm`, na mesma ordem do openpyxl (abas e depois linhas).
+
+    O sharedStrings.xml é lido uma vez e só os índices cujo texto normalizado é
+    um alvo são procurados nas células B; normalize_text roda por string
+    distinta, não por célula. Cada aba é lida do zip em streaming, em blocos
+    (ver _candidate_rows): só as linhas que contêm um desses índices ou texto
+    inline são recortadas e parseadas. Textos inline ("inlineStr"/"str") na
+    coluna B são normalizados uma vez por texto distinto.
+    """
+    with zipfile.ZipFile(xlsx_path) as archive:
+        reader = _XlsxXmlReader(archive)
+        alvo_por_indice = {}
+        for i, texto in enumerate(reader.shared_strings):
+            norm = normalize_text(texto)
+            if norm in targets_norm:
+                alvo_por_indice[str(i)] = norm
+
+        padrao = _indices_pattern(list(alvo_por_indice))
+        # filtro em bytes: a linha alvo tem um <v> com um dos índices ou texto
+        # inline; falso positivo só custa o parse, falso negativo não há
+        padrao_linha = (
+            re.compile(padrao.pattern + b"|" + _RE_INLINE.pattern) if padrao else _RE_INLINE
+        )
+        alvo_por_texto = {}  # textos inline já normalizados
+        for titulo, parte in reader.sheets:
+            with ExitStack() as stack:
+                rows = _candidate_rows(stack.enter_context(archive.open(parte)), padrao_linha)
+                if rows is None:
+                    # XML que não permite o recorte: parse da aba inteira, em streaming
+                    rows = reader.iter_rows(stack.enter_context(archive.open(parte)))
+
+                for row in rows:
+                    c = _column_b_cell(row)
+                    if c is None:
+                        continue
+                    t = c.get("t")
+                    if t == "s":
+                        alvo = alvo_por_indice.get(c.findtext(TAG_V))
+                    elif t in ("inlineStr", "str"):
+                        texto = reader.cell_value(c)
+                        if texto not in alvo_por_texto:
+                            norm = normalize_text(texto)
+                            alvo_por_texto[texto] = norm if norm in targets_norm else None
+                        alvo = alvo_por_texto[texto]
+                    else:
+                        continue
+                    if alvo is None:
+                        continue
+
+                    valores = [reader.cell_value(cel) for cel in row.iterchildren(TAG_C)]
+                    yield titulo, alvo, last_non_empty_in_values(valores)
+
+
+def process_one_file_xml(xlsx_path: Path) -> dict:
+    """process_one_file pelo XML do zip; exceções ficam para o chamador cair no openpyxl."""
+    for titulo, _, ultimo in iter_target_rows_xml(xlsx_path, {TARGET_NORM}):
+        return {
+            "arquivo": xlsx_path.name,
+            "arquivo_completo": str(xlsx_path),
+            "aba": titulo,
+            "valor_ultimo_na_linha": ultimo,
+            "status": "ok",
+        }
+    return {
+        "arquivo": xlsx_path.name,
+        "arquivo_completo": str(xlsx_path),
+        "aba": None,
+        "valor_ultimo_na_linha": None,
+        "status": "nao_encontrado",
+    }
+
+
 # =========================
 # CORE: PROCESSAR 1 XLSX
 # =========================
 def process_one_file(xlsx_path: Path) -> dict:
+    """
+    Fast path pelo XML (USE_XML_FAST_PATH); se o arquivo tiver algo que ele não
+    trata, ou der erro, o arquivo é processado de novo pelo openpyxl, que
+    também produz os status de erro.
+    """
+    if USE_XML_FAST_PATH:
+        try:
+            return process_one_file_xml(xlsx_path)
+        except Exception:
+            pass
+    return process_one_file_openpyxl(xlsx_path)
+
+
+def _open_error_status(e: Exception) -> str:
+    if isinstance(e, zipfile.BadZipFile):
+        return "erro: BadZipFile (xlsx inválido/corrompido)"
+    if isinstance(e, PermissionError):
+        return "erro: PermissionError (sem acesso ao arquivo)"
+    return f"erro: {type(e).__name__} (falha ao abrir)"
+
+
+def iter_target_rows_openpyxl(wb, targets_norm: set[str]):
+    """Mesmo contrato de iter_target_rows_xml, num workbook já aberto pelo openpyxl."""
+    for ws in wb.worksheets:
+        for row in ws.iter_rows(values_only=True):
+            # coluna B = índice 1
+            b_val = row[1] if len(row) > 1 else None
+            if b_val is None:
+                continue
+
+            # normaliza apenas quando existe algo
+            norm = normalize_text(b_val)
+            if norm in targets_norm:
+                yield ws.title, norm, last_non_empty_in_values(row)
+
+
+def process_one_file_openpyxl(xlsx_path: Path) -> dict:
     """
     Processa um único arquivo XLSX:
     - abre em read_only + data_only
@@ -164,49 +787,24 @@ def process_one_file(xlsx_path: Path) -> dict:
     """
     try:
         wb = load_workbook(xlsx_path, data_only=True, read_only=True)
-    except zipfile.BadZipFile:
-        return {
-            "arquivo": xlsx_path.name,
-            "arquivo_completo": str(xlsx_path),
-            "aba": None,
-            "valor_ultimo_na_linha": None,
-            "status": "erro: BadZipFile (xlsx inválido/corrompido)",
-        }
-    except PermissionError:
-        return {
-            "arquivo": xlsx_path.name,
-            "arquivo_completo": str(xlsx_path),
-            "aba": None,
-            "valor_ultimo_na_linha": None,
-            "status": "erro: PermissionError (sem acesso ao arquivo)",
-        }
     except Exception as e:
         return {
             "arquivo": xlsx_path.name,
             "arquivo_completo": str(xlsx_path),
             "aba": None,
             "valor_ultimo_na_linha": None,
-            "status": f"erro: {type(e).__name__} (falha ao abrir)",
+            "status": _open_error_status(e),
         }
 
     try:
-        for ws in wb.worksheets:
-            for row in ws.iter_rows(values_only=True):
-                # coluna B = índice 1
-                b_val = row[1] if len(row) > 1 else None
-                if b_val is None:
-                    continue
-
-                # normaliza apenas quando existe algo
-                if normalize_text(b_val) == TARGET_NORM:
-                    ultimo = last_non_empty_in_values(row)
-                    return {
-                        "arquivo": xlsx_path.name,
-                        "arquivo_completo": str(xlsx_path),
-                        "aba": ws.title,
-                        "valor_ultimo_na_linha": ultimo,
-                        "status": "ok",
-                    }
+        for titulo, _, ultimo in iter_target_rows_openpyxl(wb, {TARGET_NORM}):
+            return {
+                "arquivo": xlsx_path.name,
+                "arquivo_completo": str(xlsx_path),
+                "aba": titulo,
+                "valor_ultimo_na_linha": ultimo,
+                "status": "ok",
+            }
 
         return {
             "arquivo": xlsx_path.name,
@@ -231,43 +829,157 @@ def process_one_file(xlsx_path: Path) -> dict:
             pass
 
 
+def _scan_targets(xlsx_path: Path, targets_norm: set[str]) -> tuple[list[tuple], str | None]:
+    """Todas as linhas alvo do arquivo (fast path, depois openpyxl) e o status de erro, se houver."""
+    if USE_XML_FAST_PATH:
+        try:
+            return list(iter_target_rows_xml(xlsx_path, targets_norm)), None
+        except Exception:
+            pass
+
+    try:
+        wb = load_workbook(xlsx_path, data_only=True, read_only=True)
+    except Exception as e:
+        return [], _open_error_status(e)
+    try:
+        return list(iter_target_rows_openpyxl(wb, targets_norm)), None
+    except Exception as e:
+        return [], f"erro: {type(e).__name__} (falha ao ler)"
+    finally:
+        try:
+            wb.close()
+        except Exception:
+            pass
+
+
+def process_one_file_multi(xlsx_path: Path, targets: list[str]) -> list[dict]:
+    """
+    Modo multi-alvo: uma varredura do arquivo para todos os rótulos de
+    `targets`. Devolve uma linha larga por aba onde algum rótulo aparece
+    (rótulo -> último valor não vazio da primeira linha com ele na aba), ou
+    uma linha só, sem aba, se nada foi encontrado ou o arquivo deu erro.
+    """
+    label_por_norm = {normalize_text(t): t for t in targets}
+    encontrados, erro = _scan_targets(xlsx_path, set(label_por_norm))
+
+    por_aba: dict[str, dict] = {}
+    for titulo, norm, ultimo in encontrados:
+        por_aba.setdefault(titulo, {}).setdefault(label_por_norm[norm], ultimo)
+
+    base = {"arquivo": xlsx_path.name, "arquivo_completo": str(xlsx_path)}
+    if not por_aba:
+        return [{**base, "aba": None, **dict.fromkeys(targets), "status": erro or "nao_encontrado"}]
+    return [
+        {**base, "aba": titulo, **{t: valores.get(t) for t in targets}, "status": "ok"}
+        for titulo, valores in por_aba.items()
+    ]
+
+
+def process_one_file_rows(xlsx_path: Path) -> list[dict]:
+    # modo de alvo único com o mesmo formato de retorno do multi-alvo
+    return [process_one_file(xlsx_path)]
+
+
+def process_files_chunk(worker, paths: list[Path]) -> list[dict]:
+    """Tarefa do pool: um lote de arquivos e um lote de linhas de volta."""
+    rows = []
+    for p in paths:
+        rows.extend(worker(p))
+    return rows
+
+
+def iter_chunk_results(worker, files: list[Path], max_workers: int, chunk_size: int):
+    """
+    (nº de arquivos, linhas) de cada lote, processados num ProcessPoolExecutor
+    com no máximo max_workers * TASKS_IN_FLIGHT_PER_WORKER lotes em voo: o pai
+    só guarda a janela, não um future por arquivo.
+    """
+    chunks = (files[i : i + chunk_size] for i in range(0, len(files), chunk_size))
+    max_in_flight = max(1, max_workers * TASKS_IN_FLIGHT_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        in_flight = {}
+        for chunk in chunks:
+            in_flight[ex.submit(process_files_chunk, worker, chunk)] = len(chunk)
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield in_flight.pop(fut), fut.result()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield in_flight.pop(fut), fut.result()
+
+
 # =========================
 # MAIN PIPELINE
 # =========================
-def build_result_from_checkpoint():
-    df_all = pd.read_csv(CHECKPOINT_PATH, encoding="utf-8-sig")
-    df_all[["arquivo", "valor_ultimo_na_linha", "status"]].to_csv(
-        RESULT_PATH, index=False, encoding="utf-8-sig"
-    )
+def build_result_from_checkpoint(
+    checkpoint_path: Path = CHECKPOINT_PATH,
+    result_path: Path = RESULT_PATH,
+    columns: list[str] | None = None,
+):
+    columns = columns or ["arquivo", "valor_ultimo_na_linha", "status"]
+    df_all = pd.read_csv(checkpoint_path, encoding="utf-8-sig")
+    df_all[columns].to_csv(result_path, index=False, encoding="utf-8-sig")
     return df_all
 
 
-def main():
+def main(targets: list[str] | None = None):
+    """
+    Varre DATA_DIR retomando do checkpoint. Com `targets` (ou TARGET_TEXTS
+    preenchido) roda o modo multi-alvo, com checkpoint e resultado próprios.
+    """
+    targets = list(TARGET_TEXTS if targets is None else targets)
+    validate_targets(targets)
+    if targets:
+        worker = partial(process_one_file_multi, targets=targets)
+        fields = checkpoint_fields_multi(targets)
+        checkpoint_path, db_path, result_path = (
+            CHECKPOINT_MULTI_PATH, CHECKPOINT_MULTI_DB_PATH, RESULT_MULTI_PATH
+        )
+        result_columns = ["arquivo", "aba", *targets, "status"]
+    else:
+        worker = process_one_file_rows
+        fields = CHECKPOINT_FIELDS
+        checkpoint_path, db_path, result_path = CHECKPOINT_PATH, CHECKPOINT_DB_PATH, RESULT_PATH
+        result_columns = ["arquivo", "valor_ultimo_na_linha", "status"]
+
     if not DATA_DIR.exists() or not DATA_DIR.is_dir():
         raise FileNotFoundError(
             f"Pasta não encontrada: {DATA_DIR}. Ajuste DATA_DIR e coloque os .xlsx lá."
         )
 
-    files = sorted(DATA_DIR.glob("*.xlsx"))
+    files = sorted(DATA_DIR.rglob("*.xlsx") if SCAN_RECURSIVE else DATA_DIR.glob("*.xlsx"))
     if not files:
         raise FileNotFoundError(f"Nenhum .xlsx encontrado em: {DATA_DIR}")
 
-    ensure_checkpoint_header(CHECKPOINT_PATH)
-    processed = load_checkpoint_processed_set(CHECKPOINT_PATH)
-    files_to_process = [p for p in files if p.name not in processed]
+    worker = partial(process_with_identity, worker, DATA_DIR, HASH_CONTENT)
+    store = open_checkpoint_store(checkpoint_path, db_path, fields)
+    try:
+        _run(store, worker, files, targets, result_path, result_columns)
+    finally:
+        store.close()
+
+
+def _run(store, worker, files, targets, result_path, result_columns):
+    files_to_process = store.pending(files, DATA_DIR, with_hash=HASH_CONTENT)
 
     print(f"Diretório: {DATA_DIR.resolve()}")
     print(f"Total .xlsx encontrados: {len(files)}")
-    print(f"Já processados (checkpoint): {len(processed)}")
-    print(f"Restantes para processar: {len(files_to_process)}")
+    print(f"Já processados (checkpoint {CHECKPOINT_BACKEND}): {store.processed_count()}")
+    print(f"Restantes para processar: {len(files_to_process)} (alterados desde o checkpoint: {store.alterados})")
+    if store.removidos:
+        print(f"Sumiram da pasta (marcados como removidos no checkpoint): {store.removidos}")
     print(f"Modo: {'PARALELO' if USE_PARALLEL else 'SEQUENCIAL'}"
-          f"{f' (workers={MAX_WORKERS})' if USE_PARALLEL else ''}")
+          f"{f' (workers={MAX_WORKERS}, {FILES_PER_TASK} arquivos/tarefa)' if USE_PARALLEL else ''}")
     print(f"Checkpoint flush a cada: {CHECKPOINT_FLUSH_EVERY} | fsync: {DO_FSYNC}")
+    if targets:
+        print(f"Multi-alvo ({len(targets)} rótulos): {targets}")
 
     if not files_to_process:
-        print("Nada a processar. Gerando resultado.csv a partir do checkpoint.csv...")
-        df_all = build_result_from_checkpoint()
-        print(f"OK! Gerado: {RESULT_PATH.resolve()}")
+        print(f"Nada a processar. Gerando {result_path} a partir do checkpoint...")
+        df_all = store.export_result(result_path, result_columns)
+        print(f"OK! Gerado: {result_path.resolve()}")
         print(df_all["status"].value_counts(dropna=False))
         return
 
@@ -275,45 +987,40 @@ def main():
     newly_processed = 0
 
     with RunTimer() as rt:
-        if USE_PARALLEL:
-            with ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
-                futures = [ex.submit(process_one_file, p) for p in files_to_process]
-
-                for fut in tqdm(
-                    as_completed(futures),
-                    total=len(futures),
-                    desc="Processando XLSX",
-                    unit="arquivo",
-                ):
-                    r = fut.result()
-                    buffer_rows.append(r)
+        try:
+            if USE_PARALLEL:
+                with tqdm(total=len(files_to_process), desc="Processando XLSX", unit="arquivo") as pbar:
+                    for n_files, rows in iter_chunk_results(
+                        worker, files_to_process, MAX_WORKERS, FILES_PER_TASK
+                    ):
+                        buffer_rows.extend(rows)
+                        newly_processed += n_files
+                        pbar.update(n_files)
+
+                        if len(buffer_rows) >= CHECKPOINT_FLUSH_EVERY:
+                            store.append(buffer_rows)
+                            buffer_rows.clear()
+            else:
+                for p in tqdm(files_to_process, total=len(files_to_process), desc="Processando XLSX", unit="arquivo"):
+                    buffer_rows.extend(worker(p))
                     newly_processed += 1
 
                     if len(buffer_rows) >= CHECKPOINT_FLUSH_EVERY:
-                        append_checkpoint_rows(CHECKPOINT_PATH, buffer_rows)
+                        store.append(buffer_rows)
                         buffer_rows.clear()
-        else:
-            for p in tqdm(files_to_process, total=len(files_to_process), desc="Processando XLSX", unit="arquivo"):
-                r = process_one_file(p)
-                buffer_rows.append(r)
-                newly_processed += 1
-
-                if len(buffer_rows) >= CHECKPOINT_FLUSH_EVERY:
-                    append_checkpoint_rows(CHECKPOINT_PATH, buffer_rows)
-                    buffer_rows.clear()
-
-        # grava o resto
-        append_checkpoint_rows(CHECKPOINT_PATH, buffer_rows)
-        buffer_rows.clear()
+        finally:
+            # grava o resto, inclusive se a execução parar no meio
+            store.append(buffer_rows)
+            buffer_rows.clear()
 
     elapsed = rt.elapsed_seconds
-    df_all = build_result_from_checkpoint()
+    df_all = store.export_result(result_path, result_columns)
 
     ok = int((df_all["status"] == "ok").sum())
     nao = int((df_all["status"] == "nao_encontrado").sum())
     err = int((df_all["status"].astype(str).str.startswith("erro")).sum())
 
-    print(f"\nOK! Gerado: {RESULT_PATH.resolve()}")
+    print(f"\nOK! Gerado: {result_path.resolve()}")
     print(df_all["status"].value_counts(dropna=False))
 
     print("\n===== RESUMO DA EXECUÇÃO =====")
@@ -562,26 +562,12 @@ class resumo_piscofins:
             "Base Analítica x Contrato/Tela Sistêmica"
         ].apply(lambda x: "Divergente" if x != "Conferido" else x)
 
-        df_quadro["Base Analítica"] = df_quadro.apply(
-            lambda x: (
-                DocumentFormatter.format_values(
-                    x["Base Analítica"], format_as_currency=True
-                )
-                if "Valor do Bem" in x["Ref."]
-                else x["Base Analítica"]
-            ),
-            axis=1,
-        )
-        df_quadro["Contrato/Tela Sistêmica"] = df_quadro.apply(
-            lambda x: (
-                DocumentFormatter.format_values(
-                    x["Contrato/Tela Sistêmica"], format_as_currency=True
-                )
-                if "Valor do Bem" in x["Ref."]
-                else x["Contrato/Tela Sistêmica"]
-            ),
-            axis=1,
-        )
+        valor_do_bem = df_quadro["Ref."].str.contains("Valor do Bem", regex=False, na=False)
+        for col in ["Base Analítica", "Contrato/Tela Sistêmica"]:
+            df_quadro[col] = df_quadro[col].astype(object)
+            df_quadro.loc[valor_do_bem, col] = DocumentFormatter.format_values_series(
+                df_quadro.loc[valor_do_bem, col], format_as_currency=True
+            ).to_numpy()
 
         workbook = self._create_excel_model(
             file_name="Modelo_Com_Linha_Oculta.xlsx",
@@ -634,8 +620,8 @@ class resumo_piscofins:
         df_quadro = df_quadro[["Descrição", "COSIF", "Valor Contabilizado"]]
         df_quadro["Anexo"] = f"B.{contrato}"
 
-        df_quadro["Valor Contabilizado"] = df_quadro["Valor Contabilizado"].apply(
-            DocumentFormatter.format_values
+        df_quadro["Valor Contabilizado"] = df_quadro["Valor Contabilizado"].pipe(
+            DocumentFormatter.format_values_series
         )
 
         df_quadro = df_quadro.sort_values(by=["COSIF"])
@@ -686,7 +672,7 @@ class resumo_piscofins:
         df_quadro.fillna("", inplace=True)
         df_quadro["Valor Líquido Contabilizado"] = df_quadro[
             "Valor Líquido Contabilizado"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro = df_quadro.round(2)
         df_quadro = df_quadro.sort_values(by=["Contrato", "COSIF"])
 
@@ -742,14 +728,14 @@ class resumo_piscofins:
             "Saldo Líquido": "SALDO LÍQUIDO",
         }
         df_quadro = df_quadro.rename(columns=rename_cols)
-        df_quadro["SALDOS DEVEDORES"] = df_quadro["SALDOS DEVEDORES"].apply(
-            DocumentFormatter.format_values
+        df_quadro["SALDOS DEVEDORES"] = df_quadro["SALDOS DEVEDORES"].pipe(
+            DocumentFormatter.format_values_series
         )
-        df_quadro["SALDOS CREDORES"] = df_quadro["SALDOS CREDORES"].apply(
-            DocumentFormatter.format_values
+        df_quadro["SALDOS CREDORES"] = df_quadro["SALDOS CREDORES"].pipe(
+            DocumentFormatter.format_values_series
         )
-        df_quadro["SALDO LÍQUIDO"] = df_quadro["SALDO LÍQUIDO"].apply(
-            DocumentFormatter.format_values
+        df_quadro["SALDO LÍQUIDO"] = df_quadro["SALDO LÍQUIDO"].pipe(
+            DocumentFormatter.format_values_series
         )
 
         df_quadro.sort_values(by=["Contrato", "Ano"], inplace=True)
@@ -801,16 +787,16 @@ class resumo_piscofins:
         df_quadro = df_quadro.rename(columns=rename_cols)
         df_quadro["Receita de Contraprestação - Inclui Superveniência (1)"] = df_quadro[
             "Receita de Contraprestação - Inclui Superveniência (1)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Exclusão - Recuperção Baixada como Prejuízo (2)"] = df_quadro[
             "Exclusão - Recuperção Baixada como Prejuízo (2)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Dedução - Depreciação/Outras Despesas (3)"] = df_quadro[
             "Dedução - Depreciação/Outras Despesas (3)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Base de Cálculo (01)-(02)-(03)"] = df_quadro[
             "Base de Cálculo (01)-(02)-(03)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
 
         df_quadro.sort_values(by=["Contrato", "Ano"], inplace=True)
 
@@ -875,17 +861,17 @@ class resumo_piscofins:
         df_quadro["Receita de Contraprestação - Não Inclui Superveniência (1)"] = (
             df_quadro[
                 "Receita de Contraprestação - Não Inclui Superveniência (1)"
-            ].apply(DocumentFormatter.format_values)
+            ].pipe(DocumentFormatter.format_values_series)
         )
         df_quadro["Exclusão - Recuperção Baixada como Prejuízo (2)"] = df_quadro[
             "Exclusão - Recuperção Baixada como Prejuízo (2)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Dedução - Depreciação/Outras Despesas (3)"] = df_quadro[
             "Dedução - Depreciação/Outras Despesas (3)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Base de Cálculo (01)-(02)-(03)"] = df_quadro[
             "Base de Cálculo (01)-(02)-(03)"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
 
         df_quadro.sort_values(by=["Contrato", "Ano"], inplace=True)
 
@@ -954,12 +940,12 @@ class resumo_piscofins:
         df_quadro = df_quadro.rename(columns=rename_cols)
         df_quadro["Base Com Efeito da Superveniência/Insuficiência"] = df_quadro[
             "Base Com Efeito da Superveniência/Insuficiência"
-        ].apply(DocumentFormatter.format_values)
+        ].pipe(DocumentFormatter.format_values_series)
         df_quadro["Base Sem Efeito da Superveniência/Insuficiência"] = df_quadro[
             "Base Sem Efeito da Superveniência/Insuficiência"
-        ].apply(DocumentFormatter.format_values)
-        df_quadro["Diferença"] = df_quadro["Diferença"].apply(
-            DocumentFormatter.format_values
+        ].pipe(DocumentFormatter.format_values_series)
+        df_quadro["Diferença"] = df_quadro["Diferença"].pipe(
+            DocumentFormatter.format_values_series
         )
 
         df_quadro.sort_values(by=["Contrato", "Ano"], inplace=True)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PASTA_SNAPSHOTS = ".snapshots"
+# metadado do Parquet com as colunas gravadas valor a valor (tipos misturados)
+CHAVE_COLUNAS_MISTAS = b"excel_snapshot_colunas_mistas"
+
+
+def _chave(texto: str) -> str:
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def caminho_snapshot(path_excel, pasta_cache=None, **kwargs_read_excel) -> Path:
+    """
+    Arquivo Parquet do snapshot: <nome>.<chave da leitura>.<chave da versão>.parquet.
+    A chave da leitura cobre o caminho e os argumentos do read_excel (aba, dtype,
+    parse_dates...); a da versão, o mtime e o tamanho da planilha.
+    """
+    path_excel = Path(path_excel).resolve()
+    pasta_cache = Path(pasta_cache) if pasta_cache else path_excel.parent / PASTA_SNAPSHOTS
+
+    st = path_excel.stat()
+    chave_leitura = _chave(f"{path_excel}|{sorted(kwargs_read_excel.items())!r}")
+    chave_versao = _chave(f"{st.st_mtime_ns}|{st.st_size}")
+    return pasta_cache / f"{path_excel.stem}.{chave_leitura}.{chave_versao}.parquet"
+
+
+def _colunas_mistas(df: pd.DataFrame) -> list[str]:
+    """Colunas object com mais de um tipo (ou valores não texto), que o Parquet recusa."""
+    return [
+        col
+        for col in df.columns[df.dtypes == object]
+        if {type(v) for v in df[col].dropna()} - {str}
+    ]
+
+
+def _gravar_snapshot(df: pd.DataFrame, destino: Path) -> None:
+    # colunas mistas vão valor a valor (pickle), para voltar com os mesmos tipos;
+    # o índice é gravado junto (index_col)
+    mistas = _colunas_mistas(df)
+    if mistas:
+        df = df.copy()
+        for col in mistas:
+            df[col] = [None if pd.isna(v) else pickle.dumps(v) for v in df[col]]
+    tabela = pa.Table.from_pandas(df)
+    tabela = tabela.replace_schema_metadata(
+        {**tabela.schema.metadata, CHAVE_COLUNAS_MISTAS: json.dumps(mistas).encode("utf-8")}
+    )
+    pq.write_table(tabela, destino)
+
+
+def _ler_snapshot(origem: Path) -> pd.DataFrame:
+    tabela = pq.read_table(origem)
+    mistas = json.loads((tabela.schema.metadata or {}).get(CHAVE_COLUNAS_MISTAS, b"[]"))
+    df = tabela.to_pandas()
+    for col in mistas:
+        df[col] = pd.Series(
+            [np.nan if v is None else pickle.loads(v) for v in df[col]], index=df.index, dtype=object
+        )
+    # o Parquet devolve None nas colunas de texto; o read_excel devolve NaN
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def ler_excel_com_snapshot(path_excel, pasta_cache=None, **kwargs_read_excel) -> pd.DataFrame:
+    """
+    pd.read_excel com cache: a primeira leitura grava o resultado em Parquet e as
+    seguintes carregam o Parquet enquanto a planilha (mtime/tamanho) e os
+    argumentos forem os mesmos. Snapshots antigos da mesma leitura são apagados.
+
+    Colunas object com tipos misturados (número e texto na mesma coluna, comum
+    nas colunas da DOC BASE fora de TIPOS_COLUNAS) são gravadas valor a valor e
+    voltam com os mesmos tipos; o índice (index_col) também é preservado. Se
+    mesmo assim a gravação falhar, devolve o resultado do read_excel sem cache.
+    """
+    snapshot = caminho_snapshot(path_excel, pasta_cache, **kwargs_read_excel)
+    if snapshot.exists():
+        return _ler_snapshot(snapshot)
+
+    df = pd.read_excel(path_excel, **kwargs_read_excel)
+
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot.with_name(snapshot.name + ".tmp")
+    try:
+        _gravar_snapshot(df, tmp)
+    except Exception as e:
+        print(f"Snapshot não gravado para {path_excel}: {type(e).__name__}: {e}")
+        tmp.unlink(missing_ok=True)
+        return df
+    os.replace(tmp, snapshot)
+
+    prefixo = snapshot.name.rsplit(".", 2)[0]
+    for antigo in snapshot.parent.glob(f"{prefixo}.*.parquet"):
+        if antigo != snapshot:
+            antigo.unlink(missing_ok=True)
+
+    return df
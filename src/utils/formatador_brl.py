@@ -0,0 +1,136 @@
+"""
+Formatação de moeda no padrão pt_BR ("R$ 1.234,56" / "- R$ 1.234,56") sem locale.
+
+O locale é estado global do processo: setlocale por valor custa caro, não é
+seguro entre threads e depende do idioma instalado na máquina. Aqui o texto é
+montado só com aritmética, então serve igual em threads, processos e em
+máquinas sem pt_BR.
+
+Benchmark contra o caminho com locale: python -m src.utils.formatador_brl
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+_TROCA_SEPARADORES = str.maketrans(",.", ".,")
+
+# acima disso os centavos deixam de ser exatos em float64; vai pelo escalar
+LIMITE_VETORIZADO = 1e12
+
+
+def _tabela(formato: str, n: int) -> np.ndarray:
+    tabela = np.array([formato.format(i) for i in range(n)], dtype=object)
+    tabela.flags.writeable = False
+    return tabela
+
+
+# textos prontos de cada grupo de milhar e de cada centavo, indexados pelo número
+_GRUPO = _tabela("{}", 1000)
+_GRUPO_3_DIGITOS = _tabela("{:03d}", 1000)
+_GRUPO_PONTO = _tabela("{}.", 1000)
+_GRUPO_3_DIGITOS_PONTO = _tabela("{:03d}.", 1000)
+_CENTAVOS = _tabela(",{:02d}", 100)
+
+
+def formatar_brl(valor: float) -> str:
+    """Moeda no padrão pt_BR sem locale: R$ 1.234,56 / - R$ 1.234,56."""
+    texto = f"{abs(valor):,.2f}".translate(_TROCA_SEPARADORES)
+    return f"- R$ {texto}" if valor < 0 else f"R$ {texto}"
+
+
+def formatar_brl_array(valores) -> np.ndarray:
+    """
+    formatar_brl para um array inteiro (array de objetos str, mesma forma).
+
+    Os centavos saem de um arredondamento só de |valor| * 100. Quando o produto
+    cai perto de ,5 centavo o arredondamento pode divergir do "%.2f" (1.115 *
+    100 = 111.50000000000001), então esses valores, os não finitos e os acima
+    de LIMITE_VETORIZADO vão para formatar_brl e o texto é sempre o mesmo.
+    """
+    valores = np.asarray(valores, dtype=float)
+    planos = valores.ravel()
+    resultado = np.empty(planos.shape, dtype=object)
+    if planos.size == 0:
+        return resultado.reshape(valores.shape)
+
+    absolutos = np.abs(planos)
+    with np.errstate(invalid="ignore"):
+        vetorizavel = np.isfinite(planos) & (absolutos < LIMITE_VETORIZADO)
+    escalados = np.where(vetorizavel, absolutos, 0.0) * 100
+    fracao = escalados - np.floor(escalados)
+    tolerancia = escalados * 1e-15 + 1e-9
+    vetorizavel &= np.abs(fracao - 0.5) > tolerancia
+
+    if vetorizavel.any():
+        centavos = np.rint(escalados[vetorizavel]).astype(np.int64)
+        inteiros = centavos // 100
+        resto = inteiros // 1000
+        grupo = inteiros % 1000
+        texto = np.where(resto > 0, _GRUPO_3_DIGITOS[grupo], _GRUPO[grupo]) + _CENTAVOS[centavos % 100]
+        # grupos de milhar da direita para a esquerda, só nos valores que ainda têm
+        while (ativos := np.flatnonzero(resto > 0)).size:
+            grupo = resto[ativos] % 1000
+            resto //= 1000
+            texto[ativos] = (
+                np.where(resto[ativos] > 0, _GRUPO_3_DIGITOS_PONTO[grupo], _GRUPO_PONTO[grupo])
+                + texto[ativos]
+            )
+        prefixo = np.where(planos[vetorizavel] < 0, "- R$ ", "R$ ").astype(object)
+        resultado[vetorizavel] = prefixo + texto
+
+    for i in np.flatnonzero(~vetorizavel):
+        resultado[i] = formatar_brl(float(planos[i]))
+
+    return resultado.reshape(valores.shape)
+
+
+def _formatar_com_locale(valor: float) -> str:
+    """Caminho antigo: currency do locale pt_BR ativo, sinal trocado para "- R$"."""
+    import locale
+
+    texto = locale.currency(abs(valor), grouping=True)
+    return f"- {texto}" if valor < 0 else texto
+
+
+def _ativar_locale_pt_br() -> str | None:
+    import locale
+
+    for nome in ("pt_BR.UTF-8", "pt_BR.utf8", "pt_BR", "Portuguese_Brazil.1252"):
+        try:
+            return locale.setlocale(locale.LC_ALL, nome)
+        except locale.Error:
+            continue
+    return None
+
+
+def _benchmark(n: int = 200_000, repeticoes: int = 3) -> None:
+    import timeit
+
+    rng = np.random.default_rng(0)
+    valores = np.round(rng.normal(0, 1e6, n), 2)
+    lista = valores.tolist()
+
+    casos = {
+        "formatar_brl (escalar, por valor)": lambda: [formatar_brl(v) for v in lista],
+        "formatar_brl_array (array inteiro)": lambda: formatar_brl_array(valores),
+    }
+    locale_ativo = _ativar_locale_pt_br()
+    if locale_ativo:
+        casos["locale.currency (por valor)"] = lambda: [_formatar_com_locale(v) for v in lista]
+        amostra = lista[:1000]
+        divergentes = sum(
+            _formatar_com_locale(v).replace("\xa0", " ") != formatar_brl(v) for v in amostra
+        )
+        print(f"locale {locale_ativo}: {divergentes} divergências em {len(amostra)} valores")
+    else:
+        print("locale pt_BR indisponível nesta máquina; comparação só entre os formatadores sem locale")
+
+    print(f"{n} valores, melhor de {repeticoes}:")
+    for nome, funcao in casos.items():
+        segundos = min(timeit.repeat(funcao, number=1, repeat=repeticoes))
+        print(f"  {nome:<38} {segundos * 1000:9.1f} ms  {n / segundos / 1e6:6.2f} M valores/s")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -1,5 +1,42 @@
+import re
+
+import numpy as np
 import pandas as pd
-import locale
+
+from src.utils.formatador_brl import formatar_brl, formatar_brl_array
+
+_RE_NAO_DIGITO = re.compile(r"\D")
+_RE_INICIO_PALAVRA = re.compile(r"(?:^|(?<= )).")
+_RE_DATA_TRES_PARTES = r"^([^/]*)/([^/]*)/([^/]*)\Z"
+
+
+def _mascarar_documento(digitos: str) -> str:
+    if len(digitos) <= 11:  # CPF (incompleto: preenche com zeros)
+        d = digitos.zfill(11)
+        return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}"
+    if len(digitos) <= 14:  # CNPJ (incompleto: preenche com zeros)
+        d = digitos.zfill(14)
+        return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+    return digitos  # Retorna os dígitos se não for possível formatar
+
+
+def _seculo(ano: str) -> str | None:
+    try:
+        n = int(ano)
+    except ValueError:
+        return None
+    return ("19" if n > 40 else "20") + ano
+
+
+def _normalizar_numero_br(texto: str) -> str:
+    # Remove pontos e converte vírgulas em pontos para valores com separador brasileiro
+    if "," in texto and "." in texto:
+        texto = texto.replace(".", "")
+    return texto.replace(",", ".")
+
+
+def _eh_coluna_texto(serie: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)
 
 
 class DocumentFormatter:
@@ -11,19 +48,27 @@ class DocumentFormatter:
             return cpf_cnpj
         cpf_cnpj = str(cpf_cnpj).strip()
         cpf_cnpj = "".join(filter(str.isdigit, cpf_cnpj))  # Mantém apenas números
+        return _mascarar_documento(cpf_cnpj)
+
+    def format_documents_series(documentos: pd.Series) -> pd.Series:
+        """format_documents para a coluna inteira, com operações .str."""
+        digitos = documentos.astype(str).str.replace(_RE_NAO_DIGITO, "", regex=True)
+        tamanho = digitos.str.len()
 
-        if len(cpf_cnpj) == 14:  # CNPJ
-            return f"{cpf_cnpj[:2]}.{cpf_cnpj[2:5]}.{cpf_cnpj[5:8]}/{cpf_cnpj[8:12]}-{cpf_cnpj[12:]}"
-        elif len(cpf_cnpj) == 11:  # CPF
-            return f"{cpf_cnpj[:3]}.{cpf_cnpj[3:6]}.{cpf_cnpj[6:9]}-{cpf_cnpj[9:]}"
-        elif len(cpf_cnpj) < 11:  # CPF incompleto, preencher com zeros
-            cpf_cnpj = cpf_cnpj.zfill(11)
-            return f"{cpf_cnpj[:3]}.{cpf_cnpj[3:6]}.{cpf_cnpj[6:9]}-{cpf_cnpj[9:]}"
-        elif len(cpf_cnpj) < 14:  # CNPJ incompleto, preencher com zeros
-            cpf_cnpj = cpf_cnpj.zfill(14)
-            return f"{cpf_cnpj[:2]}.{cpf_cnpj[2:5]}.{cpf_cnpj[5:8]}/{cpf_cnpj[8:12]}-{cpf_cnpj[12:]}"
+        cpf = digitos.str.zfill(11)
+        cpf = cpf.str[:3] + "." + cpf.str[3:6] + "." + cpf.str[6:9] + "-" + cpf.str[9:]
+        cnpj = digitos.str.zfill(14)
+        cnpj = (
+            cnpj.str[:2] + "." + cnpj.str[2:5] + "." + cnpj.str[5:8]
+            + "/" + cnpj.str[8:12] + "-" + cnpj.str[12:]
+        )
 
-        return cpf_cnpj  # Retorna o valor original se não for possível formatar
+        formatado = pd.Series(
+            np.select([tamanho <= 11, tamanho <= 14], [cpf, cnpj], default=digitos),
+            index=documentos.index,
+            dtype=object,
+        )
+        return formatado.where(documentos.notna(), documentos)
 
     def format_date_columns(df: pd.DataFrame, date_columns: list[str]):
         for col in date_columns:
@@ -41,45 +86,68 @@ class DocumentFormatter:
         return df
 
     def format_values(amount, format_as_currency=False):
-
+        """
+        Converte valores no padrão brasileiro para float ou, com
+        format_as_currency=True, para texto "R$ 1.234,56". Não usa locale.
+        """
         if pd.isnull(amount):
             return amount
-        amount = str(amount)
+
+        amount = _normalizar_numero_br(str(amount))
         try:
-            # Configura o locale para o Brasil
-            locale.setlocale(locale.LC_ALL, "pt_BR.UTF-8")
-
-            # Remove pontos e converte vírgulas em pontos para valores com separador brasileiro
-            if "," in amount and "." in amount:
-                amount = amount.replace(".", "").replace(",", ".")
-            elif "," in amount:
-                amount = amount.replace(",", ".")
-
-            # Converte para float
-            try:
-                amount_as_float = float(amount)
-            except ValueError:
-                raise ValueError(f"Não foi possível converter o valor: {amount}")
-
-            # Formata o número no padrão monetário brasileiro
-            formatted_value = locale.currency(
-                abs(amount_as_float), grouping=True, symbol=True
-            )
-
-            # Adiciona o sinal negativo para números negativos
-            if amount_as_float < 0:
-                formatted_value = formatted_value.replace("R$", "- R$")
-
-            return formatted_value if format_as_currency else amount_as_float
-        except Exception as e:
-            # print(f"Erro ao formatar o valor '{valor}': {e}")
-            return amount.round(2) if isinstance(amount, (int, float)) else amount
+            amount_as_float = float(amount)
+        except ValueError:
+            return amount
+
+        return formatar_brl(amount_as_float) if format_as_currency else amount_as_float
+
+    def format_values_series(valores: pd.Series, format_as_currency=False) -> pd.Series:
+        """format_values para a coluna inteira; só o que o to_numeric recusa passa por float()."""
+        nulos = valores.isna()
+        texto = valores.astype(str)
+        ambos = texto.str.contains(",", regex=False) & texto.str.contains(".", regex=False)
+        texto = texto.where(~ambos, texto.str.replace(".", "", regex=False))
+        texto = texto.str.replace(",", ".", regex=False)
+
+        numeros = pd.to_numeric(texto, errors="coerce")
+        convertido = numeros.notna()
+
+        recusados = (~convertido & ~nulos).to_numpy()
+        if recusados.any():
+            numeros = numeros.astype(object)
+            for i in np.flatnonzero(recusados):
+                try:
+                    numeros.iat[i] = float(texto.iat[i])
+                    convertido.iat[i] = True
+                except ValueError:
+                    pass
+
+        if format_as_currency:
+            formatados = formatar_brl_array(numeros.to_numpy(dtype=float, na_value=np.nan))
+        else:
+            formatados = numeros
+
+        resultado = pd.Series(
+            np.where(convertido, formatados.astype(object), texto.astype(object)),
+            index=valores.index,
+            dtype=object,
+        )
+        return resultado.where(~nulos, valores).infer_objects()
 
     def to_pascal_case(text_input: str) -> str:
         if pd.isnull(text_input):
             return text_input
         return " ".join(word.capitalize() for word in text_input.split(" "))
 
+    def to_pascal_case_series(textos: pd.Series) -> pd.Series:
+        """to_pascal_case para a coluna inteira; valores que não são texto ficam como estão."""
+        if not _eh_coluna_texto(textos):
+            return textos.copy()
+        pascal = textos.str.lower().str.replace(
+            _RE_INICIO_PALAVRA, lambda m: m.group(0).title(), regex=True
+        )
+        return pascal.where(pascal.notna(), textos)
+
     def correct_year(data):
         if pd.isnull(data):
             return data
@@ -88,11 +156,26 @@ class DocumentFormatter:
             if len(partes) == 3:
                 dia, mes, ano = partes
                 if len(ano) == 2:
-                    if int(ano) > 40:
-                        ano_corrigido = "19" + ano
-                    else:
-                        ano_corrigido = "20" + ano
-                    return f"{dia}/{mes}/{ano_corrigido}"
+                    ano_corrigido = _seculo(ano)
+                    if ano_corrigido is not None:
+                        return f"{dia}/{mes}/{ano_corrigido}"
             return data
         except Exception:
             return data
+
+    def correct_year_series(datas: pd.Series) -> pd.Series:
+        """
+        correct_year para a coluna inteira: dd/mm/aa vira dd/mm/aaaa (ano > 40 no
+        século 1900). A conversão do ano é feita uma vez por ano distinto.
+        """
+        if not _eh_coluna_texto(datas):
+            return datas.copy()
+        partes = datas.str.extract(_RE_DATA_TRES_PARTES)
+        ano = partes[2]
+        dois_digitos = ano.str.len() == 2
+
+        seculos = {a: _seculo(a) for a in ano[dois_digitos].unique()}
+        ano_corrigido = ano.where(dois_digitos).map(seculos)
+
+        corrigida = partes[0] + "/" + partes[1] + "/" + ano_corrigido
+        return corrigida.where(corrigida.notna(), datas)
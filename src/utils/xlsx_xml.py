@@ -0,0 +1,99 @@
+"""
+Leitura das partes de um .xlsx direto do XML do zip (lxml), com os mesmos
+valores que o openpyxl devolve. Compartilhado pelos fast paths de
+src/anexo_c (check_excel_data e batch_atualiza_conta_nome).
+"""
+
+from __future__ import annotations
+
+import zipfile
+
+from lxml import etree
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+TAG_SI = f"{{{NS_MAIN}}}si"
+TAG_ROW = f"{{{NS_MAIN}}}row"
+TAG_C = f"{{{NS_MAIN}}}c"
+TAG_V = f"{{{NS_MAIN}}}v"
+TAG_T = f"{{{NS_MAIN}}}t"
+TAG_R = f"{{{NS_MAIN}}}r"
+TAG_IS = f"{{{NS_MAIN}}}is"
+
+
+class XmlFastPathUnsupported(Exception):
+    """Estrutura que o fast path não trata: o arquivo vai para o openpyxl."""
+
+
+def rich_text(elem) -> str:
+    # mesmo conteúdo do openpyxl (Text.content): <t> direto + <r><t>, sem <rPh>
+    partes = [elem.findtext(TAG_T)] + [r.findtext(TAG_T) for r in elem.iterfind(TAG_R)]
+    return "".join(p for p in partes if p is not None)
+
+
+def xlsx_parts(archive: zipfile.ZipFile) -> tuple[list[tuple[str, str]], str | None]:
+    """(título, parte XML) das worksheets na ordem do workbook e a parte do sharedStrings."""
+    rels = etree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    alvos = {}
+    shared = None
+    for rel in rels.iterfind(f"{{{NS_PKG_REL}}}Relationship"):
+        alvo = rel.get("Target")
+        alvo = alvo.lstrip("/") if alvo.startswith("/") else f"xl/{alvo}"
+        tipo = rel.get("Type", "")
+        if tipo.endswith("/worksheet"):
+            alvos[rel.get("Id")] = alvo
+        elif tipo.endswith("/sharedStrings"):
+            shared = alvo
+
+    wb = etree.fromstring(archive.read("xl/workbook.xml"))
+    sheets = [
+        (sh.get("name"), alvos[sh.get(f"{{{NS_REL}}}id")])
+        for sh in wb.iterfind(f"{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet")
+        if sh.get(f"{{{NS_REL}}}id") in alvos  # chartsheets ficam de fora, como em wb.worksheets
+    ]
+    return sheets, shared
+
+
+def workbook_epoch(archive: zipfile.ZipFile):
+    wb = etree.fromstring(archive.read("xl/workbook.xml"))
+    pr = wb.find(f"{{{NS_MAIN}}}workbookPr")
+    date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+    return CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+
+
+def date_style_ids(archive: zipfile.ZipFile) -> tuple[set[int], set[int]]:
+    """Índices de cellXfs com formato de data/duração (mesma regra do Stylesheet do openpyxl)."""
+    try:
+        styles = etree.fromstring(archive.read("xl/styles.xml"))
+    except KeyError:
+        return set(), set()
+    custom = {
+        int(nf.get("numFmtId")): nf.get("formatCode")
+        for nf in styles.iterfind(f"{{{NS_MAIN}}}numFmts/{{{NS_MAIN}}}numFmt")
+    }
+    datas, duracoes = set(), set()
+    for idx, xf in enumerate(styles.iterfind(f"{{{NS_MAIN}}}cellXfs/{{{NS_MAIN}}}xf")):
+        num_fmt_id = int(xf.get("numFmtId", 0))
+        fmt = custom.get(num_fmt_id) or builtin_format_code(num_fmt_id)
+        if fmt is None:
+            continue
+        if is_date_format(fmt):
+            datas.add(idx)
+        if is_timedelta_format(fmt):
+            duracoes.add(idx)
+    return datas, duracoes
+
+
+def read_shared_strings(archive: zipfile.ZipFile, parte: str | None) -> list[str]:
+    if parte is None:
+        return []
+    strings = []
+    with archive.open(parte) as f:
+        for _, si in etree.iterparse(f, tag=TAG_SI):
+            strings.append(rich_text(si).replace("x005F_", ""))
+            si.clear()
+    return strings
@@ -0,0 +1,202 @@
+from datetime import datetime
+import re
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+import zipfile
+
+import pandas as pd
+import xlsxwriter
+from openpyxl import Workbook, load_workbook
+
+from src.anexo_c import batch_atualiza_conta_nome
+from src.anexo_c.batch_atualiza_conta_nome import (
+    atualizar_um_arquivo,
+    atualizar_um_arquivo_xml,
+    carregar_mapa_depara,
+    processar_pasta,
+)
+from src.utils.xlsx_xml import XmlFastPathUnsupported
+
+LINHAS = [
+    [datetime(2024, 1, 31), 1.5, "1.1 - Nome Antigo", "a"],
+    [datetime(2024, 2, 29), 2, "1.2-Outro", "b"],
+    [None, 3, "  1.1   -  Nome Novo ", None],
+    [None, 4, "1.3 - Certo", "já correto"],
+    [None, 5, "9.9 - Sem de-para", None],
+    [None, 6, "", "vazio"],
+    [None, 7, None, "sem célula"],
+    [None, 8, 123, "numérico"],
+    [None, 9, "1.1 - Nome Antigo", "repetido"],
+]
+
+
+def _escrever_depara(path: Path) -> None:
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(
+            {"Conta": ["1.1", "1.2", "1.3", "123"], "Nome": ["Nome Novo", "Nome & <Cia>", "Certo", "Cento"]}
+        ).to_excel(writer, sheet_name="NomeConta", index=False)
+
+
+def _escrever_openpyxl(path: Path) -> None:
+    # openpyxl grava strings inline
+    wb = Workbook()
+    wb.active.title = "Resumo"
+    wb.active.append(["1.1 - Nome Antigo", "fora da aba Dados"])
+    ws = wb.create_sheet("Dados")
+    ws.append(["Data", "Valor", "Conta_Nome", "Obs"])
+    for linha in LINHAS:
+        ws.append(linha)
+    wb.save(path)
+
+
+def _escrever_xlsxwriter(path: Path) -> None:
+    # xlsxwriter grava sharedStrings, como o Excel
+    book = xlsxwriter.Workbook(str(path))
+    book.add_worksheet("Resumo").write_row(0, 0, ["1.1 - Nome Antigo", "fora da aba Dados"])
+    sheet = book.add_worksheet("Dados")
+    data = book.add_format({"num_format": "dd/mm/yyyy"})
+    negrito = book.add_format({"bold": True})
+    sheet.write_row(0, 0, ["Data", "Valor", "Conta_Nome", "Obs"], negrito)
+    for i, linha in enumerate(LINHAS, start=1):
+        for j, v in enumerate(linha):
+            if isinstance(v, datetime):
+                sheet.write_datetime(i, j, v, data)
+            elif v is not None:
+                sheet.write(i, j, v, negrito if j == 2 else None)
+    book.close()
+
+
+def _valores(path: Path) -> dict:
+    wb = load_workbook(path)
+    return {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+class AtualizaContaNomeTestCase(unittest.TestCase):
+    def test_fast_path_xml_igual_ao_openpyxl(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            _escrever_depara(tmp / "depara.xlsx")
+            mapa = carregar_mapa_depara(tmp / "depara.xlsx")
+
+            for escrever in [_escrever_openpyxl, _escrever_xlsxwriter]:
+                origem = tmp / f"{escrever.__name__}.xlsx"
+                escrever(origem)
+                destino = tmp / "xml" / origem.name
+
+                contagem = atualizar_um_arquivo_xml(origem, destino, mapa)
+                total, alteradas, wb = atualizar_um_arquivo(origem, mapa)
+                esperado = tmp / "openpyxl" / origem.name
+                esperado.parent.mkdir(exist_ok=True)
+                wb.save(esperado)
+
+                self.assertEqual(contagem, (total, alteradas))
+                self.assertEqual(contagem, (7, 5))
+                valores = _valores(destino)
+                self.assertEqual(valores, _valores(esperado), origem.name)
+                self.assertEqual(
+                    [r[2] for r in valores["Dados"]],
+                    ["Conta_Nome", "1.1 - Nome Novo", "1.2 - Nome & <Cia>", "1.1 - Nome Novo",
+                     "1.3 - Certo", "9.9 - Sem de-para", None, None, "123 - Cento", "1.1 - Nome Novo"],
+                )
+
+                # só a aba Dados, o sharedStrings e o calcPr mudam; o resto do pacote é o mesmo
+                with zipfile.ZipFile(origem) as a, zipfile.ZipFile(destino) as b:
+                    self.assertEqual(a.namelist(), b.namelist())
+                    mudaram = {n for n in a.namelist() if a.read(n) != b.read(n)}
+                    workbook_xml = b.read("xl/workbook.xml")
+                self.assertLessEqual(
+                    mudaram, {"xl/worksheets/sheet2.xml", "xl/sharedStrings.xml", "xl/workbook.xml"}
+                )
+                self.assertIn("xl/worksheets/sheet2.xml", mudaram)
+                self.assertEqual(workbook_xml.count(b"<calcPr"), 1)
+                self.assertRegex(workbook_xml, rb'<calcPr\b[^>]*fullCalcOnLoad="1"')
+
+                # estilo da célula preservado
+                self.assertEqual(load_workbook(destino)["Dados"]["C2"].font.b, escrever is _escrever_xlsxwriter)
+
+    def test_sem_alteracao_nao_grava_e_formula_cai_no_openpyxl(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            entrada = tmp / "entrada"
+            entrada.mkdir()
+            _escrever_depara(tmp / "depara.xlsx")
+            mapa = carregar_mapa_depara(tmp / "depara.xlsx")
+
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "Dados"
+            ws.append(["Conta_Nome"])
+            ws.append(["1.3 - Certo"])
+            wb.save(entrada / "inalterado.xlsx")
+            self.assertEqual(atualizar_um_arquivo_xml(entrada / "inalterado.xlsx", tmp / "x.xlsx", mapa), (1, 0))
+            self.assertFalse((tmp / "x.xlsx").exists())
+
+            ws.append(["=\"1.1 - \"&\"Antigo\""])
+            ws.append(["1.1 - Antigo"])
+            wb.save(entrada / "formula.xlsx")
+            with self.assertRaises(XmlFastPathUnsupported):
+                atualizar_um_arquivo_xml(entrada / "formula.xlsx", tmp / "x.xlsx", mapa)
+            with self.assertRaises(ValueError):
+                atualizar_um_arquivo_xml(entrada / "inalterado.xlsx", tmp / "x.xlsx", mapa, sheet_dados="Outra")
+
+            processar_pasta(entrada, tmp / "depara.xlsx", tmp / "saida")
+            self.assertEqual(sorted(p.name for p in (tmp / "saida").iterdir()), ["formula.xlsx"])
+            self.assertEqual(
+                [r[0] for r in _valores(tmp / "saida" / "formula.xlsx")["Dados"]],
+                ["Conta_Nome", "1.3 - Certo", "=\"1.1 - \"&\"Antigo\"", "1.1 - Nome Novo"],
+            )
+
+    def test_caractere_invalido_no_de_para_nao_gera_xml_quebrado(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            entrada = tmp / "entrada"
+            entrada.mkdir()
+            _escrever_openpyxl(entrada / "a.xlsx")
+            mapa = {"1.1": "Nome\x0bNovo"}
+
+            with self.assertRaises(XmlFastPathUnsupported):
+                atualizar_um_arquivo_xml(entrada / "a.xlsx", tmp / "saida" / "a.xlsx", mapa)
+            self.assertFalse((tmp / "saida").exists())
+
+            # pelo openpyxl o erro é o mesmo de antes e nada é gravado
+            with patch.object(batch_atualiza_conta_nome, "carregar_mapa_depara", return_value=mapa):
+                processar_pasta(entrada, tmp / "depara.xlsx", tmp / "saida")
+            self.assertEqual(list((tmp / "saida").iterdir()), [])
+
+    def test_falha_na_gravacao_nao_deixa_tmp(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            _escrever_openpyxl(tmp / "a.xlsx")
+            saida = tmp / "saida"
+
+            with patch.object(batch_atualiza_conta_nome.shutil, "copyfileobj", side_effect=OSError("disco cheio")):
+                with self.assertRaises(OSError):
+                    atualizar_um_arquivo_xml(tmp / "a.xlsx", saida / "a.xlsx", {"1.1": "Nome Novo"})
+            self.assertEqual(list(saida.iterdir()), [])
+
+    def test_liga_recalculo_ao_abrir(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            gerado = tmp / "gerado.xlsx"
+            _escrever_xlsxwriter(gerado)
+
+            # calcPr como o Excel grava, sem fullCalcOnLoad
+            origem = tmp / "excel.xlsx"
+            with zipfile.ZipFile(gerado) as zin, zipfile.ZipFile(origem, "w") as zout:
+                for info in zin.infolist():
+                    dados = zin.read(info)
+                    if info.filename == "xl/workbook.xml":
+                        dados = re.sub(rb"<calcPr\b[^>]*/>", b'<calcPr calcId="191029"/>', dados)
+                    zout.writestr(info, dados)
+            with zipfile.ZipFile(origem) as z:
+                self.assertNotIn(b"fullCalcOnLoad", z.read("xl/workbook.xml"))
+
+            atualizar_um_arquivo_xml(origem, tmp / "saida.xlsx", {"1.1": "Nome Novo"})
+            with zipfile.ZipFile(tmp / "saida.xlsx") as z:
+                self.assertIn(b'<calcPr calcId="191029" fullCalcOnLoad="1"/>', z.read("xl/workbook.xml"))
+
+
+if __name__ == "__main__":
+    unittest.main()
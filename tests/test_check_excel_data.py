@@ -0,0 +1,430 @@
+from datetime import datetime
+import io
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+import xlsxwriter
+from openpyxl import Workbook
+
+from src.anexo_c import check_excel_data
+from src.anexo_c.check_excel_data import (
+    TAG_ROW,
+    TARGET_TEXT,
+    _candidate_rows,
+    _indices_pattern,
+    main,
+    process_one_file,
+    process_one_file_multi,
+    process_one_file_openpyxl,
+    process_one_file_xml,
+)
+
+
+def _escrever_workbooks(pasta: Path) -> list[Path]:
+    caminhos = []
+
+    # alvo na segunda aba, com variação de caixa/acentos/espaços; último valor é data
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Resumo"
+    ws.append(["x", "Diferença na Base", 1, 2])
+    ws2 = wb.create_sheet("Quadro")
+    ws2.append(["Ref.", "Descrição", "Valor"])
+    ws2.append([None, "Outra linha", 10.5])
+    ws2.append([None, "  DIFERENCA na   base de cálculo entre IR e CS ", 3, datetime(2024, 1, 31), None, ""])
+    ws2.append([None, TARGET_TEXT, 999])
+    caminhos.append(pasta / "com_data.xlsx")
+    wb.save(caminhos[-1])
+
+    # alvo com último valor numérico e inteiro, alvo fora da coluna B ignorado
+    wb = Workbook()
+    ws = wb.active
+    ws.append([TARGET_TEXT, "nada", 1])
+    ws.append(["a", TARGET_TEXT, 12, 1234.56, "texto final"])
+    caminhos.append(pasta / "com_texto.xlsx")
+    wb.save(caminhos[-1])
+
+    wb = Workbook()
+    wb.active.append(["a", "b", 1])
+    caminhos.append(pasta / "sem_alvo.xlsx")
+    wb.save(caminhos[-1])
+
+    # resultado de fórmula em texto (t="str"), fora do sharedStrings
+    caminho = pasta / "formula.xlsx"
+    book = xlsxwriter.Workbook(str(caminho))
+    sheet = book.add_worksheet("F")
+    sheet.write_formula("B3", '="Diferença na Base de Cálculo entre IR e CS"', None, TARGET_TEXT)
+    sheet.write_number("D3", -42)
+    book.close()
+    caminhos.append(caminho)
+
+    # sharedStrings (como nos arquivos salvos pelo Excel) e datas no calendário 1904
+    caminho = pasta / "shared_1904.xlsx"
+    book = xlsxwriter.Workbook(str(caminho), {"date_1904": True})
+    sheet = book.add_worksheet("Vazia")
+    sheet.write_string("B1", "Diferença na Base de Cálculo entre IR")
+    sheet = book.add_worksheet("Dados")
+    data = book.add_format({"num_format": "dd/mm/yyyy"})
+    sheet.write_string("A1", TARGET_TEXT)
+    sheet.write_string("B2", "diferença na base de cálculo entre ir e cs")
+    sheet.write_number("C2", 7.25)
+    sheet.write_datetime("E2", datetime(2023, 12, 1), data)
+    book.close()
+    caminhos.append(caminho)
+
+    caminhos.append(pasta / "corrompido.xlsx")
+    caminhos[-1].write_bytes(b"isto nao e um zip")
+    return caminhos
+
+
+class CheckExcelDataTestCase(unittest.TestCase):
+    def test_fast_path_xml_igual_ao_openpyxl(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            caminhos = _escrever_workbooks(Path(tmp_dir))
+            resultados = {p.name: process_one_file(p) for p in caminhos}
+
+            for p in caminhos:
+                self.assertEqual(resultados[p.name], process_one_file_openpyxl(p), p.name)
+
+            self.assertEqual(resultados["com_data.xlsx"]["aba"], "Quadro")
+            self.assertEqual(resultados["com_data.xlsx"]["valor_ultimo_na_linha"], datetime(2024, 1, 31))
+            self.assertEqual(resultados["com_texto.xlsx"]["valor_ultimo_na_linha"], "texto final")
+            self.assertEqual(resultados["sem_alvo.xlsx"]["status"], "nao_encontrado")
+            self.assertEqual(resultados["formula.xlsx"]["valor_ultimo_na_linha"], -42)
+            self.assertEqual(resultados["shared_1904.xlsx"]["aba"], "Dados")
+            self.assertEqual(resultados["shared_1904.xlsx"]["valor_ultimo_na_linha"], datetime(2023, 12, 1))
+            self.assertTrue(resultados["corrompido.xlsx"]["status"].startswith("erro: BadZipFile"))
+
+            # o fast path trata todos os válidos sozinho, sem cair no openpyxl
+            for p in caminhos[:-1]:
+                self.assertEqual(process_one_file_xml(p), resultados[p.name], p.name)
+                # aba lida em blocos menores que uma linha
+                with patch.object(check_excel_data, "TAMANHO_BLOCO_XML", 50):
+                    self.assertEqual(process_one_file_xml(p), resultados[p.name], p.name)
+            with self.assertRaises(Exception):
+                process_one_file_xml(caminhos[-1])
+
+    def test_recorte_de_linhas_com_namespaces_do_excel(self) -> None:
+        ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+        dados = (
+            f'<?xml version="1.0"?><worksheet xmlns="{ns}" '
+            'xmlns:x14ac="http://schemas.microsoft.com/office/spreadsheetml/2009/9/ac">'
+            '<sheetData><row r="1" x14ac:dyDescent="0.25"><c r="B1" t="s"><v>3</v></c></row>'
+            '<row r="2"/><row r="3" x14ac:dyDescent="0.25"><c r="B3" t="s"><v>7</v></c>'
+            '<c r="C3"><v>7</v></c></row><rowBreaks count="0"/></sheetData></worksheet>'
+        ).encode()
+
+        # blocos pequenos: as linhas atravessam o limite entre blocos
+        for tamanho in [7, 64, check_excel_data.TAMANHO_BLOCO_XML]:
+            with self.subTest(tamanho=tamanho), patch.object(check_excel_data, "TAMANHO_BLOCO_XML", tamanho):
+                if tamanho == 7:
+                    # a tag raiz precisa começar no primeiro bloco
+                    self.assertIsNone(_candidate_rows(io.BytesIO(dados), _indices_pattern(["7"])))
+                    continue
+                linhas = list(_candidate_rows(io.BytesIO(dados), _indices_pattern(["3", "7"])))
+                self.assertEqual([(r.tag, r.get("r")) for r in linhas], [(TAG_ROW, "1"), (TAG_ROW, "3")])
+        linhas = list(_candidate_rows(io.BytesIO(dados), _indices_pattern(["7"])))
+        self.assertEqual([(r.tag, r.get("r")) for r in linhas], [(TAG_ROW, "3")])
+        self.assertIsNone(
+            _candidate_rows(io.BytesIO(dados.replace(b"<worksheet", b"<x:worksheet")), _indices_pattern(["7"]))
+        )
+
+    def test_sem_fast_path_usa_openpyxl(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            caminhos = _escrever_workbooks(Path(tmp_dir))
+            original = check_excel_data.USE_XML_FAST_PATH
+            check_excel_data.USE_XML_FAST_PATH = False
+            try:
+                self.assertEqual(process_one_file(caminhos[1]), process_one_file_openpyxl(caminhos[1]))
+            finally:
+                check_excel_data.USE_XML_FAST_PATH = original
+
+    def test_multi_alvo_uma_linha_por_aba(self) -> None:
+        alvos = ["Diferença na Base", TARGET_TEXT, "Outra linha"]
+        with TemporaryDirectory() as tmp_dir:
+            caminhos = {p.name: p for p in _escrever_workbooks(Path(tmp_dir))}
+
+            linhas = process_one_file_multi(caminhos["com_data.xlsx"], alvos)
+            self.assertEqual([l["aba"] for l in linhas], ["Resumo", "Quadro"])
+            self.assertEqual(linhas[0]["Diferença na Base"], 2)
+            self.assertIsNone(linhas[0][TARGET_TEXT])
+            # primeira linha do rótulo na aba; a repetição com 999 é ignorada
+            self.assertEqual(linhas[1][TARGET_TEXT], datetime(2024, 1, 31))
+            self.assertEqual(linhas[1]["Outra linha"], 10.5)
+
+            for p in caminhos.values():
+                with patch.object(check_excel_data, "USE_XML_FAST_PATH", False):
+                    esperado = process_one_file_multi(p, alvos)
+                self.assertEqual(process_one_file_multi(p, alvos), esperado, p.name)
+
+            sem = process_one_file_multi(caminhos["sem_alvo.xlsx"], alvos)
+            self.assertEqual(len(sem), 1)
+            self.assertEqual(sem[0]["status"], "nao_encontrado")
+            self.assertTrue(process_one_file_multi(caminhos["corrompido.xlsx"], alvos)[0]["status"].startswith("erro: BadZipFile"))
+
+    def test_main_multi_alvo_retoma_do_checkpoint(self) -> None:
+        alvos = [TARGET_TEXT, "Outra linha"]
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            dados.mkdir()
+            _escrever_workbooks(dados)
+            config = {
+                "DATA_DIR": dados,
+                "CHECKPOINT_MULTI_PATH": tmp / "ck.csv",
+                "CHECKPOINT_MULTI_DB_PATH": tmp / "ck.sqlite",
+                "RESULT_MULTI_PATH": tmp / "res.csv",
+                "USE_PARALLEL": False,
+            }
+            with patch.multiple(check_excel_data, **config):
+                main(alvos)
+                primeira = pd.read_csv(tmp / "res.csv", encoding="utf-8-sig")
+                with patch.object(check_excel_data, "process_one_file_multi", side_effect=AssertionError):
+                    main(alvos)
+                with self.assertRaises(ValueError):
+                    main(["Só um rótulo"])
+
+            # rótulos que colidem entre si ou com as colunas fixas, num checkpoint novo
+            for i, invalidos in enumerate(
+                [[TARGET_TEXT, f" {TARGET_TEXT.upper()} "], ["Outra", "status"], ["Aba"]]
+            ):
+                config_nova = {**config, "CHECKPOINT_MULTI_PATH": tmp / f"ck{i}.csv",
+                               "CHECKPOINT_MULTI_DB_PATH": tmp / f"ck{i}.sqlite"}
+                with self.subTest(invalidos=invalidos), patch.multiple(check_excel_data, **config_nova):
+                    with self.assertRaises(ValueError):
+                        main(invalidos)
+                    self.assertFalse((tmp / f"ck{i}.sqlite").exists())
+
+            self.assertEqual(list(primeira.columns), ["arquivo", "aba", *alvos, "status"])
+            self.assertEqual(len(primeira), 6)  # uma linha por arquivo: só uma aba com alvo em cada
+            pd.testing.assert_frame_equal(primeira, pd.read_csv(tmp / "res.csv", encoding="utf-8-sig"))
+
+    def test_main_paralelo_em_lotes_igual_ao_sequencial(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            dados.mkdir()
+            _escrever_workbooks(dados)
+
+            resultados = {}
+            for modo, paralelo in [("seq", False), ("par", True)]:
+                config = {
+                    "DATA_DIR": dados,
+                    "CHECKPOINT_PATH": tmp / f"ck_{modo}.csv",
+                    "CHECKPOINT_DB_PATH": tmp / f"ck_{modo}.sqlite",
+                    "RESULT_PATH": tmp / f"res_{modo}.csv",
+                    "USE_PARALLEL": paralelo,
+                    "MAX_WORKERS": 2,
+                    "FILES_PER_TASK": 2,
+                    "TASKS_IN_FLIGHT_PER_WORKER": 1,
+                    "CHECKPOINT_FLUSH_EVERY": 3,
+                }
+                with patch.multiple(check_excel_data, **config):
+                    main()
+                resultados[modo] = (
+                    pd.read_csv(tmp / f"res_{modo}.csv", encoding="utf-8-sig")
+                    .sort_values("arquivo", ignore_index=True)
+                )
+
+            self.assertEqual(len(resultados["par"]), 6)
+            pd.testing.assert_frame_equal(resultados["seq"], resultados["par"])
+
+    def test_checkpoint_sqlite_importa_csv_antigo_e_retoma(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            dados.mkdir()
+            _escrever_workbooks(dados)
+            config = {
+                "DATA_DIR": dados,
+                "CHECKPOINT_PATH": tmp / "checkpoint.csv",
+                "CHECKPOINT_DB_PATH": tmp / "checkpoint.sqlite",
+                "RESULT_PATH": tmp / "resultado.csv",
+                "USE_PARALLEL": False,
+            }
+            with patch.multiple(check_excel_data, **config):
+                with patch.object(check_excel_data, "CHECKPOINT_BACKEND", "csv"):
+                    main()
+                pelo_csv = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+
+                # o banco novo importa o checkpoint.csv: nada é reprocessado
+                with patch.object(check_excel_data, "process_one_file", side_effect=AssertionError):
+                    main()
+                pelo_sqlite = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+
+                (dados / "com_data.xlsx").rename(dados / "novo.xlsx")
+                main()
+                depois = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+
+            pd.testing.assert_frame_equal(pelo_csv, pelo_sqlite)
+            # renomear = um arquivo novo e um removido, que sai do resultado
+            self.assertEqual(len(depois), 6)
+            self.assertNotIn("com_data.xlsx", depois["arquivo"].tolist())
+            self.assertEqual(depois.iloc[-1]["arquivo"], "novo.xlsx")
+            self.assertEqual(depois.iloc[-1]["status"], "ok")
+
+    def test_retomada_pela_identidade_do_arquivo(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            for sub in ["a", "b"]:
+                (dados / sub).mkdir(parents=True)
+                _escrever_workbooks(dados / sub)
+            config = {
+                "DATA_DIR": dados,
+                "CHECKPOINT_PATH": tmp / "checkpoint.csv",
+                "CHECKPOINT_DB_PATH": tmp / "checkpoint.sqlite",
+                "RESULT_PATH": tmp / "resultado.csv",
+                "USE_PARALLEL": False,
+                "SCAN_RECURSIVE": True,
+                "HASH_CONTENT": True,
+            }
+            with patch.multiple(check_excel_data, **config):
+                main()
+                # mesmo nome em pastas diferentes não colide
+                self.assertEqual(len(pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")), 12)
+
+                # regerado com outro conteúdo, tocado sem mudar e removido
+                wb = Workbook()
+                wb.active.append(["a", TARGET_TEXT, "novo valor"])
+                wb.save(dados / "a" / "com_texto.xlsx")
+                tocado = dados / "b" / "com_texto.xlsx"
+                os.utime(tocado, ns=(tocado.stat().st_atime_ns, tocado.stat().st_mtime_ns + 10**9))
+                (dados / "b" / "sem_alvo.xlsx").unlink()
+
+                vistos = []
+                original = check_excel_data.process_one_file
+
+                def registrar(p):
+                    vistos.append(p.relative_to(dados).as_posix())
+                    return original(p)
+
+                with patch.object(check_excel_data, "process_one_file", side_effect=registrar):
+                    main()
+                depois = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+                self.assertEqual(vistos, ["a/com_texto.xlsx"])
+
+                with patch.object(check_excel_data, "process_one_file", side_effect=AssertionError):
+                    main()
+
+                # o checkpoint CSV só conhece o nome: recusa subpastas e hash
+                with patch.object(check_excel_data, "CHECKPOINT_BACKEND", "csv"):
+                    with self.assertRaises(ValueError):
+                        main()
+            self.assertFalse((tmp / "checkpoint.csv").exists())
+
+            self.assertEqual(len(depois), 11)
+            self.assertEqual(depois["valor_ultimo_na_linha"].tolist().count("novo valor"), 1)
+            self.assertEqual(depois["valor_ultimo_na_linha"].tolist().count("texto final"), 1)
+
+            with sqlite3.connect(tmp / "checkpoint.sqlite") as conn:
+                estados = dict(conn.execute(
+                    "SELECT caminho, estado FROM checkpoint WHERE caminho LIKE '%sem_alvo.xlsx'"
+                ).fetchall())
+                substituidos = conn.execute(
+                    "SELECT COUNT(*) FROM checkpoint WHERE estado = 'substituido'"
+                ).fetchone()[0]
+            self.assertEqual(estados, {"a/sem_alvo.xlsx": "atual", "b/sem_alvo.xlsx": "removido"})
+            self.assertEqual(substituidos, 1)
+
+    def test_arquivo_que_some_durante_a_execucao_vira_erro(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            dados.mkdir()
+            _escrever_workbooks(dados)
+            config = {
+                "DATA_DIR": dados,
+                "CHECKPOINT_PATH": tmp / "checkpoint.csv",
+                "CHECKPOINT_DB_PATH": tmp / "checkpoint.sqlite",
+                "RESULT_PATH": tmp / "resultado.csv",
+                "USE_PARALLEL": False,
+                "HASH_CONTENT": True,
+                "CHECKPOINT_FLUSH_EVERY": 100,
+            }
+            original = check_excel_data.process_one_file
+
+            def apagar_o_ultimo(p):
+                # depois do pending(), antes do worker chegar nele
+                (dados / "shared_1904.xlsx").unlink(missing_ok=True)
+                return original(p)
+
+            with patch.multiple(check_excel_data, **config):
+                with patch.object(check_excel_data, "process_one_file", side_effect=apagar_o_ultimo):
+                    main()
+                resultado = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+
+                # na execução seguinte o arquivo apagado passa a removido
+                main()
+                depois = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+
+            self.assertEqual(len(resultado), 6)
+            status = dict(zip(resultado["arquivo"], resultado["status"]))
+            self.assertTrue(status["shared_1904.xlsx"].startswith("erro: FileNotFoundError"))
+            self.assertEqual(sorted(depois["arquivo"]), sorted(set(status) - {"shared_1904.xlsx"}))
+
+            # apagado entre a listagem e o pending(): fica fora e vira removido
+            pending = check_excel_data.SqliteCheckpointStore.pending
+
+            def apagar_antes(store, files, *args, **kwargs):
+                (dados / "sem_alvo.xlsx").unlink()
+                return pending(store, files, *args, **kwargs)
+
+            with patch.multiple(check_excel_data, **config):
+                with patch.object(check_excel_data.SqliteCheckpointStore, "pending", apagar_antes):
+                    main()
+                final = pd.read_csv(tmp / "resultado.csv", encoding="utf-8-sig")
+            self.assertNotIn("sem_alvo.xlsx", final["arquivo"].tolist())
+            self.assertEqual(len(final), len(depois) - 1)
+
+    def test_interrupcao_grava_o_buffer_no_checkpoint(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            dados = tmp / "dados"
+            dados.mkdir()
+            _escrever_workbooks(dados)
+            config = {
+                "DATA_DIR": dados,
+                "CHECKPOINT_PATH": tmp / "checkpoint.csv",
+                "CHECKPOINT_DB_PATH": tmp / "checkpoint.sqlite",
+                "RESULT_PATH": tmp / "resultado.csv",
+                "USE_PARALLEL": False,
+                "CHECKPOINT_FLUSH_EVERY": 100,
+            }
+            original = check_excel_data.process_one_file
+            vistos = []
+
+            def parar_no_terceiro(p):
+                if len(vistos) == 2:
+                    raise KeyboardInterrupt
+                vistos.append(p.name)
+                return original(p)
+
+            with patch.multiple(check_excel_data, **config):
+                with patch.object(check_excel_data, "process_one_file", side_effect=parar_no_terceiro):
+                    with self.assertRaises(KeyboardInterrupt):
+                        main()
+
+                # os dois primeiros já estão no checkpoint e não voltam para a fila
+                refeitos = []
+
+                def registrar(p):
+                    refeitos.append(p.name)
+                    return original(p)
+
+                with patch.object(check_excel_data, "process_one_file", side_effect=registrar):
+                    main()
+
+            self.assertEqual(len(vistos), 2)
+            self.assertEqual(len(refeitos), 4)
+            self.assertFalse(set(vistos) & set(refeitos))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,254 @@
+from pathlib import Path
+import re
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.anexo_a.create_DOC_BASE_Reprocessado import STATUS_COLS, DOCBaseReprocessor
+from src.anexo_a import parser_telas
+from src.anexo_a.parser_telas import LAYOUTS, CampoTela, LayoutTela, ler_linhas_texto, registrar_layout
+
+
+DUMP_TELAS = "\r\n".join(
+    [
+        "cabecalho solto CONTRATO: 55",
+        "@1/0006306",
+        "EMP/CONTRATO: 1/0006306   QTD  CPA:  60",
+        "CLIENTE:  FULANO DE TAL    CPF : 123.456.789-00",
+        "DT.CONTRAT.INICIAL: 27/07/05",
+        "@1/0006306",
+        "CONSULTA BEM   CONTRATO: 0006306   DT.LIQUIDACAO: 10/10/10",
+        "VL.UNITARIO: 1.234,50  VL.UNITARIO: 10,25",
+        "@1/0007001  ",
+        "emp/contrato: sem numero",
+        "",
+        "@1/0007002",
+        "consulta bem sem contrato",
+        "@1/0007003",
+        "CONTRATO:7003 VL.UNITARIO: 5,00",
+    ]
+)
+
+
+def _split_por_contrato(texto):
+    texto = texto.replace("\r\n", "\n").replace("\r", "\n")
+    parts = re.split(r"(?=^@\d+/\d+\s*$)", texto, flags=re.MULTILINE)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _detalhes_contrato_por_dicts(texto):
+    rows = []
+    for blk in _split_por_contrato(texto):
+        if "EMP/CONTRATO:" not in blk.upper():
+            continue
+        m = re.search(r"EMP/CONTRATO:\s*(?P<emp_contrato>\d+/\d+)", blk)
+        contrato = m.group("emp_contrato") if m else None
+        m = re.search(r"CLIENTE:\s*(?P<cliente>.+?)\s+CPF\s*:\s*(?P<cpf>[0-9\.\-]+)", blk)
+        cliente = m.group("cliente").strip() if m else None
+        cpf = m.group("cpf").strip() if m else None
+        m = re.search(r"DT\.CONTRAT\.INICIAL:\s*(\d{2}/\d{2}/\d{2})", blk)
+        dt = m.group(1) if m else None
+        m = re.search(r"QTD\s+CPA:\s*(\d+)", blk)
+        qtd = m.group(1) if m else None
+        rows.append(
+            {"contrato": contrato, "cliente": cliente, "dt_contrato_inicial": dt, "qtd_cpa": qtd, "cpf": cpf}
+        )
+    return pd.DataFrame(rows)
+
+
+def _consulta_bens_por_dicts(texto):
+    rows = []
+    for blk in _split_por_contrato(texto):
+        if "CONSULTA BEM" not in blk.upper() and "CONTRATO:" not in blk.upper():
+            continue
+        m = re.search(r"DT\.LIQUIDACAO:\s*(\d{2}/\d{2}/\d{2})", blk)
+        dt = m.group(1) if m else None
+        m = re.search(r"CONTRATO:\s*(\d+)", blk)
+        contrato = m.group(1) if m else None
+        valores = re.findall(r"VL\.UNITARIO:\s*([\d\.]+,\d{2})", blk)
+        valor = sum(float(v.replace(".", "").replace(",", ".")) for v in valores) if valores else 0.0
+        if contrato:
+            rows.append({"contrato": contrato, "dt_liquidacao": dt, "valor_bem": round(valor, 2)})
+    return pd.DataFrame(rows)
+
+
+def _compara_str(a, b):
+    if pd.isnull(a) and pd.isnull(b):
+        return "Conferido"
+    if pd.isnull(a) or pd.isnull(b):
+        return "Divergente"
+    return "Conferido" if str(a).strip().upper() == str(b).strip().upper() else "Divergente"
+
+
+def _compara_num(a, b, tol=0.01):
+    try:
+        if pd.isnull(a) and pd.isnull(b):
+            return "Conferido"
+        if pd.isnull(a) or pd.isnull(b):
+            return "Divergente"
+        return "Conferido" if abs(float(a) - float(b)) < tol else "Divergente"
+    except Exception:
+        return "Divergente"
+
+
+def _compara_data(a, b):
+    if pd.isnull(a) and pd.isnull(b):
+        return "Conferido"
+    if pd.isnull(a) or pd.isnull(b):
+        return "Divergente"
+    a_fmt = pd.to_datetime(a, dayfirst=True, errors="coerce")
+    b_fmt = pd.to_datetime(b, dayfirst=True, errors="coerce")
+    if pd.isnull(a_fmt) or pd.isnull(b_fmt):
+        return "Divergente"
+    return "Conferido" if a_fmt == b_fmt else "Divergente"
+
+
+def _status_linha_a_linha(df: pd.DataFrame) -> pd.DataFrame:
+    """Cadeia de apply(axis=1) que export_status_file usava antes da versão vetorizada."""
+    df = df.copy()
+    df["Cliente - Status"] = df.apply(
+        lambda x: _compara_str(x["cliente_base"], x["cliente_extraido"]), axis=1
+    )
+    df["CNPJ/CPF - Status"] = df.apply(
+        lambda x: _compara_str(
+            "".join(filter(str.isdigit, str(x["cpf_base"]))),
+            "".join(filter(str.isdigit, str(x["cpf_extraido"]))),
+        ),
+        axis=1,
+    )
+    df["Valor - Status"] = df.apply(
+        lambda x: _compara_num(x["valor_bem_extraido"], x["valor_bem_base"]), axis=1
+    )
+    df["Data do Contrato - Status"] = df.apply(
+        lambda x: _compara_data(x["data_contrato"], x["dt_contrato_inicial"]), axis=1
+    )
+    df["Data de Liquidação - Status"] = df.apply(
+        lambda x: _compara_data(x["dt_liquidacao_extraido"], x["dt_liquidacao_base"]), axis=1
+    )
+    df["Quantidade de Parcelas - Status"] = df.apply(
+        lambda x: _compara_num(x["qtd_cpa"], x["parcelas_contratadas"]), axis=1
+    )
+    df["CNPJ/CPF - Status"] = df.apply(
+        lambda x: "Conferido" if x["Cliente - Status"] == "Conferido" else x["CNPJ/CPF - Status"],
+        axis=1,
+    )
+    df["Cliente - Status"] = df.apply(
+        lambda x: "Conferido" if x["CNPJ/CPF - Status"] == "Conferido" else x["Cliente - Status"],
+        axis=1,
+    )
+    df["Contrato"] = df["contrato"]
+    return df
+
+
+class DOCBaseReprocessorTestCase(unittest.TestCase):
+    def test_montar_status_equivale_ao_apply_linha_a_linha(self) -> None:
+        df = pd.DataFrame(
+            {
+                "contrato": ["0006306", "0007001", "0007002", "0007003", "0007004", "0007005"],
+                "cliente_extraido": ["Fulano De Tal", "BELTRANO", None, "Ciclano", None, "X"],
+                "cliente_base": [" fulano de tal ", "Beltrano Sa", None, "Outro", "Y", "X"],
+                "cpf_extraido": ["123.456.789-00", "1", None, "11.222.333/0001-44", np.nan, "9"],
+                "cpf_base": ["123.456.789-00", "2", None, "11.222.333/0001-44", "5", "8"],
+                "valor_bem_extraido": [10.0, 10.005, np.nan, 5.0, 1.0, 3.0],
+                "valor_bem_base": [10.0, 10.0, np.nan, "abc", None, 3.02],
+                "data_contrato": ["27/07/2005", "01/02/2010", None, "", "31/12/1999", "02/01/2010"],
+                "dt_contrato_inicial": ["27/07/05", "01/02/10", None, "01/01/00", None, "01/02/2010"],
+                "dt_liquidacao_extraido": ["10/10/2010", None, None, "xx", "05/05/2005", "1/1/2011"],
+                "dt_liquidacao_base": ["10/10/2010", "", None, "xx", "05/05/2005", "01/01/2011"],
+                "qtd_cpa": ["60", "36", None, "1,5", "12", " 24 "],
+                "parcelas_contratadas": [60, 36, 0, 1, 12, 24],
+            }
+        )
+        processor = DOCBaseReprocessor("base.xlsx", "telas")
+
+        esperado = _status_linha_a_linha(df)[STATUS_COLS]
+        obtido = processor.montar_status(df.copy())[STATUS_COLS]
+
+        pd.testing.assert_frame_equal(esperado, obtido)
+        self.assertEqual("Conferido", obtido.loc[1, "Valor - Status"])
+        self.assertEqual("Divergente", obtido.loc[3, "Valor - Status"])
+
+    def test_parser_de_telas_equivale_aos_re_search_por_bloco(self) -> None:
+        processor = DOCBaseReprocessor("base.xlsx", "telas")
+
+        detalhes = processor.extracao_detalhes_contrato(DUMP_TELAS)
+        bens = processor.extracao_consulta_bens(DUMP_TELAS)
+
+        pd.testing.assert_frame_equal(_detalhes_contrato_por_dicts(DUMP_TELAS), detalhes)
+        pd.testing.assert_frame_equal(_consulta_bens_por_dicts(DUMP_TELAS), bens)
+        self.assertEqual(["1/0006306", None], detalhes["contrato"].tolist())
+        self.assertEqual(1244.75, bens.loc[bens["contrato"] == "0006306", "valor_bem"].item())
+
+    def test_registrar_layout_de_tela_nova(self) -> None:
+        layout = registrar_layout(
+            LayoutTela(
+                nome="TESTE_PARCELAS",
+                filtros=("PARCELA",),
+                campos=(
+                    CampoTela(("contrato",), r"CONTRATO:\s*(\d+)"),
+                    CampoTela(("parcelas",), r"PARCELA\s+(\d+)", agregacao="soma", conversor=int, vazio=0),
+                ),
+            )
+        )
+        self.addCleanup(LAYOUTS.pop, "TESTE_PARCELAS")
+
+        colunas = layout.extrair_colunas("@1/1\nCONTRATO: 1 PARCELA 2 PARCELA 3\n@1/2\nnada\n")
+
+        self.assertIs(layout, LAYOUTS["TESTE_PARCELAS"])
+        self.assertEqual({"contrato": ["1"], "parcelas": [5]}, colunas)
+
+    def test_merge_tela_preta_streaming_grava_o_mesmo_merge_em_parquet(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            path_bens = Path(tmp_dir) / "bens.txt"
+            path_contratos = Path(tmp_dir) / "contratos.txt"
+            path_bens.write_bytes(
+                (DUMP_TELAS + "\r\n@1/0006306\r\nCONTRATO: 0006306 DT.LIQUIDACAO: 10/10/10\r\n"
+                 "VL.UNITARIO: 1.234,50  VL.UNITARIO: 10,25\r\n").encode("utf-8")
+            )
+            path_contratos.write_bytes(
+                (DUMP_TELAS + "\r\n@1/7003\r\nEMP/CONTRATO: 1/7003\r\nCLIENTE: JOSÉ  CPF : 1\r\n")
+                .encode("latin1")
+            )
+            processor = DOCBaseReprocessor("base.xlsx", "telas")
+            path_parquet = Path(tmp_dir) / "merge.parquet"
+
+            total = processor.merge_tela_preta_streaming(
+                str(path_bens), str(path_contratos), str(path_parquet), tamanho_lote=1
+            )
+
+            esperado = processor.merge_tela_preta(str(path_bens), str(path_contratos))
+            esperado = esperado.reset_index(drop=True).astype(object)
+            esperado = esperado.where(esperado.notna(), None)
+            obtido = pd.read_parquet(path_parquet).astype(object)
+            obtido = obtido.where(obtido.notna(), None)
+
+            self.assertEqual(4, total)
+            self.assertEqual(4, pq.ParquetFile(path_parquet).num_row_groups)
+            pd.testing.assert_frame_equal(esperado, obtido)
+            self.assertEqual("JOSÉ", obtido.loc[obtido["contrato"] == "7003", "cliente"].item())
+
+    def test_ler_linhas_texto_decide_o_encoding_pelo_arquivo_inteiro(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            caminho = Path(tmp_dir) / "misto.txt"
+            # UTF-8 válido na primeira linha, byte latin1 só no fim do arquivo
+            caminho.write_bytes("CLIENTE: JOSÉ\r\n".encode("utf-8") + b"x" * 10_000 + b"\r\nAV. S\xc3O\n")
+
+            with patch.object(parser_telas, "TAMANHO_BLOCO_LEITURA", 1024):
+                linhas = list(ler_linhas_texto(caminho))
+
+            # como a leitura antiga: o arquivo todo em latin1, inclusive a primeira linha
+            self.assertEqual("CLIENTE: JOSÃ\x89\n", linhas[0])
+            self.assertEqual("AV. SÃO\n", linhas[-1])
+            self.assertEqual(caminho.read_bytes().decode("latin1").replace("\r\n", "\n"), "".join(linhas))
+
+            caminho.write_bytes("CLIENTE: JOSÉ\r\n".encode("utf-8") * 1000)
+            with patch.object(parser_telas, "TAMANHO_BLOCO_LEITURA", 7):
+                self.assertEqual(["CLIENTE: JOSÉ\n"] * 1000, list(ler_linhas_texto(caminho)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.anexo_a.create_DOC_BASE_Reprocessado import DATA_COLUMNS, TIPOS_COLUNAS
+from src.utils import excel_snapshot
+from src.utils.excel_snapshot import PASTA_SNAPSHOTS, ler_excel_com_snapshot
+
+
+class ExcelSnapshotTestCase(unittest.TestCase):
+    def _escrever_base(self, path: Path, n: int = 3) -> None:
+        pd.DataFrame(
+            {
+                "nº do contrato": ["0006306", None, "0007001"][:n],
+                "CNPJ_CPF do Arrendatário": ["123", "456", None][:n],
+                "Valor do Bem": [10.5, None, 3.0][:n],
+                "data do contrato": ["27/07/2005", "01/02/2010", None][:n],
+                "Liquidação": pd.to_datetime(["2010-10-10", None, "2011-01-01"][:n]),
+            }
+        ).to_excel(path, index=False)
+
+    def test_snapshot_equivale_ao_read_excel_e_acompanha_a_planilha(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "DOC_BASE.xlsx"
+            self._escrever_base(path)
+            kwargs = {"dtype": TIPOS_COLUNAS, "parse_dates": DATA_COLUMNS}
+
+            esperado = pd.read_excel(path, **kwargs)
+            primeira = ler_excel_com_snapshot(path, **kwargs)
+            with patch.object(excel_snapshot.pd, "read_excel", side_effect=AssertionError):
+                segunda = ler_excel_com_snapshot(path, **kwargs)
+
+            pd.testing.assert_frame_equal(esperado, primeira)
+            pd.testing.assert_frame_equal(esperado, segunda)
+
+            self._escrever_base(path, n=2)
+            st = path.stat()
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            terceira = ler_excel_com_snapshot(path, **kwargs)
+
+            self.assertEqual(2, len(terceira))
+            self.assertEqual(1, len(list((Path(tmp_dir) / PASTA_SNAPSHOTS).glob("*.parquet"))))
+
+    def test_colunas_mistas_e_indice_entram_no_snapshot(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "misto.xlsx"
+            pd.DataFrame(
+                {
+                    "chave": ["a", "b", "c", "d"],
+                    "misto": [1, "a", 2.5, None],
+                    "texto": ["x", None, "y", "z"],
+                }
+            ).to_excel(path, index=False)
+
+            for kwargs in [{}, {"index_col": 0}]:
+                with self.subTest(**kwargs):
+                    esperado = pd.read_excel(path, **kwargs)
+                    primeira = ler_excel_com_snapshot(path, **kwargs)
+                    with patch.object(excel_snapshot.pd, "read_excel", side_effect=AssertionError):
+                        segunda = ler_excel_com_snapshot(path, **kwargs)
+
+                    pd.testing.assert_frame_equal(esperado, primeira)
+                    pd.testing.assert_frame_equal(esperado, segunda)
+                    self.assertEqual([1, "a", 2.5], segunda["misto"].tolist()[:3])
+            self.assertEqual(2, len(list((Path(tmp_dir) / PASTA_SNAPSHOTS).glob("*.parquet"))))
+
+    def test_sem_snapshot_quando_a_gravacao_falha(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "base.xlsx"
+            self._escrever_base(path)
+
+            with patch.object(excel_snapshot.pq, "write_table", side_effect=OSError("disco cheio")):
+                df = ler_excel_com_snapshot(path)
+
+            pd.testing.assert_frame_equal(pd.read_excel(path), df)
+            self.assertEqual([], list((Path(tmp_dir) / PASTA_SNAPSHOTS).iterdir()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+from src.utils.formatador_brl import formatar_brl, formatar_brl_array
+
+
+class FormatadorBRLTestCase(unittest.TestCase):
+    def test_formatar_brl(self) -> None:
+        self.assertEqual(formatar_brl(0), "R$ 0,00")
+        self.assertEqual(formatar_brl(1234567.891), "R$ 1.234.567,89")
+        self.assertEqual(formatar_brl(-999.999), "- R$ 1.000,00")
+        self.assertEqual(formatar_brl(-0.004), "- R$ 0,00")
+
+    def test_array_igual_ao_escalar(self) -> None:
+        rng = np.random.default_rng(7)
+        valores = np.concatenate(
+            [
+                [0.0, -0.0, 0.005, 1.005, 1.115, 0.285, 2.675, -0.004, 999.995,
+                 999999.995, 1e12 - 0.01, 1e12, -1e15, 1e300, np.inf, -np.inf, np.nan, 12.5],
+                np.round(rng.normal(0, 1e7, 5000), 2),
+                rng.uniform(-1e9, 1e9, 5000),
+                np.round(rng.uniform(0, 1000, 2000), 3),
+            ]
+        )
+        esperado = [formatar_brl(v) for v in valores.tolist()]
+        self.assertEqual(formatar_brl_array(valores).tolist(), esperado)
+        self.assertEqual(formatar_brl_array(valores.reshape(-1, 2)).ravel().tolist(), esperado)
+        self.assertEqual(formatar_brl_array([]).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
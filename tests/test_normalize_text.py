@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.utils.normalize_text import DocumentFormatter
+
+
+def _format_values_pt_br(amount, format_as_currency=False):
+    """format_values com locale pt_BR, reproduzido sem setlocale para comparação."""
+    if pd.isnull(amount):
+        return amount
+    amount = str(amount)
+    if "," in amount and "." in amount:
+        amount = amount.replace(".", "").replace(",", ".")
+    elif "," in amount:
+        amount = amount.replace(",", ".")
+    try:
+        valor = float(amount)
+    except ValueError:
+        return amount
+    if not format_as_currency:
+        return valor
+    inteiro, centavos = f"{abs(valor):.2f}".split(".")
+    grupos = []
+    while len(inteiro) > 3:
+        grupos.insert(0, inteiro[-3:])
+        inteiro = inteiro[:-3]
+    grupos.insert(0, inteiro)
+    texto = f"R$ {'.'.join(grupos)},{centavos}"
+    return texto.replace("R$", "- R$") if valor < 0 else texto
+
+
+class DocumentFormatterTestCase(unittest.TestCase):
+    def test_format_documents_series_equivale_ao_escalar(self) -> None:
+        documentos = pd.Series(
+            ["123.456.789-00", "1234567890", "11222333000144", "1122233300014",
+             "123456789012345", "", None, np.nan, 12345678901.0, " 9 "],
+            dtype=object,
+        )
+
+        obtido = DocumentFormatter.format_documents_series(documentos)
+
+        pd.testing.assert_series_equal(documentos.apply(DocumentFormatter.format_documents), obtido)
+        self.assertEqual("012.345.678-90", obtido[1])
+        self.assertEqual("01.122.233/3000-14", obtido[3])
+
+    def test_to_pascal_case_e_correct_year_series_equivalem_ao_escalar(self) -> None:
+        nomes = pd.Series(
+            ["FULANO DE TAL", "josé  da silva", " ana", "", None, "éDSON ÁVILA"], dtype=object
+        )
+        datas = pd.Series(
+            ["27/07/05", "01/02/41", "01/02/40", "01/02/2010", "1/2/ab", "01/02", None, "a/b/c/d", "3/4/ 5"],
+            dtype=object,
+        )
+
+        pd.testing.assert_series_equal(
+            nomes.apply(DocumentFormatter.to_pascal_case),
+            DocumentFormatter.to_pascal_case_series(nomes),
+        )
+        pd.testing.assert_series_equal(
+            datas.apply(DocumentFormatter.correct_year),
+            DocumentFormatter.correct_year_series(datas),
+        )
+        self.assertEqual("01/02/1941", DocumentFormatter.correct_year("01/02/41"))
+
+    def test_format_values_sem_locale(self) -> None:
+        valores = pd.Series(
+            ["1.234,56", "1234.5", "-10,5", "abc", "", None, 1000000, -0.004, "1,2.3"], dtype=object
+        )
+
+        for moeda in (False, True):
+            esperado = valores.apply(_format_values_pt_br, format_as_currency=moeda)
+            pd.testing.assert_series_equal(
+                esperado, valores.apply(DocumentFormatter.format_values, format_as_currency=moeda)
+            )
+            pd.testing.assert_series_equal(
+                esperado, DocumentFormatter.format_values_series(valores, format_as_currency=moeda)
+            )
+
+        self.assertEqual("R$ 1.000.000,00", DocumentFormatter.format_values(1000000, True))
+        self.assertEqual("- R$ 10,50", DocumentFormatter.format_values("-10,5", True))
+
+
+if __name__ == "__main__":
+    unittest.main()
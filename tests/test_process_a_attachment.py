@@ -0,0 +1,538 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from itertools import product
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from openpyxl import load_workbook
+import pikepdf
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from src.anexo_a import process_a_attachment
+from src.anexo_a.indice_pdfs import IndicePDFs
+from src.anexo_a.pacote_blocos import ARQUIVO_DADOS, PacoteBlocos
+from src.anexo_a.process_a_attachment import TelasPretasProcessor
+
+
+DUMP_TELAS = "\n".join(
+    [
+        "lixo antes do primeiro bloco",
+        "@1/0006306",
+        "EMP/CONTRATO: 1/0006306",
+        "CLIENTE: FULANO   CPF : 123.456.789-00",
+        "#1/0006306",
+        "",
+        "@1/0007000",
+        "sem fechamento",
+        "@1/0007001 TELA",
+        "VALOR 10",
+        "#1/0007001   ",
+        "@1/0006306",
+        "EMP/CONTRATO: 1/0006306",
+        "CLIENTE: FULANO   CPF : 123.456.789-00",
+        "#1/0006306",
+        "@1/0006306",
+        "CONTEUDO DIFERENTE",
+        "#1/0006306",
+        "",
+    ]
+)
+
+
+class TelasPretasProcessorTestCase(unittest.TestCase):
+    def _criar_processor(self, tmp_dir: str, **kwargs) -> TelasPretasProcessor:
+        pasta_entrada = Path(tmp_dir) / "entrada"
+        pasta_entrada.mkdir()
+        (pasta_entrada / "TELA_A.txt").write_text(DUMP_TELAS, encoding="utf-8")
+        return TelasPretasProcessor(pasta_entrada, Path(tmp_dir) / "saida", **kwargs)
+
+    def test_separar_blocos_equivale_ao_regex_original(self) -> None:
+        esperado = [
+            (m.group(1), m.group(0).strip() + "\n")
+            for m in TelasPretasProcessor.PADRAO_BLOCO.finditer(DUMP_TELAS)
+        ]
+
+        obtido = list(TelasPretasProcessor.separar_blocos(DUMP_TELAS.splitlines(True)))
+
+        self.assertEqual(esperado, obtido)
+        self.assertEqual(4, len(obtido))
+
+    def test_separar_blocos_descarta_bloco_aberto_no_proximo_cabecalho(self) -> None:
+        def linhas():
+            for i in range(1, 4):
+                yield f"@1/{i}\n"
+                yield "sem fechamento\n"
+            yield "@1/9\n"
+            yield "VALOR 9\n"
+            yield "#1/9\n"
+            raise AssertionError("leu além do bloco fechado")
+
+        blocos = TelasPretasProcessor.separar_blocos(linhas())
+
+        self.assertEqual(("1/9", "@1/9\nVALOR 9\n#1/9\n"), next(blocos))
+
+    def test_processar_txts_da_arvore_deduplica_por_conteudo(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+
+            resultado = processor.processar_txts_da_arvore()
+
+            pasta_tipo = processor.pasta_output / "TELA_A"
+            self.assertEqual(1, resultado.arquivos_txt_processados)
+            self.assertEqual(2, resultado.contratos_novos)
+            self.assertEqual(1, resultado.ignorados_iguais)
+            self.assertEqual(1, resultado.duplicados_diferentes)
+            self.assertEqual(
+                ["1_0006306.txt", "1_0006306_DUP1.txt", "1_0007001.txt"],
+                sorted(p.name for p in pasta_tipo.glob("*.txt")),
+            )
+
+            segunda = processor.processar_txts_da_arvore()
+
+            self.assertEqual(0, segunda.contratos_gravados)
+            self.assertEqual(4, segunda.ignorados_iguais)
+
+    def test_processar_txts_da_arvore_paralelo_retorna_mesmos_totais(self) -> None:
+        resultados = []
+        for workers in (1, 2):
+            with TemporaryDirectory() as tmp_dir:
+                processor = self._criar_processor(tmp_dir)
+                (processor.pasta_entrada / "TELA_B.txt").write_text(
+                    DUMP_TELAS, encoding="utf-8"
+                )
+                resultados.append(processor.processar_txts_da_arvore(workers=workers))
+
+        serial, paralelo = resultados
+        self.assertEqual(serial, paralelo)
+        self.assertEqual(2, paralelo.arquivos_txt_processados)
+        self.assertEqual(6, paralelo.contratos_gravados)
+
+    def test_pacote_blocos_substitui_arquivos_soltos_nas_etapas_seguintes(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir, usar_pacote_blocos=True)
+
+            resultado = processor.processar_txts_da_arvore()
+            segunda = processor.processar_txts_da_arvore()
+
+            pasta_tipo = processor.pasta_output / "TELA_A"
+            pacote = PacoteBlocos(pasta_tipo)
+            self.assertEqual([], list(pasta_tipo.glob("*.txt")))
+            self.assertEqual(3, len(pacote))
+            self.assertEqual(3, resultado.contratos_gravados)
+            self.assertEqual(0, segunda.contratos_gravados)
+            self.assertTrue(pacote.ler("1_0007001").startswith("@1/0007001 TELA\n"))
+
+            esperados = Path(tmp_dir) / "esperados.txt"
+            esperados.write_text("6306\n9999\n", encoding="utf-8")
+            validacao = processor.validar_gerados(
+                esperados, processor.pasta_output, Path(tmp_dir) / "validacao"
+            )
+
+            self.assertEqual(1, len(validacao))
+            self.assertEqual([9999], validacao[0].faltantes)
+            self.assertIn((7001, "1_0007001.txt"), validacao[0].extras_detalhado)
+
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            processor.converter_pasta_txt_para_pdf(processor.pasta_output, pasta_pdf)
+
+            self.assertEqual(
+                ["1_0006306.pdf", "1_0006306_DUP1.pdf", "1_0007001.pdf"],
+                sorted(p.name for p in (pasta_pdf / "TELA_A").glob("*.pdf")),
+            )
+
+    def test_mover_extras_remove_o_bloco_do_pacote(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir, usar_pacote_blocos=True)
+            processor.processar_txts_da_arvore()
+            esperados = Path(tmp_dir) / "esperados.txt"
+            esperados.write_text("6306\n", encoding="utf-8")
+            pasta_validacao = Path(tmp_dir) / "validacao"
+            processor.validar_gerados(esperados, processor.pasta_output, pasta_validacao)
+
+            processor.mover_extras_do_excel(
+                pasta_validacao / "validacao_por_tipo.xlsx", processor.pasta_output
+            )
+
+            pasta_tipo = processor.pasta_output / "TELA_A"
+            extra = processor.pasta_output / "extras" / "TELA_A" / "1_0007001.txt"
+            self.assertTrue(extra.read_text(encoding="utf-8").startswith("@1/0007001 TELA\n"))
+            self.assertEqual(
+                ["1_0006306_DUP1.txt", "1_0007001.txt"], sorted(p.name for p in extra.parent.iterdir())
+            )
+            self.assertEqual(["1_0006306"], list(PacoteBlocos(pasta_tipo).entradas))
+
+            # as etapas seguintes já não veem o bloco movido
+            validacao = processor.validar_gerados(
+                esperados, processor.pasta_output, Path(tmp_dir) / "validacao2"
+            )
+            self.assertEqual([], validacao[0].extras_detalhado)
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            processor.converter_pasta_txt_para_pdf(processor.pasta_output, pasta_pdf)
+            self.assertEqual(
+                ["1_0006306.pdf"], sorted(p.name for p in (pasta_pdf / "TELA_A").glob("*.pdf"))
+            )
+
+            # o mesmo bloco volta se reaparecer num dump novo
+            with PacoteBlocos(pasta_tipo) as pacote:
+                pacote.adicionar("1_0007001", "1/0007001", "h", "@1/0007001\n#1/0007001\n")
+            self.assertIn("1_0007001", PacoteBlocos(pasta_tipo))
+
+    def test_pacote_blocos_ignora_escrita_interrompida(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            with PacoteBlocos(tmp_dir) as pacote:
+                pacote.adicionar("1_1", "1/1", "h1", "@1/1\n#1/1\n")
+                pacote.adicionar("1_2", "1/2", "h2", "@1/2\n#1/2\n")
+
+            with open(Path(tmp_dir) / ARQUIVO_DADOS, "r+b") as f:
+                f.truncate(15)
+
+            recarregado = PacoteBlocos(tmp_dir)
+
+            self.assertEqual(["1_1"], list(recarregado.entradas))
+            self.assertEqual("@1/1\n#1/1\n", recarregado.ler("1_1"))
+
+    def test_execucao_incremental_reprocessa_apenas_o_que_mudou(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+
+            primeira = processor.processar_txts_da_arvore(incremental=True)
+            segunda = processor.processar_txts_da_arvore(incremental=True)
+            (processor.pasta_entrada / "TELA_B.txt").write_text(
+                DUMP_TELAS, encoding="utf-8"
+            )
+            terceira = processor.processar_txts_da_arvore(incremental=True)
+
+            self.assertEqual(3, primeira.contratos_gravados)
+            self.assertEqual(0, segunda.arquivos_txt_processados)
+            self.assertEqual(1, segunda.arquivos_txt_inalterados)
+            self.assertEqual(1, terceira.arquivos_txt_processados)
+            self.assertEqual(1, terceira.arquivos_txt_inalterados)
+
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            processor.converter_pasta_txt_para_pdf(
+                processor.pasta_output, pasta_pdf, incremental=True
+            )
+            processor.converter_pasta_txt_para_pdf(
+                processor.pasta_output, pasta_pdf, incremental=True
+            )
+            log_conversao = (pasta_pdf / "log.txt").read_text(encoding="utf-8")
+            self.assertIn("[INFO] PDFs já atualizados (pulados): 6", log_conversao)
+
+            processor.merge_global_por_contrato(pasta_pdf, incremental=True)
+            processor.merge_global_por_contrato(pasta_pdf, incremental=True)
+            log_merge = (pasta_pdf / "merged" / "merge_log.txt").read_text(encoding="utf-8")
+            self.assertIn("[INFO] Contratos sem alteração (pulados): 2", log_merge)
+            self.assertIn("[RESULTADO] Merges gerados: 0 | Falhas: 0", log_merge)
+
+    def test_escolher_fonte_usa_metrica_monoespacada_sem_mudar_resultado(self) -> None:
+        casos = [
+            ["curta\n", "x" * 150 + "\n", "acentuação " * 12 + "\n"],
+            # caracteres de controle têm outra largura no Courier
+            ["\t" * 60 + "x" * 70 + "\n", "y" * 100 + "\n"],
+            ["\t" * 100 + "x" * 40 + "\n", "\f" + "z" * 120 + "\n", "\x1b[0m" + "w" * 90 + "\n"],
+        ]
+
+        for linhas, largura_util in product(casos, (300.0, 500.0, 700.0, 900.0)):
+            maior = max(stringWidth(ln.rstrip("\n"), "Courier", 10) for ln in linhas)
+            maior_linha = max(linhas, key=lambda ln: stringWidth(ln, "Courier", 10)).rstrip("\n")
+            esperado = max(5, min(10, int((largura_util / maior) * 10)))
+            while esperado > 5 and stringWidth(maior_linha, "Courier", esperado) > largura_util:
+                esperado -= 1
+
+            obtido = TelasPretasProcessor.escolher_fonte_para_caber(
+                linhas, "Courier", largura_util
+            )
+
+            self.assertEqual(esperado, obtido)
+        self.assertEqual(0.6, process_a_attachment.largura_caractere_monoespacada("Courier"))
+        self.assertIsNone(process_a_attachment.largura_caractere_monoespacada("Helvetica"))
+
+    def test_converter_pasta_txt_para_pdf_em_paralelo_mantem_log(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            pasta_txt = Path(tmp_dir) / "txt"
+            pasta_txt.mkdir()
+            for i in range(5):
+                (pasta_txt / f"1_{i:07d}.txt").write_text(f"@1/{i}\n#1/{i}\n", encoding="utf-8")
+
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            # threads no lugar de processos para contar os lotes enviados ao pool
+            with patch.object(
+                process_a_attachment, "ProcessPoolExecutor", ThreadPoolExecutor
+            ), patch.object(
+                process_a_attachment,
+                "_converter_lote_pdf_worker",
+                wraps=process_a_attachment._converter_lote_pdf_worker,
+            ) as worker:
+                processor.converter_pasta_txt_para_pdf(pasta_txt, pasta_pdf, workers=2)
+
+            # 5 pendentes, bem abaixo de TAMANHO_LOTE_PDF, ainda viram um lote por worker
+            self.assertEqual([3, 2], [len(c.args[1]) for c in worker.call_args_list])
+
+            log = (pasta_pdf / "log.txt").read_text(encoding="utf-8").splitlines()
+            linhas_ok = [ln for ln in log if ln.startswith("[OK]")]
+            self.assertEqual(
+                [f"[OK] 1_{i:07d}.txt -> {pasta_pdf / f'1_{i:07d}.pdf'}" for i in range(5)],
+                linhas_ok,
+            )
+            self.assertIn("[RESULTADO] PDFs gerados: 5 | Falhas: 0", log)
+
+    def test_lotes_de_pdf_reaproveitam_o_indice_do_pacote_no_processo(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir, usar_pacote_blocos=True)
+            processor.processar_txts_da_arvore()
+            pasta_tipo = processor.pasta_output / "TELA_A"
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            pasta_pdf.mkdir()
+            nomes = sorted(PacoteBlocos(pasta_tipo).entradas)
+            lotes = [
+                [(pasta_tipo / f"{nome}.txt", pasta_tipo, pasta_pdf / f"{nome}.pdf")]
+                for nome in nomes
+            ]
+
+            with patch.dict(process_a_attachment._PACOTES_DO_PROCESSO, clear=True), patch.object(
+                process_a_attachment, "PacoteBlocos", wraps=PacoteBlocos
+            ) as construtor:
+                for lote in lotes:
+                    [(_, _, erro, _)] = process_a_attachment._converter_lote_pdf_worker(
+                        processor._parametros_worker(), lote
+                    )
+                    self.assertIsNone(erro)
+                self.assertEqual(1, construtor.call_count)
+
+                # índice alterado (bloco novo): o pacote é relido
+                with PacoteBlocos(pasta_tipo) as pacote:
+                    pacote.adicionar("1_9", "1/9", "h", "@1/9\n#1/9\n")
+                process_a_attachment._converter_lote_pdf_worker(
+                    processor._parametros_worker(),
+                    [(pasta_tipo / "1_9.txt", pasta_tipo, pasta_pdf / "1_9.pdf")],
+                )
+                self.assertEqual(2, construtor.call_count)
+
+            self.assertEqual(
+                sorted(f"{n}.pdf" for n in [*nomes, "1_9"]), sorted(p.name for p in pasta_pdf.iterdir())
+            )
+
+    def test_detectar_encoding_resolve_pelo_nivel_mais_barato(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            pasta = Path(tmp_dir)
+            texto = "CONTRATO AÇÃO NÃO LIQUIDADO coração\n" * 20
+            (pasta / "utf8.txt").write_text(texto, encoding="utf-8")
+            (pasta / "latin1_a.txt").write_bytes(texto.encode("latin-1"))
+            (pasta / "latin1_b.txt").write_bytes(texto.encode("latin-1"))
+
+            with patch.object(process_a_attachment, "CONFIANCA_MINIMA_ENCODING", 1.01):
+                niveis = [
+                    TelasPretasProcessor.detectar_encoding_com_nivel(pasta / nome)
+                    for nome in ("utf8.txt", "latin1_a.txt", "latin1_b.txt")
+                ]
+
+            self.assertEqual(("utf-8", "utf8"), niveis[0])
+            self.assertEqual("chardet", niveis[1][1])
+            self.assertEqual((niveis[1][0], "pasta"), niveis[2])
+
+    def test_validar_gerados_streaming_gera_mesmo_excel(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            processor.processar_txts_da_arvore()
+            esperados = Path(tmp_dir) / "esperados.txt"
+            esperados.write_text("6306\n9999\n", encoding="utf-8")
+
+            pasta_classica = Path(tmp_dir) / "classica"
+            pasta_streaming = Path(tmp_dir) / "streaming"
+            processor.validar_gerados(esperados, processor.pasta_output, pasta_classica)
+            processor.validar_gerados(
+                esperados,
+                processor.pasta_output,
+                pasta_streaming,
+                modo_streaming=True,
+                saida_colunar="csv",
+            )
+
+            classico = load_workbook(pasta_classica / "validacao_por_tipo.xlsx")
+            streaming = load_workbook(pasta_streaming / "validacao_por_tipo.xlsx")
+            self.assertEqual(classico.sheetnames, streaming.sheetnames)
+            for nome in classico.sheetnames:
+                ws_c, ws_s = classico[nome], streaming[nome]
+                self.assertEqual(
+                    [[c.value for c in row] for row in ws_c.iter_rows()],
+                    [[c.value for c in row] for row in ws_s.iter_rows()],
+                )
+                self.assertEqual(ws_c.freeze_panes, ws_s.freeze_panes)
+                self.assertEqual(
+                    [c.font.bold for row in ws_c.iter_rows() for c in row],
+                    [c.font.bold for row in ws_s.iter_rows() for c in row],
+                )
+
+            with open(pasta_streaming / "faltantes_extras.csv", encoding="utf-8") as f:
+                linhas = list(csv.reader(f))
+            self.assertEqual(["tipo", "situacao", "contrato", "arquivo"], linhas[0])
+            self.assertIn(["TELA_A", "faltante", "9999", ""], linhas)
+            self.assertIn(["TELA_A", "extra", "7001", "1_0007001.txt"], linhas)
+
+    def test_validacao_incremental_pula_antes_da_varredura_e_respeita_saidas(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            processor.processar_txts_da_arvore()
+            esperados = Path(tmp_dir) / "esperados.txt"
+            esperados.write_text("6306\n9999\n", encoding="utf-8")
+            pasta_validacao = Path(tmp_dir) / "validacao"
+
+            def validar(**kwargs):
+                return processor.validar_gerados(
+                    esperados, processor.pasta_output, pasta_validacao, incremental=True, **kwargs
+                )
+
+            primeira = validar()
+            with patch.object(TelasPretasProcessor, "_varrer_gerados", side_effect=AssertionError):
+                self.assertEqual(primeira, validar())
+
+            # saída pedida agora e nunca gerada não pode ser pulada
+            validar(saida_colunar="csv")
+            self.assertTrue((pasta_validacao / "faltantes_extras.csv").exists())
+            with patch.object(TelasPretasProcessor, "_varrer_gerados", side_effect=AssertionError):
+                validar(saida_colunar="csv")
+
+            (pasta_validacao / "faltantes_extras.csv").unlink()
+            validar(saida_colunar="csv")
+            self.assertTrue((pasta_validacao / "faltantes_extras.csv").exists())
+
+            # subpasta nova num nível intermediário também invalida o registro
+            nova = processor.pasta_output / "TELA_NOVA"
+            nova.mkdir()
+            (nova / "1_0009999.txt").write_text("@1/0009999\n#1/0009999\n", encoding="utf-8")
+            resultado = validar(saida_colunar="csv")
+            self.assertEqual(["TELA_A", "TELA_NOVA"], sorted(r.tipo for r in resultado))
+
+    def test_validacao_vetorizada_equivale_ao_calculo_por_conjuntos(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            processor.processar_txts_da_arvore()
+            pasta_b = processor.pasta_output / "TELA_B"
+            pasta_b.mkdir()
+            for nome in ("1_0006306.txt", "2_0000042.txt", "3_0000042.txt", "sem_numero.txt"):
+                (pasta_b / nome).write_text("x", encoding="utf-8")
+            esperados = Path(tmp_dir) / "esperados.txt"
+            esperados.write_text("6306\n7001\n9999\n", encoding="utf-8")
+
+            resultados = [
+                processor.validar_gerados(
+                    esperados,
+                    processor.pasta_output,
+                    Path(tmp_dir) / f"validacao_{vetorizado}",
+                    vetorizado=vetorizado,
+                )
+                for vetorizado in (False, True)
+            ]
+            matriz = processor.matriz_cobertura_por_tipo(esperados, processor.pasta_output)
+
+            por_conjuntos, vetorizado = resultados
+            self.assertEqual(por_conjuntos, vetorizado)
+            self.assertEqual([9999], vetorizado[0].faltantes)
+            self.assertEqual([7001, 9999], vetorizado[1].faltantes)
+            self.assertEqual(
+                [(42, "2_0000042.txt"), (42, "3_0000042.txt")],
+                vetorizado[1].extras_detalhado,
+            )
+            self.assertEqual(1, vetorizado[1].invalidos)
+            self.assertEqual(
+                "7001\n9999\n",
+                (Path(tmp_dir) / "validacao_True" / "faltantes_txt" / "faltantes_geral.txt").read_text(
+                    encoding="utf-8"
+                ),
+            )
+            self.assertEqual(["TELA_A", "TELA_B"], list(matriz.columns))
+            self.assertEqual([True, True, False], matriz["TELA_A"].tolist())
+            self.assertEqual([True, False, False], matriz["TELA_B"].tolist())
+
+    def test_merge_global_paralelo_com_limite_de_documentos_abertos(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            for tipo in ("TELA_A", "TELA_B", "TELA_C", "TELA_D"):
+                for contrato in ("0000001", "0000002"):
+                    destino = pasta_pdf / tipo / f"1_{contrato}.pdf"
+                    destino.parent.mkdir(parents=True, exist_ok=True)
+                    with pikepdf.Pdf.new() as pdf:
+                        pdf.add_blank_page()
+                        pdf.save(destino)
+
+            logs = []
+            for workers in (1, 2):
+                processor.merge_global_por_contrato(
+                    pasta_pdf, workers=workers, max_documentos_abertos=3 * workers
+                )
+                logs.append((pasta_pdf / "merged" / "merge_log.txt").read_text(encoding="utf-8"))
+
+            serial, paralelo = logs
+            self.assertEqual(serial, paralelo)
+            self.assertIn("[OK] Contrato 0000001: 4 PDFs -> 0000001.pdf", paralelo)
+            self.assertIn("[RESULTADO] Merges gerados: 2 | Falhas: 0", paralelo)
+            with pikepdf.open(pasta_pdf / "merged" / "0000002.pdf") as pdf:
+                self.assertEqual(4, len(pdf.pages))
+            self.assertEqual(
+                ["0000001.pdf", "0000002.pdf", "merge_log.txt"],
+                sorted(p.name for p in (pasta_pdf / "merged").iterdir()),
+            )
+
+            # workers demais para o limite: reduz em vez de falhar
+            processor.merge_global_por_contrato(pasta_pdf, workers=22)
+            log_reduzido = (pasta_pdf / "merged" / "merge_log.txt").read_text(encoding="utf-8")
+            self.assertIn("[AVISO] 22 workers com max_documentos_abertos=64: usando 21 workers", log_reduzido)
+            self.assertIn("[RESULTADO] Merges gerados: 2 | Falhas: 0", log_reduzido)
+            with self.assertRaises(ValueError):
+                processor.merge_global_por_contrato(pasta_pdf, max_documentos_abertos=2)
+
+    def test_filtrar_pdfs_por_csv_com_indice_e_simulacao(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            processor = self._criar_processor(tmp_dir)
+            pasta_pdf = Path(tmp_dir) / "pdf"
+            for nome in ("A/1_0000001.pdf", "A/1_0000002.pdf", "B/1_0000001.pdf", "B/sem.pdf"):
+                (pasta_pdf / nome).parent.mkdir(parents=True, exist_ok=True)
+                (pasta_pdf / nome).write_bytes(b"%PDF")
+            csv_path = Path(tmp_dir) / "alvo.csv"
+            csv_path.write_text("Contrato\n0000001\n", encoding="utf-8")
+
+            planejado = processor.mover_pdfs_filtrados_por_csv(
+                pasta_pdf, csv_path, usar_indice=True, simular=True
+            )
+
+            self.assertEqual(
+                [
+                    (pasta_pdf / "A" / "1_0000001.pdf", pasta_pdf / "100 maiores" / "1_0000001.pdf"),
+                    (pasta_pdf / "B" / "1_0000001.pdf", pasta_pdf / "100 maiores" / "1_0000001__dup1.pdf"),
+                ],
+                planejado,
+            )
+            self.assertEqual(["A", "B"], sorted(p.name for p in pasta_pdf.iterdir()))
+
+            movido = processor.mover_pdfs_filtrados_por_csv(pasta_pdf, csv_path, usar_indice=True)
+
+            self.assertEqual(planejado, movido)
+            self.assertTrue((pasta_pdf / "100 maiores" / "1_0000001__dup1.pdf").exists())
+            self.assertFalse((pasta_pdf / "A" / "1_0000001.pdf").exists())
+
+            indice = IndicePDFs(pasta_pdf, TelasPretasProcessor.RE_CONTRATO_GERAL)
+            indice.atualizar(ignorar=[pasta_pdf / "100 maiores"])
+            self.assertEqual(2, indice.pastas_relidas)  # A e B, de onde os PDFs saíram
+            self.assertEqual(
+                [(pasta_pdf / "A" / "1_0000002.pdf", "0000002"), (pasta_pdf / "B" / "sem.pdf", None)],
+                indice.entradas(),
+            )
+            indice.salvar()
+
+            # o índice fica fora da árvore: salvar não muda o mtime da raiz
+            self.assertEqual([], list(pasta_pdf.glob(".indice_pdfs*")))
+            recarregado = IndicePDFs(pasta_pdf, TelasPretasProcessor.RE_CONTRATO_GERAL)
+            recarregado.atualizar(ignorar=[pasta_pdf / "100 maiores"])
+            self.assertEqual(0, recarregado.pastas_relidas)
+            recarregado.salvar()
+            de_novo = IndicePDFs(pasta_pdf, TelasPretasProcessor.RE_CONTRATO_GERAL)
+            de_novo.atualizar(ignorar=[pasta_pdf / "100 maiores"])
+            self.assertEqual(0, de_novo.pastas_relidas)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.anexo_b import process_b_attachment
+from src.anexo_b.process_b_attachment import (
+    ARQUIVO_FINGERPRINTS,
+    COLUMNS,
+    MAX_PARTICOES_ABERTAS,
+    csv_para_parquet_por_contrato,
+    exportar_contratos_de_parquet,
+    ler_contratos_parquet,
+    processar_anexo_b,
+)
+
+
+def _escrever_csv(path: Path, fim_de_linha: str = "") -> None:
+    linhas = [
+        ["20240131", "1", " 0001 ", "10", "CONTA A", "1,50", "2", "9", "20", "CONTA B", "0,00", "111", "COSIF A", "222", "COSIF B"],
+        ["99999999", "1", "0002", "10", "CONTA A", "2,25", "2", "9", "20", "", "3,10", "111", "COSIF A", "222", "COSIF B"],
+        ["00000000", "1", "0001", "11", "CONTA C", "-7,00", "2", "9", "20", "CONTA B", "0,40", "111", "COSIF A", "222", "COSIF B"],
+        ["", "1", "", "11", "CONTA C", "1,00", "2", "9", "20", "CONTA B", "1,00", "111", "COSIF A", "222", "COSIF B"],
+        ["20231201", "1", "0003", "12", "CONTA D", "4,00", "2", "9", "20", "CONTA B", "", "111", "COSIF A", "222", "COSIF B"],
+        ["20240229", "1", "0001", "13", "CONTA E", "0,01", "2", "9", "20", "CONTA B", "9,99", "111", "COSIF A", "222", "COSIF B"],
+    ]
+    cabecalho = [f"col{i}" for i in range(len(COLUMNS))]
+    path.write_text(
+        "\n".join(";".join(l) + fim_de_linha for l in [cabecalho] + linhas) + "\n",
+        encoding="utf-8",
+    )
+
+
+class ProcessarAnexoBTestCase(unittest.TestCase):
+    def test_modo_parquet_gera_os_mesmos_excel(self) -> None:
+        # ";" no fim da linha: layout da conta gráfica com coluna extra vazia (16 campos)
+        for fim_de_linha in ["", ";"]:
+            with self.subTest(fim_de_linha=fim_de_linha), TemporaryDirectory() as tmp_dir:
+                tmp = Path(tmp_dir)
+                csv = tmp / "anexo_b.csv"
+                _escrever_csv(csv, fim_de_linha)
+
+                processar_anexo_b(csv, tmp / "em_memoria")
+                processar_anexo_b(csv, tmp / "parquet", pasta_parquet=tmp / "dataset", tamanho_chunk=2)
+
+                esperados = sorted(p.name for p in (tmp / "em_memoria").glob("*.xlsx"))
+                self.assertEqual(esperados, ["B0001.xlsx", "B0002.xlsx", "B0003.xlsx"])
+                self.assertEqual(sorted(p.name for p in (tmp / "parquet").glob("*.xlsx")), esperados)
+                for nome in esperados:
+                    # o modo em memória mantém a coluna extra vazia no fim
+                    pd.testing.assert_frame_equal(
+                        pd.read_excel(tmp / "em_memoria" / nome, sheet_name="Conta Gráfica")[COLUMNS],
+                        pd.read_excel(tmp / "parquet" / nome, sheet_name="Conta Gráfica"),
+                    )
+
+                b1 = pd.read_excel(
+                    tmp / "parquet" / "B0001.xlsx",
+                    dtype={"NUM CONTRATO DEBITO": str, "CONTA DEBITO": str},
+                )
+                self.assertEqual(list(b1.columns), COLUMNS)
+                self.assertEqual(b1["CONTA DEBITO"].tolist(), ["10", "11", "13"])
+                self.assertEqual(b1["VALOR DEBITO"].tolist(), [1.5, -7.0, 0.01])
+                self.assertEqual(b1["DATA GERACAO"].isna().tolist(), [False, True, False])
+
+    def test_dataset_particionado_e_substituido(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            csv = tmp / "anexo_b.csv"
+            _escrever_csv(csv)
+            dataset = tmp / "dataset"
+            (dataset / "NUM CONTRATO DEBITO=antigo").mkdir(parents=True)
+
+            total = csv_para_parquet_por_contrato(csv, dataset, tamanho_chunk=4)
+
+            self.assertEqual(total, 5)
+            self.assertEqual(
+                sorted(p.name for p in dataset.iterdir()),
+                [f"NUM CONTRATO DEBITO={c}" for c in ["0001", "0002", "0003"]],
+            )
+            # 0001 aparece nos dois chunks: um único arquivo por contrato, na ordem do CSV
+            for limite in [MAX_PARTICOES_ABERTAS, 1]:
+                with self.subTest(limite=limite), patch.object(
+                    process_b_attachment, "MAX_PARTICOES_ABERTAS", limite
+                ):
+                    csv_para_parquet_por_contrato(csv, dataset, tamanho_chunk=1)
+                    for pasta in dataset.iterdir():
+                        self.assertEqual(
+                            [p.name for p in pasta.iterdir()], ["parte-000000.parquet"], pasta.name
+                        )
+                    contratos = dict(ler_contratos_parquet(dataset))
+                    self.assertEqual(contratos["0001"]["CONTA DEBITO"].tolist(), ["10", "11", "13"])
+                    self.assertEqual(list(contratos["0001"].columns), COLUMNS)
+
+    def test_engines_e_workers_geram_o_mesmo_conteudo(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            csv = tmp / "anexo_b.csv"
+            _escrever_csv(csv)
+            processar_anexo_b(csv, tmp / "padrao", pasta_parquet=tmp / "dataset")
+
+            for engine in ["xlsxwriter", "write_only"]:
+                exportar_contratos_de_parquet(
+                    tmp / "dataset", "NUM CONTRATO DEBITO", tmp / engine, workers=2, engine=engine
+                )
+                for esperado in sorted((tmp / "padrao").glob("*.xlsx")):
+                    pd.testing.assert_frame_equal(
+                        pd.read_excel(esperado, sheet_name="Conta Gráfica"),
+                        pd.read_excel(tmp / engine / esperado.name, sheet_name="Conta Gráfica"),
+                    )
+
+            # em memória, em paralelo: grupos montados um a um, sem iterar o groupby
+            with patch.object(process_b_attachment, "LOTES_EM_VOO_POR_WORKER", 1), patch.object(
+                pd.core.groupby.DataFrameGroupBy, "__iter__", side_effect=AssertionError
+            ):
+                processar_anexo_b(csv, tmp / "em_memoria", workers=2)
+            for esperado in sorted((tmp / "padrao").glob("*.xlsx")):
+                pd.testing.assert_frame_equal(
+                    pd.read_excel(esperado, sheet_name="Conta Gráfica"),
+                    pd.read_excel(tmp / "em_memoria" / esperado.name, sheet_name="Conta Gráfica"),
+                )
+
+            with self.assertRaises(ValueError):
+                exportar_contratos_de_parquet(
+                    tmp / "dataset", "NUM CONTRATO DEBITO", tmp / "x", engine="csv"
+                )
+
+    def test_incremental_regrava_so_contratos_alterados(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp = Path(tmp_dir)
+            csv = tmp / "anexo_b.csv"
+            saida = tmp / "saida"
+            _escrever_csv(csv)
+
+            r = processar_anexo_b(csv, saida, incremental=True)
+            self.assertEqual((r.gravados, r.inalterados, r.removidos), (3, 0, 0))
+            mtimes = {p.name: p.stat().st_mtime_ns for p in saida.glob("*.xlsx")}
+
+            # mesmo conteúdo pelo caminho Parquet: os hashes batem, nada é regravado
+            r = processar_anexo_b(
+                csv, saida, pasta_parquet=tmp / "dataset", tamanho_chunk=2, incremental=True
+            )
+            self.assertEqual((r.gravados, r.inalterados, r.removidos), (0, 3, 0))
+            self.assertEqual({p.name: p.stat().st_mtime_ns for p in saida.glob("*.xlsx")}, mtimes)
+
+            linhas = csv.read_text(encoding="utf-8").splitlines()
+            linhas[2] = linhas[2].replace("2,25", "2,26")
+            del linhas[5]  # única linha do contrato 0003
+            csv.write_text("\n".join(linhas) + "\n", encoding="utf-8")
+            (saida / "B0001.xlsx").unlink()
+
+            r = processar_anexo_b(csv, saida, incremental=True)
+            self.assertEqual((r.gravados, r.inalterados, r.removidos), (2, 0, 1))
+            self.assertEqual(sorted(p.name for p in saida.glob("*.xlsx")), ["B0001.xlsx", "B0002.xlsx"])
+            b2 = pd.read_excel(saida / "B0002.xlsx")
+            self.assertEqual(b2["VALOR DEBITO"].tolist(), [2.26])
+
+            # outra engine regrava tudo, mesmo com as mesmas linhas
+            r = processar_anexo_b(csv, saida, engine="xlsxwriter", incremental=True)
+            self.assertEqual((r.gravados, r.inalterados, r.removidos), (2, 0, 0))
+
+            # rodada não incremental: o sidecar fica só com o que ela gravou
+            del linhas[2]  # única linha do contrato 0002
+            csv.write_text("\n".join(linhas) + "\n", encoding="utf-8")
+            processar_anexo_b(csv, saida)
+            fingerprints = json.loads((saida / ARQUIVO_FINGERPRINTS).read_text(encoding="utf-8"))
+            self.assertEqual(list(fingerprints["contratos"]), ["0001"])
+
+
+if __name__ == "__main__":
+    unittest.main()